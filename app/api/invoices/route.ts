@@ -34,7 +34,8 @@ export async function POST(request: NextRequest) {
 
     // Forward the request to the backend with the authorization header
     // Added a trailing slash to /invoices/ for FastAPI compatibility
-    const response = await fetch(`${BACKEND_URL}/invoices`, {
+    // The result screen shows the QR code, so ask for it inline
+    const response = await fetch(`${BACKEND_URL}/invoices?include_qr=true`, {
       method: "POST",
       headers: {
         "Authorization": authorization,
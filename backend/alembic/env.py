@@ -30,7 +30,7 @@ load_dotenv()
 # Your models (Base, Invoice, etc.) are in app/models/models.py
 # Import them from that file.
 try:
-    from app.models.models import Base, Invoice, InvoiceStatus
+    from app.models.models import Base, Invoice, InvoiceStatus, AnchorOutbox, ChainRecord, ChainBlock, ChainHead
     # Add any other models you have in 'models.py' to the line above
 except ImportError as e:
     sys.stderr.write(
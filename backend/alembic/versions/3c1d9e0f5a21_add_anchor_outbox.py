@@ -0,0 +1,49 @@
+"""add anchor outbox
+
+Revision ID: 3c1d9e0f5a21
+Revises: 97ff9a4d3613
+Create Date: 2026-10-18 09:12:40.118512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d9e0f5a21'
+down_revision: Union[str, Sequence[str], None] = '97ff9a4d3613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('anchor_outbox',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('invoice_id', sa.UUID(), nullable=False),
+    sa.Column('blockchain_hash', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'FAILED', name='anchorstatus'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('invoice_id')
+    )
+    op.create_index('ix_anchor_outbox_due', 'anchor_outbox', ['status', 'next_attempt_at'], unique=False)
+    # Invoices whose synchronous anchoring failed in the past get a second chance
+    op.execute(
+        "INSERT INTO anchor_outbox (invoice_id, blockchain_hash, status) "
+        "SELECT id, blockchain_hash, 'PENDING' FROM invoices "
+        "WHERE blockchain_tx_ref IS NULL AND blockchain_hash IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_anchor_outbox_due', table_name='anchor_outbox')
+    op.drop_table('anchor_outbox')
+    op.execute('DROP TYPE IF EXISTS anchorstatus')
@@ -0,0 +1,61 @@
+"""add invoice fingerprint
+
+Revision ID: 5e8b2a7c4d10
+Revises: 3c1d9e0f5a21
+Create Date: 2026-10-18 11:40:05.301774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.dedup import fingerprint
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b2a7c4d10'
+down_revision: Union[str, Sequence[str], None] = '3c1d9e0f5a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('invoices', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+
+    # Back-fill in Python so the digest matches app.services.dedup exactly.
+    # Duplicates that slipped past the old racy check keep a NULL fingerprint
+    # on every copy but the oldest, so the unique index can still be built.
+    conn = op.get_bind()
+    invoices = sa.table(
+        'invoices',
+        sa.column('id', sa.UUID()), sa.column('supplier_tpin', sa.String()), sa.column('buyer_tpin', sa.String()),
+        sa.column('amount', sa.Float()), sa.column('vat', sa.Float()), sa.column('timestamp', sa.DateTime()),
+        sa.column('fingerprint', sa.String()),
+    )
+    seen = set()
+    updates = []
+    rows = conn.execute(
+        sa.select(invoices.c.id, invoices.c.supplier_tpin, invoices.c.buyer_tpin, invoices.c.amount, invoices.c.vat)
+        .order_by(invoices.c.timestamp, invoices.c.id)
+    )
+    for row in rows:
+        fp = fingerprint(row.supplier_tpin, row.buyer_tpin, row.amount, row.vat)
+        if fp in seen:
+            continue
+        seen.add(fp)
+        updates.append({'invoice_id': row.id, 'fp': fp})
+    stmt = invoices.update().where(invoices.c.id == sa.bindparam('invoice_id')).values(fingerprint=sa.bindparam('fp'))
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(stmt, updates[start:start + BATCH_SIZE])
+
+    op.create_unique_constraint('uq_invoices_fingerprint', 'invoices', ['fingerprint'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_invoices_fingerprint', 'invoices', type_='unique')
+    op.drop_column('invoices', 'fingerprint')
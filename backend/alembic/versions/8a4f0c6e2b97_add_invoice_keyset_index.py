@@ -0,0 +1,33 @@
+"""add invoice keyset index
+
+Revision ID: 8a4f0c6e2b97
+Revises: 5e8b2a7c4d10
+Create Date: 2026-10-18 14:02:51.662310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4f0c6e2b97'
+down_revision: Union[str, Sequence[str], None] = '5e8b2a7c4d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_invoices_user_timestamp_id',
+        'invoices',
+        ['user_id', sa.text('timestamp DESC'), sa.text('id DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_invoices_user_timestamp_id', table_name='invoices')
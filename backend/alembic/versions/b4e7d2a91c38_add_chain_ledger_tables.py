@@ -0,0 +1,61 @@
+"""add chain ledger tables
+
+Revision ID: b4e7d2a91c38
+Revises: 8a4f0c6e2b97
+Create Date: 2026-10-18 18:27:05.431907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e7d2a91c38'
+down_revision: Union[str, Sequence[str], None] = '8a4f0c6e2b97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Used by LEDGER_BACKEND=postgres; the head row is created on first use
+    op.create_table('chain_records',
+    sa.Column('seq', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('tx_ref', sa.String(length=32), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('metadata', sa.JSON(), nullable=False),
+    sa.Column('prev_hash', sa.String(length=64), nullable=False),
+    sa.Column('chain_hash', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sa.UniqueConstraint('hash'),
+    sa.UniqueConstraint('tx_ref')
+    )
+    op.create_table('chain_blocks',
+    sa.Column('height', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('prev_hash', sa.String(length=64), nullable=False),
+    sa.Column('merkle_root', sa.String(length=64), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sealed_at', sa.String(length=32), nullable=False),
+    sa.Column('first_seq', sa.BigInteger(), nullable=False),
+    sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    sa.Column('block_hash', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('height'),
+    sa.UniqueConstraint('last_seq')
+    )
+    op.create_table('chain_head',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('ledger_id', sa.BigInteger(), nullable=False),
+    sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    sa.Column('chain_hash', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chain_head')
+    op.drop_table('chain_blocks')
+    op.drop_table('chain_records')
@@ -4,29 +4,50 @@ Authentication module for Supabase JWT verification
 
 import jwt
 from fastapi import HTTPException, Depends, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 # We now need SUPABASE_URL, not the secret
-from app.config import SUPABASE_URL
+from app.config import (
+    SUPABASE_URL, JWKS_URL, JWKS_FILE, JWKS_REFRESH_INTERVAL, JWKS_MIN_REFETCH_INTERVAL,
+    AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL, OPS_TOKEN,
+)
+from app.services import metrics
+from app.services.cache import LRUCache
+from app.services.jwks import JWKSCache
 from typing import Optional
+import hashlib
+import hmac
 import logging
-import jwt
+import time
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
+ops_security = HTTPBearer(auto_error=False)
 print(f"SUPABASE_URL: {SUPABASE_URL}")
 
-# --- NEW: JWKS Client ---
-# This client will fetch the public key from Supabase to verify the token
-# This is the standard URL for all Supabase projects
+# --- JWKS key cache ---
+# Public keys from Supabase (standard URL for all Supabase projects), cached by
+# kid and refreshed in the background; see app/services/jwks.py
 try:
-    jwks_url = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
-    jwks_client = jwt.PyJWKClient(jwks_url)
+    jwks_cache = JWKSCache(
+        JWKS_URL or None,
+        local_path=JWKS_FILE,
+        refresh_interval=JWKS_REFRESH_INTERVAL,
+        min_refetch_interval=JWKS_MIN_REFETCH_INTERVAL,
+    )
 except Exception as e:
-    logging.error(f"Could not initialize JWKS client: {e}")
-    jwks_client = None
+    logging.error(f"Could not initialize JWKS cache: {e}")
+    jwks_cache = None
+
+# --- Verified-token cache ---
+# sha256(token) -> (expires_at, claims). Clients reuse one bearer token across
+# many requests; a repeat costs a hash lookup instead of an ES256 verify.
+# Entries never outlive the token's own `exp`.
+token_cache = LRUCache(max_entries=AUTH_TOKEN_CACHE_SIZE)
+
 
 def verify_jwt_token(token: str) -> dict:
-    decoded_header = jwt.get_unverified_header(token)
-    print(decoded_header)
     """
     Verify Supabase JWT token and extract user information
     
@@ -39,15 +60,49 @@ def verify_jwt_token(token: str) -> dict:
     Raises:
         HTTPException: If token is invalid or expired
     """
-    if jwks_client is None:
+    payload = cached_claims(token)
+    if payload is not None:
+        return payload
+
+    payload = _verify_signature(token)
+    expires_at = time.time() + AUTH_TOKEN_CACHE_TTL
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, exp)
+    token_cache.put(_token_key(token), (expires_at, payload))
+    return payload
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def cached_claims(token: str) -> Optional[dict]:
+    """Claims of a token verified earlier and not yet expired, or None."""
+    key = _token_key(token)
+    cached = token_cache.get(key)
+    if cached is None:
+        return None
+    expires_at, payload = cached
+    if time.time() < expires_at:
+        return payload
+    token_cache.pop(key)
+    return None
+
+
+@metrics.timed("jwt_verify")
+def _verify_signature(token: str) -> dict:
+    """Full verification: signing key lookup, ES256 signature, audience and expiry."""
+    if jwks_cache is None:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Auth system not initialized. Check SUPABASE_URL."
         )
 
     try:
-        # --- FIX: Get the signing key from the JWKS client ---
-        signing_key = jwks_client.get_signing_key_from_jwt(token).key
+        # Signing key for the token's kid, from the in-memory JWKS cache
+        decoded_header = jwt.get_unverified_header(token)
+        signing_key = jwks_cache.get_signing_key(decoded_header.get("kid"))
 
         # --- FIX: Decode using the key and the RS256 algorithm ---
         payload = jwt.decode(
@@ -58,9 +113,6 @@ def verify_jwt_token(token: str) -> dict:
             options={"verify_exp": True}
         )
         
-        logging.info(f"JWT payload: {payload}")
-        print(f"JWT payload: {payload}")
-        
         # Extract user ID from Supabase JWT structure
         user_id = payload.get("sub")
         if not user_id:
@@ -71,26 +123,28 @@ def verify_jwt_token(token: str) -> dict:
             
         return payload
         
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError as e:
-        print(f"TOKEN ERROR: {e}")
+        logger.debug("Token rejected: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired"
         )
     except jwt.InvalidAudienceError as e:
-        print(f"TOKEN ERROR: {e}")
+        logger.debug("Token rejected: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token audience"
         )
     except jwt.InvalidTokenError as e:
-        print(f"TOKEN ERROR: {e}")
+        logger.debug("Token rejected: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
     except Exception as e:
-        print(f"TOKEN ERROR: {e}")
+        logger.debug("Token rejected: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Token verification failed: {str(e)}"
@@ -111,9 +165,32 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         "exp": payload.get("exp")
     }
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """
     FastAPI dependency to get current user ID only
+    
+    Runs on the event loop: a cached token costs a hash lookup, and only a
+    full verification (which may fetch signing keys) goes to the threadpool.
+    """
+    token = credentials.credentials
+    payload = cached_claims(token)
+    if payload is None:
+        payload = await run_in_threadpool(verify_jwt_token, token)
+    return payload.get("sub")
+
+def require_ops_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(ops_security)) -> None:
     """
-    user = get_current_user(credentials)
-    return user["user_id"]
\ No newline at end of file
+    FastAPI dependency for the operational endpoints (/stats, /metrics)
+
+    They expose pool sizes, cache and dedup counters and route timings, so
+    they are hidden (404) unless OPS_TOKEN is set, and then need it as the
+    bearer token. Supabase user tokens are not accepted.
+    """
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), OPS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid ops token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -8,12 +8,28 @@ load_dotenv()
 DEV_CREATE_DB = os.getenv("DEV_CREATE_DB", "false").lower() == "true"
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Connection pool of the async (asyncpg) engine used by the read/verify routes
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 
+# JWT signing keys: fetched from Supabase and cached by kid. JWKS_FILE boots the
+# cache from a local key set (offline/tests); set JWKS_URL to "" to use only the file.
+JWKS_URL = os.getenv("JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else "")
+JWKS_FILE = os.getenv("JWKS_FILE")
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "600"))
+# Minimum seconds between refetches triggered by tokens with an unknown kid
+JWKS_MIN_REFETCH_INTERVAL = float(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
+
+# Verified JWTs are cached (by token digest) for at most this many seconds, and never past their exp
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+
 # Validate required Supabase configuration
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL environment variable is required and must point to your Supabase Postgres instance")
@@ -26,6 +42,64 @@ if not SUPABASE_KEY:
 
 # Blockchain configuration
 LEDGER_PATH = os.getenv("LEDGER_PATH", "ledger.json")
+LEDGER_FSYNC = os.getenv("LEDGER_FSYNC", "true").lower() == "true"
+# Ledger storage engine: "file" (append-only log at LEDGER_PATH), "sqlite" (WAL database at
+# LEDGER_PATH) or "postgres" (chain_records table in DATABASE_URL; LEDGER_PATH unused)
+LEDGER_BACKEND = os.getenv("LEDGER_BACKEND", "file").lower()
+# Group commit: concurrent submissions are written together, up to this many per batch
+LEDGER_MAX_BATCH = int(os.getenv("LEDGER_MAX_BATCH", "256"))
+# How long a batch may wait for more submissions when others are already queued
+LEDGER_MAX_LINGER_MS = float(os.getenv("LEDGER_MAX_LINGER_MS", "2"))
+# Number of records sealed into each Merkle block
+LEDGER_BLOCK_SIZE = int(os.getenv("LEDGER_BLOCK_SIZE", "1024"))
+# Roll the ledger over into a new segment after this many bytes (0 = single file)
+LEDGER_SEGMENT_BYTES = int(os.getenv("LEDGER_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+LEDGER_COMPRESS_SEGMENTS = os.getenv("LEDGER_COMPRESS_SEGMENTS", "false").lower() == "true"
+# Snapshot the hash index after this many bytes of appends, for fast recovery (0 = off)
+LEDGER_CHECKPOINT_BYTES = int(os.getenv("LEDGER_CHECKPOINT_BYTES", str(64 * 1024 * 1024)))
+LEDGER_CHECKPOINT_KEEP = int(os.getenv("LEDGER_CHECKPOINT_KEEP", "2"))
+# Encoding of new ledger records: "binary" or "json" (existing records of either kind stay readable)
+LEDGER_RECORD_FORMAT = os.getenv("LEDGER_RECORD_FORMAT", "binary").lower()
+# Unix socket of the ledger service (python -m app.services.ledger.server); required
+# when running more than one worker process. Empty = workers open the ledger themselves
+LEDGER_SOCKET = os.getenv("LEDGER_SOCKET", "")
+
+# Background anchoring of new invoices on the ledger
+ANCHOR_WORKERS = int(os.getenv("ANCHOR_WORKERS", "2"))
+ANCHOR_BATCH_SIZE = int(os.getenv("ANCHOR_BATCH_SIZE", "100"))
+ANCHOR_POLL_INTERVAL = float(os.getenv("ANCHOR_POLL_INTERVAL", "1.0"))
+ANCHOR_MAX_ATTEMPTS = int(os.getenv("ANCHOR_MAX_ATTEMPTS", "10"))
+
+# Bloom filter of invoice fingerprints that lets most new invoices skip the duplicate query
+DEDUP_FILTER_CAPACITY = int(os.getenv("DEDUP_FILTER_CAPACITY", "1000000"))
+DEDUP_FILTER_ERROR_RATE = float(os.getenv("DEDUP_FILTER_ERROR_RATE", "0.01"))
+
+# Rendered QR images kept in memory, by count and total size (0 entries disables the cache)
+QR_CACHE_ENTRIES = int(os.getenv("QR_CACHE_ENTRIES", "1024"))
+QR_CACHE_BYTES = int(os.getenv("QR_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+# Cached verification outcomes: "memory" (per process), "shared" (SQLite file at
+# VERIFY_CACHE_PATH, seen by every worker process on the host) or "off".
+# run.py makes "shared" the default when it starts several workers.
+VERIFY_CACHE_BACKEND = os.getenv("VERIFY_CACHE_BACKEND", "memory").lower()
+VERIFY_CACHE_ENTRIES = int(os.getenv("VERIFY_CACHE_ENTRIES", "100000"))
+VERIFY_CACHE_PATH = os.getenv("VERIFY_CACHE_PATH", "verify-cache.db")
+# Lifetime of shared-cache entries in seconds
+VERIFY_CACHE_TTL = float(os.getenv("VERIFY_CACHE_TTL", "3600"))
+
+# Largest batch accepted by POST /invoices/bulk
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+# Largest body accepted by POST /invoices/bulk; reading stops past it
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(16 * 1024 * 1024)))
+# Largest batch accepted by POST /invoices/verify-batch
+VERIFY_BATCH_MAX_ITEMS = int(os.getenv("VERIFY_BATCH_MAX_ITEMS", "1000"))
+
+# Metrics: per-stage timings (hash, ledger, QR, JWT, SQL) and the fraction of
+# HTTP requests whose latency and size are recorded (0 turns the middleware off)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_REQUEST_SAMPLE_RATE = float(os.getenv("METRICS_REQUEST_SAMPLE_RATE", "1.0"))
+# Bearer token for GET /stats and GET /metrics; unset, both answer 404
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")
 
 # CORS configuration
 ALLOWED_ORIGINS = [
@@ -1,28 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 from app.models import models
+from sqlalchemy import and_, insert, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app import schemas
-from app.services import validation, blockchain, qr_code
-from datetime import datetime
-from uuid import UUID  # <-- 1. Import UUID
+from app.services import validation, blockchain, qr_code, anchoring, dedup, verify_cache
+from uuid import UUID, uuid4  # <-- 1. Import UUID
 
-def create_invoice(db: Session, invoice: schemas.InvoiceCreate, user_id: str) -> models.Invoice:
+def create_invoice(db: Session, invoice: schemas.InvoiceCreate, user_id: str, include_qr: bool = False) -> models.Invoice:
     # Validate TPINs
     if not validation.is_valid_tpin(invoice.supplier_tpin) or not validation.is_valid_tpin(invoice.buyer_tpin):
         raise ValueError("Invalid TPIN format (expected 10 digits)")
 
-    # Prevent obvious duplicates: same supplier/buyer/amount/vat already present
-    existing = (
-        db.query(models.Invoice)
-        .filter(
-            models.Invoice.supplier_tpin == invoice.supplier_tpin,
-            models.Invoice.buyer_tpin == invoice.buyer_tpin,
-            models.Invoice.amount == invoice.amount,
-            models.Invoice.vat == invoice.vat,
-        )
-        .first()
-    )
-    if existing:
-        raise ValueError("Duplicate invoice")
+    # Prevent obvious duplicates: same supplier/buyer/amount/vat already present.
+    # The Bloom filter answers most "never seen" cases without a query.
+    fingerprint = dedup.fingerprint(invoice.supplier_tpin, invoice.buyer_tpin, invoice.amount, invoice.vat)
+    if dedup.might_exist(fingerprint):
+        existing = _fingerprint_exists(db, fingerprint)
+        dedup.record_probe(existing)
+        if existing:
+            raise ValueError("Duplicate invoice")
 
     # Create invoice data for blockchain hashing
     invoice_data = {
@@ -35,39 +36,36 @@ def create_invoice(db: Session, invoice: schemas.InvoiceCreate, user_id: str) ->
     # Generate blockchain hash
     blockchain_hash = blockchain.hash_invoice(invoice_data)
     
-    # Create invoice record
+    # Create invoice record together with its pending anchor, in one commit.
+    # The anchoring worker submits it to the ledger and back-fills the tx ref.
     db_inv = models.Invoice(
+        id=uuid4(),
         user_id=user_id,
         supplier_tpin=invoice.supplier_tpin,
         buyer_tpin=invoice.buyer_tpin,
         vat=invoice.vat,
         amount=invoice.amount,
         blockchain_hash=blockchain_hash,
+        fingerprint=fingerprint,
     )
-    db.add(db_inv)
-    db.commit()
-    db.refresh(db_inv)
-    
-    # Submit to blockchain ledger
     try:
-        metadata = {
-            # 2. Convert the UUID to a string
-            "invoice_id": str(db_inv.id), 
-            "supplier_tpin": invoice.supplier_tpin,
-            "buyer_tpin": invoice.buyer_tpin,
-        }
-        blockchain_record = blockchain.submit_to_chain(blockchain_hash, metadata)
-        
-        # Update invoice with blockchain details
-        db_inv.blockchain_tx_ref = blockchain_record["tx_ref"]
-        db_inv.blockchain_timestamp = datetime.fromisoformat(blockchain_record["timestamp"].replace("Z", "+00:00"))
         db.add(db_inv)
+        db.flush()  # the outbox row references the invoice
+        db.add(models.AnchorOutbox(invoice_id=db_inv.id, blockchain_hash=blockchain_hash))
         db.commit()
-        db.refresh(db_inv)
-        
-    except Exception as e:
-        # Log error but don't fail the invoice creation
-        print(f"Warning: Failed to register invoice {db_inv.id} on blockchain: {e}")
+    except IntegrityError:
+        # A concurrent request inserted the same invoice first
+        db.rollback()
+        if _fingerprint_exists(db, fingerprint):
+            raise ValueError("Duplicate invoice")
+        raise
+    db.refresh(db_inv)
+    dedup.remember(fingerprint)
+    anchoring.notify()
+    
+    if not include_qr:
+        # Clients fetch the image from GET /invoices/{id}/qr
+        return db_inv
     
     # Generate QR code for the invoice
     try:
@@ -89,6 +87,109 @@ def create_invoice(db: Session, invoice: schemas.InvoiceCreate, user_id: str) ->
     return db_inv
 
 
+def _fingerprint_exists(db: Session, fingerprint: str) -> bool:
+    return db.query(models.Invoice.id).filter(models.Invoice.fingerprint == fingerprint).first() is not None
+
+
+# Rows per statement for the set-based duplicate probe (keeps bind parameter counts sane)
+BULK_PROBE_CHUNK = 500
+
+
+def _drop_existing(db: Session, candidates: dict, results: list, use_filter: bool = True) -> None:
+    """Remove candidates (fingerprint -> input index) whose fingerprint is already stored."""
+    if use_filter:
+        probe = [fp for fp in candidates if dedup.might_exist(fp)]
+    else:
+        probe = list(candidates)
+    found = set()
+    for start in range(0, len(probe), BULK_PROBE_CHUNK):
+        chunk = probe[start:start + BULK_PROBE_CHUNK]
+        found.update(fp for (fp,) in db.query(models.Invoice.fingerprint).filter(models.Invoice.fingerprint.in_(chunk)))
+    for fp in probe:
+        if use_filter:
+            dedup.record_probe(fp in found)
+        if fp in found:
+            results[candidates.pop(fp)] = (None, "Duplicate invoice")
+
+
+def create_invoices_bulk(
+    db: Session, invoices: Sequence[schemas.InvoiceCreate], user_id: str
+) -> List[Tuple[Optional[models.Invoice], Optional[str]]]:
+    """
+    Create many invoices in one transaction.
+
+    Returns one `(invoice, error)` pair per input, in input order. Items that
+    fail validation or duplicate an existing invoice (or an earlier item in the
+    same batch) are reported and skipped; the rest are inserted with a single
+    multi-row INSERT ... RETURNING together with their anchoring outbox rows.
+    QR codes are not rendered for bulk uploads.
+    """
+    results: List[Tuple[Optional[models.Invoice], Optional[str]]] = [(None, None)] * len(invoices)
+
+    # Validate TPINs and drop duplicates within the batch itself
+    candidates = {}
+    for i, invoice in enumerate(invoices):
+        if not validation.is_valid_tpin(invoice.supplier_tpin) or not validation.is_valid_tpin(invoice.buyer_tpin):
+            results[i] = (None, "Invalid TPIN format (expected 10 digits)")
+            continue
+        fp = dedup.fingerprint(invoice.supplier_tpin, invoice.buyer_tpin, invoice.amount, invoice.vat)
+        if fp in candidates:
+            results[i] = (None, "Duplicate invoice")
+            continue
+        candidates[fp] = i
+
+    # One set-based probe for duplicates already in the database, skipping
+    # fingerprints the Bloom filter has never seen
+    _drop_existing(db, candidates, results)
+
+    for attempt in range(2):
+        if not candidates:
+            return results
+        rows = []
+        for fp, i in sorted(candidates.items(), key=lambda item: item[1]):
+            invoice = invoices[i]
+            rows.append({
+                "id": uuid4(),
+                "user_id": user_id,
+                "supplier_tpin": invoice.supplier_tpin,
+                "buyer_tpin": invoice.buyer_tpin,
+                "vat": invoice.vat,
+                "amount": invoice.amount,
+                "blockchain_hash": blockchain.hash_invoice({
+                    "supplier_tpin": invoice.supplier_tpin,
+                    "buyer_tpin": invoice.buyer_tpin,
+                    "vat": invoice.vat,
+                    "amount": invoice.amount,
+                }),
+                "fingerprint": fp,
+            })
+        try:
+            created = db.scalars(
+                insert(models.Invoice).returning(models.Invoice, sort_by_parameter_order=True), rows
+            ).all()
+            db.execute(
+                insert(models.AnchorOutbox),
+                [{"invoice_id": row["id"], "blockchain_hash": row["blockchain_hash"]} for row in rows],
+            )
+            # Keep the RETURNING state instead of re-selecting every row after commit
+            for db_inv in created:
+                db.expunge(db_inv)
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent writer inserted some of these first; re-check them all
+            db.rollback()
+            if attempt:
+                raise
+            _drop_existing(db, candidates, results, use_filter=False)
+
+    anchoring.notify()
+    for db_inv in created:
+        dedup.remember(db_inv.fingerprint)
+        results[candidates[db_inv.fingerprint]] = (db_inv, None)
+    return results
+
+
 # 3. Change invoice_id type from int to UUID
 def get_invoice(db: Session, invoice_id: UUID):
     return db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
@@ -102,11 +203,188 @@ def cancel_invoice(db: Session, invoice_id: UUID):
     inv.status = models.InvoiceStatus.CANCELLED
     db.add(inv)
     db.commit()
+    verify_cache.invalidate(invoice_id)
     db.refresh(inv)
     return inv
 
-def get_user_invoices(db: Session, user_id: str, skip: int = 0, limit: int = 100):
-    """Get invoices for a specific user with pagination"""
-    return db.query(models.Invoice).filter(
+# Columns a client may ask for with `fields=`; the keyset columns are always read
+INVOICE_FIELDS = (
+    "id", "user_id", "invoice_number", "supplier_tpin", "buyer_tpin", "vat", "amount", "timestamp", "status",
+    "blockchain_hash", "blockchain_tx_ref", "blockchain_timestamp",
+)
+
+
+def encode_cursor(timestamp: Optional[datetime], invoice_id: UUID) -> str:
+    raw = json.dumps([timestamp.isoformat() if timestamp is not None else None, str(invoice_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, invoice_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp) if timestamp is not None else None, UUID(invoice_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _user_invoices_page(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str],
+    fields: Optional[Sequence[str]],
+    skip: int,
+):
+    """Build the page query for list_user_invoices(_async). Returns (statement, fields)."""
+    fields = list(fields) if fields else list(INVOICE_FIELDS)
+    unknown = [name for name in fields if name not in INVOICE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    selected = list(dict.fromkeys(fields + ["timestamp", "id"]))
+
+    column = models.Invoice.timestamp
+    stmt = select(*(getattr(models.Invoice, name) for name in selected)).where(models.Invoice.user_id == user_id)
+    if cursor:
+        # Rows without a timestamp come first (the Postgres order of the DESC index)
+        timestamp, invoice_id = decode_cursor(cursor)
+        if timestamp is None:
+            stmt = stmt.where(or_(column.is_not(None), and_(column.is_(None), models.Invoice.id < invoice_id)))
+        else:
+            stmt = stmt.where(tuple_(column, models.Invoice.id) < (timestamp, invoice_id))
+    stmt = stmt.order_by(column.desc().nulls_first(), models.Invoice.id.desc())
+    if skip and not cursor:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit + 1), fields
+
+
+def _page_result(rows: Sequence[Any], fields: List[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return [{name: getattr(row, name) for name in fields} for row in rows], next_cursor
+
+
+def list_user_invoices(
+    db: Session,
+    user_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    skip: int = 0,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    A page of a user's invoices, newest first, as plain dicts.
+
+    Pages are walked with keyset pagination on (timestamp, id), served by the
+    (user_id, timestamp DESC, id DESC) index: pass the returned cursor back to
+    get the next page. `fields` limits the columns selected. `skip` is the
+    legacy offset and is ignored when a cursor is given.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    stmt, fields = _user_invoices_page(user_id, limit, cursor, fields, skip)
+    return _page_result(db.execute(stmt).all(), fields, limit)
+
+
+async def list_user_invoices_async(
+    db: AsyncSession,
+    user_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    skip: int = 0,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Async version of `list_user_invoices`."""
+    stmt, fields = _user_invoices_page(user_id, limit, cursor, fields, skip)
+    return _page_result((await db.execute(stmt)).all(), fields, limit)
+
+
+async def get_invoice_async(db: AsyncSession, invoice_id: UUID) -> Optional[models.Invoice]:
+    return await db.get(models.Invoice, invoice_id)
+
+
+async def get_invoices_async(db: AsyncSession, invoice_ids: Sequence[UUID]) -> Dict[UUID, models.Invoice]:
+    """Load many invoices by id with one `IN` query per chunk. Missing ids are left out."""
+    ids = list(set(invoice_ids))
+    found = {}
+    for start in range(0, len(ids), BULK_PROBE_CHUNK):
+        chunk = ids[start:start + BULK_PROBE_CHUNK]
+        rows = await db.execute(select(models.Invoice).where(models.Invoice.id.in_(chunk)))
+        found.update((invoice.id, invoice) for invoice in rows.scalars())
+    return found
+
+
+async def get_invoices_on_ledger_async(
+    db: AsyncSession, invoice_ids: Sequence[UUID]
+) -> Dict[UUID, Tuple[models.Invoice, Optional[Dict[str, Any]]]]:
+    """
+    Load many invoices together with their ledger record (None when the hash
+    is not on the ledger) in one query per chunk, joining
+    `invoices.blockchain_hash` to `chain_records`. Only for LEDGER_BACKEND=postgres,
+    where the ledger lives in this database. Missing ids are left out.
+    """
+    from app.services.ledger.postgres import record_from_row
+
+    record = models.ChainRecord
+    ids = list(set(invoice_ids))
+    found = {}
+    for start in range(0, len(ids), BULK_PROBE_CHUNK):
+        chunk = ids[start:start + BULK_PROBE_CHUNK]
+        rows = await db.execute(
+            select(models.Invoice, record.hash, record.meta, record.tx_ref, record.timestamp)
+            .outerjoin(record, record.hash == models.Invoice.blockchain_hash)
+            .where(models.Invoice.id.in_(chunk))
+        )
+        for invoice, *columns in rows:
+            found[invoice.id] = (invoice, record_from_row(columns) if columns[0] is not None else None)
+    return found
+
+
+async def get_chain_version_async(db: AsyncSession) -> Optional[Tuple[int, int]]:
+    """
+    `PostgresLedger.version()` read on an async session: (ledger id, last
+    seq) of the `chain_head` row, or None before the ledger is first used.
+    """
+    head = models.ChainHead
+    row = (await db.execute(select(head.ledger_id, head.last_seq).where(head.id == 1))).first()
+    return (row.ledger_id, row.last_seq) if row is not None else None
+
+
+async def cancel_invoice_async(db: AsyncSession, invoice_id: UUID) -> Optional[models.Invoice]:
+    inv = await get_invoice_async(db, invoice_id)
+    if not inv:
+        return None
+    inv.status = models.InvoiceStatus.CANCELLED
+    await db.commit()
+    await verify_cache.invalidate_async(invoice_id)
+    await db.refresh(inv)
+    return inv
+
+
+def iter_user_invoices(
+    db: Session,
+    user_id: str,
+    status: Optional[models.InvoiceStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> Iterator[Any]:
+    """
+    Stream every matching invoice of a user, oldest first, as column rows.
+
+    Rows are fetched `batch_size` at a time through a server-side cursor
+    (`yield_per`), so memory use does not grow with the number of invoices.
+    `since` is inclusive, `until` exclusive.
+    """
+    query = db.query(*(getattr(models.Invoice, name) for name in INVOICE_FIELDS)).filter(
         models.Invoice.user_id == user_id
-    ).offset(skip).limit(limit).all()
\ No newline at end of file
+    )
+    if status is not None:
+        query = query.filter(models.Invoice.status == status)
+    if since is not None:
+        query = query.filter(models.Invoice.timestamp >= since)
+    if until is not None:
+        query = query.filter(models.Invoice.timestamp < until)
+    query = query.order_by(models.Invoice.timestamp, models.Invoice.id).execution_options(yield_per=batch_size)
+    yield from query
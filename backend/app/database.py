@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+from app.config import DATABASE_URL, ASYNC_DB_POOL_SIZE, ASYNC_DB_MAX_OVERFLOW
+from app.services import metrics
 
 # Create engine with Supabase PostgreSQL connection
 # Add connection pooling and SSL settings for Supabase
@@ -13,6 +16,8 @@ engine = create_engine(
     echo=False  # Set to True for SQL query logging
 )
 
+metrics.instrument_engine(engine, "sync")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -23,3 +28,57 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_session_factory():
+    """For endpoints that manage their own session lifetime (e.g. streaming responses)."""
+    return SessionLocal
+
+
+# --- Async engine ---
+# The read/verify routes use AsyncSession on the event loop instead of a
+# threadpool thread each. The same database is reached through asyncpg
+# (aiosqlite for local SQLite files); built on first use.
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+_async_sessionmaker = None
+
+
+def async_database_url(url: str):
+    """Map a sync DATABASE_URL to its async driver. Returns (url, connect_args)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    parsed = parsed.set(drivername=ASYNC_DRIVERS.get(backend, parsed.drivername))
+    connect_args = {}
+    if backend in ("postgresql", "postgres") and "sslmode" in parsed.query:
+        # asyncpg takes the libpq sslmode as its `ssl` argument
+        connect_args["ssl"] = parsed.query["sslmode"]
+        parsed = parsed.difference_update_query(["sslmode"])
+    return parsed, connect_args
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        url, connect_args = async_database_url(DATABASE_URL)
+        async_engine = create_async_engine(
+            url,
+            connect_args=connect_args,
+            pool_size=ASYNC_DB_POOL_SIZE,
+            max_overflow=ASYNC_DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=300,
+        )
+        metrics.instrument_engine(async_engine.sync_engine, "async")
+        _async_sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    return _async_sessionmaker
+
+
+def get_async_engine():
+    """The async engine, or None if no async session has been made yet."""
+    return _async_sessionmaker.kw["bind"] if _async_sessionmaker is not None else None
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -1,18 +1,95 @@
-from fastapi import FastAPI, Depends, HTTPException
+import csv
+import io
+import json
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from app import models, schemas, crud
-from app.database import engine, Base, get_db
+from app.database import engine, Base, SessionLocal, get_db, get_async_db, get_async_engine, get_session_factory
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.supabase_client import ping_supabase
-from app.config import DEV_CREATE_DB, ALLOWED_ORIGINS, SUPABASE_URL, SUPABASE_KEY
-from app.services import blockchain, qr_code
+from app.config import (
+    DEV_CREATE_DB, ALLOWED_ORIGINS, SUPABASE_URL, SUPABASE_KEY,
+    LEDGER_PATH, LEDGER_BACKEND, LEDGER_FSYNC, LEDGER_MAX_BATCH, LEDGER_MAX_LINGER_MS, LEDGER_BLOCK_SIZE,
+    LEDGER_SEGMENT_BYTES, LEDGER_COMPRESS_SEGMENTS, LEDGER_CHECKPOINT_BYTES, LEDGER_CHECKPOINT_KEEP,
+    LEDGER_RECORD_FORMAT, LEDGER_SOCKET,
+    ANCHOR_WORKERS, ANCHOR_BATCH_SIZE, ANCHOR_POLL_INTERVAL, ANCHOR_MAX_ATTEMPTS,
+    BULK_MAX_ITEMS, BULK_MAX_BYTES, VERIFY_BATCH_MAX_ITEMS,
+    VERIFY_CACHE_BACKEND, VERIFY_CACHE_ENTRIES, VERIFY_CACHE_PATH, VERIFY_CACHE_TTL,
+    METRICS_ENABLED, METRICS_REQUEST_SAMPLE_RATE, DEDUP_FILTER_CAPACITY, DEDUP_FILTER_ERROR_RATE, QR_CACHE_ENTRIES, QR_CACHE_BYTES,
+)
+from app.services import anchoring, blockchain, dedup, ledger, metrics, qr_code, verify_cache
+from app import auth
 from app.auth import get_current_user_id
 from uuid import UUID
 
 if DEV_CREATE_DB:
     Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="ZRA Invoice Verification Service")
+ledger.configure(
+    path=LEDGER_PATH,
+    backend=LEDGER_BACKEND,
+    fsync=LEDGER_FSYNC,
+    max_batch=LEDGER_MAX_BATCH,
+    max_linger_ms=LEDGER_MAX_LINGER_MS,
+    block_size=LEDGER_BLOCK_SIZE,
+    segment_size=LEDGER_SEGMENT_BYTES,
+    compress_segments=LEDGER_COMPRESS_SEGMENTS,
+    checkpoint_bytes=LEDGER_CHECKPOINT_BYTES,
+    checkpoint_keep=LEDGER_CHECKPOINT_KEEP,
+    record_format=LEDGER_RECORD_FORMAT,
+    socket=LEDGER_SOCKET,
+)
+
+qr_code.configure_cache(QR_CACHE_ENTRIES, QR_CACHE_BYTES)
+metrics.configure(enabled=METRICS_ENABLED)
+
+anchor_worker = anchoring.AnchorWorker(
+    SessionLocal,
+    workers=ANCHOR_WORKERS,
+    batch_size=ANCHOR_BATCH_SIZE,
+    poll_interval=ANCHOR_POLL_INTERVAL,
+    max_attempts=ANCHOR_MAX_ATTEMPTS,
+)
+
+duplicate_filter = dedup.DuplicateFilter(DEDUP_FILTER_CAPACITY, DEDUP_FILTER_ERROR_RATE)
+
+_verify_backend = verify_cache.make_backend(VERIFY_CACHE_BACKEND, VERIFY_CACHE_ENTRIES, VERIFY_CACHE_PATH, VERIFY_CACHE_TTL)
+verify_cache.configure(verify_cache.VerificationCache(_verify_backend) if _verify_backend is not None else None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Drain the anchoring outbox in the background for the app's lifetime
+    anchoring.configure(anchor_worker)
+    anchor_worker.start()
+    # Duplicate checks go to the database until the filter is warm
+    dedup.configure(duplicate_filter)
+    duplicate_filter.warm_in_background(SessionLocal)
+    # Open (and if needed recover) the ledger now rather than inside the first
+    # verify request, which reads it on the event loop
+    ledger.open_ledger(ledger.settings.path)
+    # Keep JWT signing keys fresh off the request path
+    if auth.jwks_cache is not None:
+        auth.jwks_cache.start()
+    yield
+    if auth.jwks_cache is not None:
+        auth.jwks_cache.stop()
+    anchor_worker.stop()
+    anchoring.configure(None)
+    dedup.configure(None)
+
+
+app = FastAPI(title="ZRA Invoice Verification Service", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -21,7 +98,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(metrics.RequestMetricsMiddleware, sample_rate=METRICS_REQUEST_SAMPLE_RATE)
 
 @app.get("/supabase/health")
 def supabase_health():
@@ -41,70 +120,392 @@ def db_health():
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
+def _component_stats() -> Dict[str, Any]:
+    cache = verify_cache.get()
+    return {
+        "anchoring": anchor_worker.stats(),
+        "dedup": duplicate_filter.stats(),
+        "qr_cache": qr_code.cache_stats(),
+        "jwks": auth.jwks_cache.stats() if auth.jwks_cache is not None else None,
+        "token_cache": auth.token_cache.stats(),
+        "verify_cache": cache.stats() if cache is not None else None,
+    }
+
+
+def _component_gauges():
+    """Numeric `/stats` counters as `zra_component_stat{component, stat}` gauges."""
+    def flatten(prefix, values):
+        for key, value in values.items():
+            if isinstance(value, dict):
+                yield from flatten(f"{prefix}{key}_", value)
+            elif isinstance(value, (int, float)):
+                yield f"{prefix}{key}", float(value)
+
+    for component, values in _component_stats().items():
+        for stat, value in flatten("", values or {}):
+            yield "zra_component_stat", "Service component counters (see GET /stats)", {"component": component, "stat": stat}, value
+
+
+metrics.register_collector(_component_gauges)
+metrics.register_collector(metrics.pool_collector("sync", lambda: engine))
+metrics.register_collector(metrics.pool_collector("async", get_async_engine))
+
+
+@app.get("/stats", dependencies=[Depends(auth.require_ops_token)])
+def service_stats():
+    """Internal counters: background anchoring, the duplicate filter, the caches and per-stage timings"""
+    return {**_component_stats(), "stages": metrics.stage_summary()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(auth.require_ops_token)])
+def prometheus_metrics():
+    """Stage, SQL and HTTP timings, DB pool gauges and component counters in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/invoices", response_model=schemas.InvoiceRead, status_code=201)
-def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+def create_invoice(invoice: schemas.InvoiceCreate, include_qr: bool = False, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+    """Create an invoice. Pass include_qr=true to get the QR code inline as a data URI"""
     try:
-        return crud.create_invoice(db, invoice, user_id)
+        return crud.create_invoice(db, invoice, user_id, include_qr=include_qr)
     except ValueError as ve:
         raise HTTPException(status_code=409, detail=str(ve))
 
-@app.get("/invoices", response_model=list[schemas.InvoiceRead])
-def get_user_invoices(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    """Get invoices for the authenticated user"""
-    invoices = crud.get_user_invoices(db, user_id, skip=skip, limit=limit)
-    return invoices
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def _batch_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Batch too large (max {BULK_MAX_ITEMS} invoices, {BULK_MAX_BYTES} bytes)"
+    )
+
+
+async def _read_bulk_body(request: Request, ndjson: bool) -> List[bytes]:
+    """
+    Read a bulk upload off the request stream: the NDJSON lines, or the whole
+    body as one chunk for a JSON array. Stops with a 413 as soon as the body
+    passes BULK_MAX_BYTES or holds more than BULK_MAX_ITEMS lines.
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > BULK_MAX_BYTES:
+        raise _batch_too_large()
+    parts: List[bytes] = []
+    tail, size = bytearray(), 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > BULK_MAX_BYTES:
+            raise _batch_too_large()
+        if not ndjson:
+            parts.append(chunk)
+            continue
+        lines = chunk.split(b"\n")
+        tail += lines[0]
+        if len(lines) > 1:
+            lines[0], tail = bytes(tail), bytearray(lines.pop())
+            parts.extend(line for line in lines if line.strip())
+            if len(parts) > BULK_MAX_ITEMS:
+                raise _batch_too_large()
+    if not ndjson:
+        return [b"".join(parts)]
+    if tail.strip():
+        parts.append(bytes(tail))
+    if len(parts) > BULK_MAX_ITEMS:
+        raise _batch_too_large()
+    return parts
+
+
+def _parse_bulk_body(parts: List[bytes], ndjson: bool) -> list:
+    """Decode what `_read_bulk_body` read: one JSON object per NDJSON line, or a JSON array."""
+    try:
+        if ndjson:
+            return [json.loads(line) for line in parts]
+        items = json.loads(parts[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed request body: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of invoices")
+    if len(items) > BULK_MAX_ITEMS:
+        raise _batch_too_large()
+    return items
+
+
+def _validate_bulk(parts: List[bytes], ndjson: bool) -> Tuple[List[schemas.BulkInvoiceResult], list, List[int]]:
+    """Parse and validate a bulk upload: a result per item, the valid invoices and their positions."""
+    items = _parse_bulk_body(parts, ndjson)
+    results = [schemas.BulkInvoiceResult(index=i, ok=False) for i in range(len(items))]
+    valid, positions = [], []
+    for i, item in enumerate(items):
+        try:
+            valid.append(schemas.InvoiceCreate.model_validate(item))
+            positions.append(i)
+        except ValidationError as e:
+            results[i].error = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'item'}: {err['msg']}" for err in e.errors()
+            )
+    return results, valid, positions
+
+
+@app.post("/invoices/bulk", response_model=schemas.BulkInvoiceResponse)
+async def create_invoices_bulk(request: Request, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
+    """Create a batch of invoices sent as a JSON array or NDJSON; reports a result per item"""
+    ndjson = request.headers.get("content-type", "").split(";")[0].strip().lower() in NDJSON_TYPES
+    parts = await _read_bulk_body(request, ndjson)
+    # Parsing and validating thousands of items would hold up every other request on the loop
+    results, valid, positions = await run_in_threadpool(_validate_bulk, parts, ndjson)
+    created = await run_in_threadpool(crud.create_invoices_bulk, db, valid, user_id)
+    for i, (invoice, error) in zip(positions, created):
+        results[i] = schemas.BulkInvoiceResult(index=i, ok=invoice is not None, invoice=invoice, error=error)
+
+    ok = sum(1 for r in results if r.ok)
+    return schemas.BulkInvoiceResponse(created=ok, failed=len(results) - ok, results=results)
+
+@app.get("/invoices", response_model=schemas.InvoicePage)
+async def get_user_invoices(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. id,amount,status"),
+    skip: int = Query(0, ge=0, description="Deprecated offset; use the cursor instead"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Get invoices for the authenticated user, newest first.
+
+    `next_cursor` (also sent as the X-Next-Cursor header) fetches the next
+    page; it is null on the last page. With `fields`, the items hold only
+    those columns.
+    """
+    try:
+        invoices, next_cursor = await crud.list_user_invoices_async(
+            db, user_id, limit=limit, cursor=cursor,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            skip=skip,
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fields:
+        # Partial rows do not fit InvoiceRead; same envelope, not validated against it
+        return JSONResponse(jsonable_encoder({"items": invoices, "next_cursor": next_cursor}), headers=headers)
+    response.headers.update(headers)
+    return schemas.InvoicePage(items=invoices, next_cursor=next_cursor)
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows per chunk written to the client
+EXPORT_CHUNK_ROWS = 500
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _export_chunks(session_factory, user_id: str, format: str, filters: dict):
+    """Encode invoices as NDJSON or CSV, a chunk of rows at a time, in a session of its own."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == "csv" else None
+    if writer:
+        writer.writerow(crud.INVOICE_FIELDS)
+    pending = 0
+    with session_factory() as db:
+        for row in crud.iter_user_invoices(db, user_id, **filters):
+            values = [_export_value(value) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(crud.INVOICE_FIELDS, values)), separators=(",", ":")))
+                buffer.write("\n")
+            pending += 1
+            if pending >= EXPORT_CHUNK_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@app.get("/invoices/export")
+def export_invoices(
+    format: str = "ndjson",
+    status: Optional[models.InvoiceStatus] = None,
+    since: Optional[datetime] = Query(None, description="Only invoices at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only invoices before this time"),
+    session_factory=Depends(get_session_factory),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Stream all of the user's invoices as NDJSON or CSV, oldest first"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    filters = {"status": status, "since": since, "until": until}
+    return StreamingResponse(
+        _export_chunks(session_factory, user_id, format, filters),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="invoices.{format}"'},
+    )
 
 @app.get("/invoices/{invoice_id}", response_model=schemas.InvoiceRead)
-def read_invoice(invoice_id: UUID, db: Session = Depends(get_db)):
-    inv = crud.get_invoice(db, invoice_id)
+async def read_invoice(invoice_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    inv = await crud.get_invoice_async(db, invoice_id)
     if not inv:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return inv
 
+QR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+@app.get("/invoices/{invoice_id}/qr")
+async def read_invoice_qr(invoice_id: UUID, request: Request, format: str = "png", db: AsyncSession = Depends(get_async_db)):
+    """Raw QR code image (PNG or SVG) for an invoice"""
+    if format not in qr_code.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'png' or 'svg'")
+    # The payload depends only on the invoice id, so the ETag is known up front
+    qr_data = qr_code.create_invoice_qr_data(invoice_id=str(invoice_id))
+    etag = qr_code.qr_etag(qr_data, format)
+    headers = {"ETag": etag, "Cache-Control": QR_CACHE_CONTROL}
+    # Looked up first: an id that never existed, or no longer does, is a 404 even with a matching ETag
+    if not await crud.get_invoice_async(db, invoice_id):
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Rendering is CPU work; keep it off the event loop
+    image, media_type = await run_in_threadpool(qr_code.render_qr_image, qr_data, format)
+    return Response(content=image, media_type=media_type, headers=headers)
+
 @app.patch("/invoices/{invoice_id}", response_model=schemas.InvoiceRead)
-def patch_invoice(invoice_id: UUID, db: Session = Depends(get_db)):
-    inv = crud.cancel_invoice(db, invoice_id)
+async def patch_invoice(invoice_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    inv = await crud.cancel_invoice_async(db, invoice_id)
     if not inv:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return inv
 
+def _ledger_in_process() -> bool:
+    """Whether ledger reads are in-memory index probes of this process's file ledger."""
+    return ledger.settings.backend == "file" and not ledger.settings.socket
+
+
+def _ledger_in_database() -> bool:
+    """Whether the ledger is the `chain_records` table of the app database."""
+    return ledger.settings.backend == "postgres" and not ledger.settings.socket
+
+
+async def _ledger_version(db: AsyncSession):
+    if _ledger_in_database():
+        # The head row is in this database: read it on the request's session
+        return await crud.get_chain_version_async(db)
+    return await _ledger_call(blockchain.ledger_version)
+
+
+async def _ledger_call(fn, *args):
+    # The ledger service (a socket round trip) and the database backends can
+    # block for a while, so only the in-process file ledger is called inline
+    if _ledger_in_process():
+        return fn(*args)
+    return await run_in_threadpool(fn, *args)
+
+
+async def _cache_call(cache: verify_cache.VerificationCache, fn, *args):
+    # A shared cache is a SQLite file that another worker may hold locked
+    if cache.shared:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+async def _verification_entries(db: AsyncSession, invoice_ids: List[UUID]) -> Dict[UUID, Dict[str, Any]]:
+    """
+    Verification outcomes (see `verify_cache.make_entry`) for `invoice_ids`,
+    from the cache where possible; unknown invoices are left out. Misses are
+    loaded with one query and resolved against the ledger in one pass.
+    """
+    cache = verify_cache.get()
+    started = time.perf_counter()
+    # Read once per request: cached entries are checked against it, and new
+    # ones record it; read before the lookups, so a concurrent append makes
+    # those stale
+    version = await _ledger_version(db)
+    # Before any invoice is loaded: invalidations from here on veto our stores
+    since = time.time()
+    unique = list(dict.fromkeys(invoice_ids))
+    entries = await _cache_call(cache, cache.lookup_many, unique, version) if cache is not None else {}
+    missing = [invoice_id for invoice_id in unique if invoice_id not in entries]
+    if cache is not None and entries:
+        cache.record(True, time.perf_counter() - started, len(entries))
+    if not missing:
+        return entries
+
+    started = time.perf_counter()
+    if _ledger_in_database():
+        # The ledger is a table in this database: invoices and records in one query
+        found = await crud.get_invoices_on_ledger_async(db, missing)
+        invoices = {invoice_id: invoice for invoice_id, (invoice, _) in found.items()}
+        records = {invoice.blockchain_hash: record for invoice, record in found.values() if record is not None}
+    else:
+        if len(missing) == 1:
+            invoice = await crud.get_invoice_async(db, missing[0])
+            invoices = {missing[0]: invoice} if invoice is not None else {}
+        else:
+            invoices = await crud.get_invoices_async(db, missing)
+        hashes = [inv.blockchain_hash for inv in invoices.values() if inv.blockchain_hash]
+        if len(hashes) > 1:
+            records = await run_in_threadpool(blockchain.verify_hashes, hashes)
+        else:
+            # With the in-process file ledger an index probe and one positioned read
+            records = await _ledger_call(blockchain.verify_hashes, hashes) if hashes else {}
+    outcomes = [
+        (invoice, records.get(invoice.blockchain_hash) if invoice.blockchain_hash else None) for invoice in invoices.values()
+    ]
+    if cache is not None:
+        made = await _cache_call(cache, cache.store_many, outcomes, version, since)
+    else:
+        made = [verify_cache.make_entry(invoice, record, version) for invoice, record in outcomes]
+    entries.update(zip(invoices, made))
+    if cache is not None:
+        cache.record(False, time.perf_counter() - started, len(missing))
+    return entries
+
+
+def _verification_error(entry: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Why `entry` does not verify against the ledger, or None if it does."""
+    if entry is None:
+        return "Invoice not found"
+    if not entry["hash"]:
+        return "Invoice not registered on blockchain"
+    if not entry["on_ledger"]:
+        return "Invoice hash not found in blockchain ledger"
+    if not entry["tx_ref_ok"]:
+        return "Blockchain transaction reference mismatch"
+    return None
+
+
 @app.post("/invoices/verify", response_model=schemas.InvoiceVerifyResponse)
-def verify_invoice(verify_request: schemas.InvoiceVerify, db: Session = Depends(get_db)):
+async def verify_invoice(verify_request: schemas.InvoiceVerify, db: AsyncSession = Depends(get_async_db)):
     """Verify an invoice against the blockchain ledger"""
     try:
-        # Get invoice from database
-        invoice = crud.get_invoice(db, verify_request.invoice_id)
-        if not invoice:
-            return schemas.InvoiceVerifyResponse(
-                valid=False,
-                error="Invoice not found"
-            )
+        # Invoice, ledger record and tx_ref check; cached until either changes
+        entries = await _verification_entries(db, [verify_request.invoice_id])
+        entry = entries.get(verify_request.invoice_id)
+        error = _verification_error(entry)
+        if error:
+            return schemas.InvoiceVerifyResponse(valid=False, error=error)
         
-        # Check if invoice has blockchain hash
-        if not invoice.blockchain_hash:
-            return schemas.InvoiceVerifyResponse(
-                valid=False,
-                error="Invoice not registered on blockchain"
-            )
-        
-        # Verify hash exists in blockchain ledger
-        blockchain_record = blockchain.verify_hash(invoice.blockchain_hash)
-        if not blockchain_record:
-            return schemas.InvoiceVerifyResponse(
-                valid=False,
-                error="Invoice hash not found in blockchain ledger"
-            )
-        
-        # Verify the transaction reference matches
-        if blockchain_record.get("tx_ref") != invoice.blockchain_tx_ref:
-            return schemas.InvoiceVerifyResponse(
-                valid=False,
-                error="Blockchain transaction reference mismatch"
-            )
+        # Attach a Merkle inclusion proof that can be checked offline
+        proof = None
+        if verify_request.include_proof:
+            # Reads the ledger (under the file ledger's lock), so run it off the event loop
+            proof = await run_in_threadpool(blockchain.get_inclusion_proof, entry["hash"])
         
         return schemas.InvoiceVerifyResponse(
             valid=True,
-            invoice=invoice
+            invoice=entry["invoice"],
+            proof=proof
         )
         
     except Exception as e:
@@ -113,58 +514,52 @@ def verify_invoice(verify_request: schemas.InvoiceVerify, db: Session = Depends(
             error=f"Verification failed: {str(e)}"
         )
 
+class _Rejected(Exception):
+    """A verification failure reported to the client as (error, message)."""
+
+    def __init__(self, error: str, message: Optional[str] = None):
+        super().__init__(error)
+        self.error = error
+        self.message = message
+
+
+def _read_verify_qr(raw: str) -> Tuple[UUID, str]:
+    """Return (invoice id, blockchain hash) from scanned QR data, or raise _Rejected."""
+    try:
+        qr_data = qr_code.parse_qr_data(raw)
+    except ValueError as e:
+        raise _Rejected("Invalid QR code format", str(e))
+    if qr_data.get("type") != "zra_invoice":
+        raise _Rejected("Invalid QR code type", "This QR code is not a ZRA invoice")
+    invoice_id = qr_data.get("invoice_id")
+    blockchain_hash = qr_data.get("blockchain_hash")
+    if not invoice_id or not blockchain_hash:
+        raise _Rejected("Incomplete QR code data", "QR code is missing required fields")
+    try:
+        return UUID(str(invoice_id)), blockchain_hash
+    except ValueError:
+        raise _Rejected("Invalid invoice ID format")
+
+
 @app.post("/invoices/verify-qr", response_model=schemas.QRVerifyResponse)
-def verify_invoice_qr(qr_request: schemas.QRVerifyRequest, db: Session = Depends(get_db)):
-    """Verify an invoice using QR code data"""
+async def verify_invoice_qr(qr_request: schemas.QRVerifyRequest, include_qr: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """Verify an invoice using QR code data. Pass include_qr=true to get the QR code inline"""
     try:
-        # Parse QR code data
-        try:
-            qr_data = qr_code.parse_qr_data(qr_request.qr_data)
-        except ValueError as e:
-            return schemas.QRVerifyResponse(
-                valid=False,
-                error="Invalid QR code format",
-                message=str(e)
-            )
-        
-        # Validate QR code structure
-        if qr_data.get("type") != "zra_invoice":
-            return schemas.QRVerifyResponse(
-                valid=False,
-                error="Invalid QR code type",
-                message="This QR code is not a ZRA invoice"
-            )
-        
-        invoice_id = qr_data.get("invoice_id")
-        blockchain_hash = qr_data.get("blockchain_hash")
-        
-        if not invoice_id or not blockchain_hash:
-            return schemas.QRVerifyResponse(
-                valid=False,
-                error="Incomplete QR code data",
-                message="QR code is missing required fields"
-            )
-        
-        # Get invoice from database
-        from uuid import UUID
+        # Parse and validate QR code data
         try:
-            invoice_uuid = UUID(invoice_id)
-            invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_uuid).first()
-        except ValueError:
-            return schemas.QRVerifyResponse(
-                valid=False,
-                error="Invalid invoice ID format"
-            )
-        
-        if not invoice:
+            invoice_uuid, blockchain_hash = _read_verify_qr(qr_request.qr_data)
+        except _Rejected as r:
+            return schemas.QRVerifyResponse(valid=False, error=r.error, message=r.message)
+        entry = (await _verification_entries(db, [invoice_uuid])).get(invoice_uuid)
+        if entry is None:
             return schemas.QRVerifyResponse(
                 valid=False,
                 error="Invoice not found",
-                message=f"No invoice found with ID: {invoice_id}"
+                message=f"No invoice found with ID: {invoice_uuid}"
             )
         
         # Verify blockchain hash matches
-        if invoice.blockchain_hash != blockchain_hash:
+        if entry["hash"] != blockchain_hash:
             return schemas.QRVerifyResponse(
                 valid=False,
                 error="Hash mismatch",
@@ -172,24 +567,22 @@ def verify_invoice_qr(qr_request: schemas.QRVerifyRequest, db: Session = Depends
             )
         
         # Verify hash exists in blockchain ledger
-        blockchain_record = blockchain.verify_hash(blockchain_hash)
-        if not blockchain_record:
+        if not entry["on_ledger"]:
             return schemas.QRVerifyResponse(
                 valid=False,
                 error="Hash not found in blockchain",
                 message="Invoice hash not found in blockchain ledger"
             )
         
-        # Generate QR code for response
-        try:
-            qr_data_new = qr_code.create_invoice_qr_data(
-                invoice_id=str(invoice.id),
-                blockchain_hash=invoice.blockchain_hash or "",
-                timestamp=invoice.timestamp.isoformat()
-            )
-            invoice.qr_code = qr_code.generate_qr_code(qr_data_new, format="png")
-        except Exception:
-            pass  # QR generation is optional for verification
+        invoice = entry["invoice"]
+        # Generate QR code for response (opt-in; GET /invoices/{id}/qr serves the image)
+        if include_qr:
+            try:
+                qr_data_new = qr_code.create_invoice_qr_data(invoice_id=str(invoice_uuid))
+                # A copy: the cached entry is shared
+                invoice = dict(invoice, qr_code=await run_in_threadpool(qr_code.generate_qr_code, qr_data_new, "png"))
+            except Exception:
+                pass  # QR generation is optional for verification
         
         return schemas.QRVerifyResponse(
             valid=True,
@@ -202,3 +595,43 @@ def verify_invoice_qr(qr_request: schemas.QRVerifyRequest, db: Session = Depends
             valid=False,
             error=f"Verification failed: {str(e)}"
         )
+
+@app.post("/invoices/verify-batch", response_model=schemas.BatchVerifyResponse)
+async def verify_invoices_batch(batch: schemas.BatchVerifyRequest, db: AsyncSession = Depends(get_async_db)):
+    """Verify many invoices (by ID or scanned QR data) at once; reports a result per item, in order"""
+    if len(batch.items) > VERIFY_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {VERIFY_BATCH_MAX_ITEMS} items)")
+
+    results = [schemas.BatchVerifyResult(index=i, valid=False) for i in range(len(batch.items))]
+    # (result index, invoice id, hash the QR code claims or None)
+    wanted: List[Tuple[int, UUID, Optional[str]]] = []
+    for i, item in enumerate(batch.items):
+        try:
+            if item.qr_data is not None:
+                invoice_id, claimed_hash = _read_verify_qr(item.qr_data)
+            else:
+                try:
+                    invoice_id, claimed_hash = UUID(item.invoice_id), None
+                except ValueError:
+                    raise _Rejected("Invalid invoice ID format")
+        except _Rejected as r:
+            results[i].error, results[i].message = r.error, r.message
+            continue
+        wanted.append((i, invoice_id, claimed_hash))
+
+    # Cached outcomes, then one IN query and one ledger pass for the rest
+    entries = await _verification_entries(db, [invoice_id for _, invoice_id, _ in wanted])
+
+    for i, invoice_id, claimed_hash in wanted:
+        result = results[i]
+        entry = entries.get(invoice_id)
+        if entry is not None and entry["hash"] and claimed_hash is not None and claimed_hash != entry["hash"]:
+            result.error, result.message = "Hash mismatch", "QR code hash does not match database record"
+            continue
+        result.error = _verification_error(entry)
+        if result.error is None:
+            result.valid = True
+            result.invoice = schemas.InvoiceRead.model_validate(entry["invoice"])
+
+    valid = sum(1 for r in results if r.valid)
+    return schemas.BatchVerifyResponse(valid=valid, invalid=len(results) - valid, results=results)
@@ -1 +1 @@
-from .models import Invoice, InvoiceStatus
+from .models import Invoice, InvoiceStatus, AnchorOutbox, AnchorStatus, ChainRecord, ChainBlock, ChainHead
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, Text, UUID, Sequence, text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Enum, Text, UUID, Sequence, ForeignKey, Index, JSON, UniqueConstraint, text
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -14,6 +14,8 @@ class InvoiceStatus(str, enum.Enum):
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    # Named as in migration 5e8b2a7c4d10, so autogenerate sees no difference
+    __table_args__ = (UniqueConstraint("fingerprint", name="uq_invoices_fingerprint"),)
 
     id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
     invoice_number = Column(
@@ -38,8 +40,91 @@ class Invoice(Base):
     amount = Column(Float, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(Enum(InvoiceStatus), default=InvoiceStatus.PENDING, nullable=False)
+    # Normalized supplier/buyer/amount/vat digest; the unique index rejects duplicates
+    fingerprint = Column(String(64), nullable=True)
     
     # Blockchain fields
     blockchain_hash = Column(String(64), nullable=True, index=True)
     blockchain_tx_ref = Column(String(32), nullable=True, index=True)
     blockchain_timestamp = Column(DateTime(timezone=True), nullable=True)
+
+
+# Keyset pagination of a user's invoices (GET /invoices), newest first
+Index(
+    "ix_invoices_user_timestamp_id",
+    Invoice.user_id,
+    Invoice.timestamp.desc(),
+    Invoice.id.desc(),
+)
+
+
+class AnchorStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    FAILED = "FAILED"
+
+
+class AnchorOutbox(Base):
+    """
+    Invoices waiting to be anchored on the blockchain ledger.
+
+    A row is written in the same transaction as its invoice and deleted once
+    the background anchoring worker has back-filled the invoice's
+    `blockchain_tx_ref`. Rows that keep failing end up as FAILED.
+    """
+    __tablename__ = "anchor_outbox"
+    __table_args__ = (Index("ix_anchor_outbox_due", "status", "next_attempt_at"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    invoice_id = Column(UUID, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False, unique=True)
+    blockchain_hash = Column(String(64), nullable=False)
+    status = Column(Enum(AnchorStatus), default=AnchorStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ChainRecord(Base):
+    """
+    A ledger record, when the ledger lives in the app database
+    (LEDGER_BACKEND=postgres). Rows are only ever appended, in `seq` order.
+    Each carries the chain hash of the row before it (`prev_hash`) and its
+    own (`chain_hash`, see `merkle.chain_hash`), so an edited or removed row
+    breaks the chain from there on.
+    """
+    __tablename__ = "chain_records"
+
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False)
+    hash = Column(String(64), nullable=False, unique=True)
+    tx_ref = Column(String(32), nullable=False, unique=True)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    meta = Column("metadata", JSON, nullable=False)
+    prev_hash = Column(String(64), nullable=False)
+    chain_hash = Column(String(64), nullable=False)
+
+
+class ChainBlock(Base):
+    """Merkle block over the `chain_records` rows `first_seq`..`last_seq`."""
+    __tablename__ = "chain_blocks"
+
+    height = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False)
+    prev_hash = Column(String(64), nullable=False)
+    merkle_root = Column(String(64), nullable=False)
+    count = Column(Integer, nullable=False)
+    sealed_at = Column(String(32), nullable=False)
+    first_seq = Column(BigInteger, nullable=False)
+    last_seq = Column(BigInteger, nullable=False, unique=True)
+    block_hash = Column(String(64), nullable=False)
+
+
+class ChainHead(Base):
+    """
+    The single row (id 1) locked by every append: the last `seq` and chain
+    hash, plus an id that changes when the ledger is cleared.
+    """
+    __tablename__ = "chain_head"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    ledger_id = Column(BigInteger, nullable=False)
+    last_seq = Column(BigInteger, nullable=False)
+    chain_hash = Column(String(64), nullable=False)
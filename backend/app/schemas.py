@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, ConfigDict, computed_field
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict, computed_field, model_validator
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from app.models.models import InvoiceStatus
 from uuid import UUID
@@ -22,7 +22,7 @@ class InvoiceRead(BaseModel):
     buyer_tpin: str
     vat: float
     amount: float
-    timestamp: datetime
+    timestamp: Optional[datetime] = None  # nullable column; normally set by the database
     status: InvoiceStatus
     
     # Blockchain fields
@@ -34,15 +34,35 @@ class InvoiceRead(BaseModel):
     qr_code: Optional[str] = None
     
 
+class InvoicePage(BaseModel):
+    items: List[InvoiceRead]
+    next_cursor: Optional[str] = Field(None, description="Pass back as `cursor` for the next page; null on the last page")
+
+
+class BulkInvoiceResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the uploaded batch")
+    ok: bool
+    invoice: Optional[InvoiceRead] = None
+    error: Optional[str] = None
+
+
+class BulkInvoiceResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkInvoiceResult]
+
 
 class InvoiceVerify(BaseModel):
     invoice_id: UUID = Field(..., description="Invoice ID to verify")
+    include_proof: bool = Field(False, description="Include a Merkle inclusion proof for offline auditing")
 
 
 class InvoiceVerifyResponse(BaseModel):
     valid: bool
     invoice: Optional[InvoiceRead] = None
     error: Optional[str] = None
+    # Merkle inclusion proof (record, sibling path, block header)
+    proof: Optional[Dict[str, Any]] = None
 
 
 class QRVerifyRequest(BaseModel):
@@ -54,3 +74,32 @@ class QRVerifyResponse(BaseModel):
     invoice: Optional[InvoiceRead] = None
     error: Optional[str] = None
     message: Optional[str] = None
+
+
+class BatchVerifyItem(BaseModel):
+    invoice_id: Optional[str] = Field(None, description="Invoice ID to verify")
+    qr_data: Optional[str] = Field(None, description="QR code data string (JSON)")
+
+    @model_validator(mode="after")
+    def _one_of(self):
+        if (self.invoice_id is None) == (self.qr_data is None):
+            raise ValueError("each item needs exactly one of invoice_id or qr_data")
+        return self
+
+
+class BatchVerifyRequest(BaseModel):
+    items: List[BatchVerifyItem]
+
+
+class BatchVerifyResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    valid: bool
+    invoice: Optional[InvoiceRead] = None
+    error: Optional[str] = None
+    message: Optional[str] = None
+
+
+class BatchVerifyResponse(BaseModel):
+    valid: int
+    invalid: int
+    results: List[BatchVerifyResult]
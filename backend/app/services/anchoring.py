@@ -0,0 +1,195 @@
+"""
+Background anchoring of invoices on the blockchain ledger.
+
+`crud.create_invoice` writes the invoice and an `AnchorOutbox` row in one
+transaction and returns straight away. A small pool of worker threads
+drains the outbox: each pass claims a batch of due rows (`FOR UPDATE SKIP
+LOCKED`, so several workers or processes can share the table), appends the
+whole batch to the ledger in one write, back-fills `blockchain_tx_ref` /
+`blockchain_timestamp` on the invoices and deletes the outbox rows.
+
+Failures are recorded on the outbox row and retried with exponential
+backoff until `max_attempts`, after which the row is left as FAILED for
+inspection instead of being silently dropped.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.services import blockchain, verify_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class AnchorWorker:
+    """Pool of threads that anchor pending invoices in batches."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int = 2,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_attempts: int = 10,
+        backoff_base: float = 1.0,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self._stats = {"anchored": 0, "batches": 0, "retries": 0, "failed": 0}
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"anchor-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Wake the workers (new rows were just committed)."""
+        self._wake.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, **increments: int) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.session_factory() as db:
+                    anchored = self.run_once(db)
+            except Exception:
+                logger.exception("Anchoring pass failed")
+                anchored = 0
+            if anchored < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self, db: Session) -> int:
+        """Anchor one batch of due outbox rows. Returns the number of rows claimed."""
+        now = datetime.now(timezone.utc)
+        rows = (
+            db.query(models.AnchorOutbox)
+            .filter(
+                models.AnchorOutbox.status == models.AnchorStatus.PENDING,
+                models.AnchorOutbox.next_attempt_at <= now,
+            )
+            .order_by(models.AnchorOutbox.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not rows:
+            db.rollback()
+            return 0
+
+        invoice_ids = [row.invoice_id for row in rows]
+        try:
+            self._anchor(db, rows)
+            db.commit()
+            # Cached "not on the ledger yet" outcomes for these are now wrong
+            verify_cache.invalidate(*invoice_ids)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Failed to anchor %d invoices: %s", len(rows), e)
+            self._record_failure(db, [row.id for row in rows], str(e))
+        return len(rows)
+
+    def _anchor(self, db: Session, rows: List[models.AnchorOutbox]) -> None:
+        invoices = {
+            inv.id: inv
+            for inv in db.query(models.Invoice).filter(models.Invoice.id.in_([row.invoice_id for row in rows]))
+        }
+        records: Dict[Any, Dict[str, Any]] = {}
+        entries, pending = [], []
+        # A previous attempt may have reached the ledger before its DB commit
+        # failed; reuse those records instead of anchoring twice. One probe
+        # for the whole batch.
+        on_ledger = blockchain.verify_hashes([row.blockchain_hash for row in rows])
+        for row in rows:
+            invoice = invoices.get(row.invoice_id)
+            if invoice is None:
+                continue
+            existing = on_ledger.get(row.blockchain_hash)
+            if existing and existing.get("metadata", {}).get("invoice_id") == str(invoice.id):
+                records[invoice.id] = existing
+                continue
+            entries.append((row.blockchain_hash, {
+                "invoice_id": str(invoice.id),
+                "supplier_tpin": invoice.supplier_tpin,
+                "buyer_tpin": invoice.buyer_tpin,
+            }))
+            pending.append(invoice.id)
+
+        if entries:
+            for invoice_id, record in zip(pending, blockchain.submit_batch_to_chain(entries)):
+                records[invoice_id] = record
+
+        for invoice_id, record in records.items():
+            invoice = invoices[invoice_id]
+            invoice.blockchain_tx_ref = record["tx_ref"]
+            invoice.blockchain_timestamp = _parse_timestamp(record["timestamp"])
+        for row in rows:
+            db.delete(row)
+        self._count(anchored=len(records), batches=1)
+
+    def _record_failure(self, db: Session, row_ids: List[int], error: str) -> None:
+        now = datetime.now(timezone.utc)
+        try:
+            for row in db.query(models.AnchorOutbox).filter(models.AnchorOutbox.id.in_(row_ids)):
+                row.attempts += 1
+                row.last_error = error[:1000]
+                if row.attempts >= self.max_attempts:
+                    row.status = models.AnchorStatus.FAILED
+                    self._count(failed=1)
+                else:
+                    row.next_attempt_at = now + timedelta(seconds=self.backoff_base * 2 ** (row.attempts - 1))
+                    self._count(retries=1)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Could not record anchoring failure")
+
+
+_worker: Optional[AnchorWorker] = None
+
+
+def configure(worker: Optional[AnchorWorker]) -> None:
+    """Install the process-wide worker that `notify()` wakes up."""
+    global _worker
+    _worker = worker
+
+
+def notify() -> None:
+    if _worker is not None:
+        _worker.notify()
@@ -1,15 +1,16 @@
 import json
 import hashlib
-import uuid
-from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.services import ledger, metrics, verify_cache
 
 
 def _resolve_path(path: Optional[Union[str, Path]] = None) -> Path:
-    return Path(path) if path is not None else Path("ledger.json")
+    return Path(path) if path is not None else Path(ledger.settings.path)
 
 
+@metrics.timed("hash_invoice")
 def hash_invoice(invoice: Dict[str, Any]) -> str:
     """
     Deterministic SHA256 over canonical JSON (sorted keys, compact separators).
@@ -19,59 +20,80 @@ def hash_invoice(invoice: Dict[str, Any]) -> str:
     return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
+@metrics.timed("submit_to_chain")
 def submit_to_chain(h: str, metadata: Dict[str, Any], path: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
     """
-    Append a record to a local JSON 'ledger' (simulates blockchain).
+    Append a record to the local append-only ledger (simulates blockchain).
     Returns the created record which includes `tx_ref`, `hash`, `metadata`, `timestamp`.
     """
-    ledger_path = _resolve_path(path)
-    records = []
-    if ledger_path.exists():
-        try:
-            with ledger_path.open("r", encoding="utf-8") as f:
-                records = json.load(f)
-        except Exception:
-            records = []
-
-    record = {
-        "hash": h,
-        "metadata": metadata,
-        "tx_ref": uuid.uuid4().hex,
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-    }
-    records.append(record)
+    return ledger.open_ledger(_resolve_path(path)).append(h, metadata)
 
-    ledger_path.parent.mkdir(parents=True, exist_ok=True)
-    with ledger_path.open("w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
 
-    return record
+@metrics.timed("submit_batch_to_chain")
+def submit_batch_to_chain(
+    entries: Sequence[Tuple[str, Dict[str, Any]]], path: Optional[Union[str, Path]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Append several `(hash, metadata)` entries in one ledger write.
+    Returns the created records in the same order.
+    """
+    return ledger.open_ledger(_resolve_path(path)).append_many(entries)
 
 
+@metrics.timed("verify_hash")
 def verify_hash(h: str, path: Optional[Union[str, Path]] = None) -> Optional[Dict[str, Any]]:
     """
     Return the ledger record for hash `h` or None if not found.
     """
-    ledger_path = _resolve_path(path)
-    if not ledger_path.exists():
+    try:
+        return ledger.open_ledger(_resolve_path(path)).find(h)
+    except Exception:
         return None
 
+
+@metrics.timed("verify_hashes")
+def verify_hashes(hashes: Sequence[str], path: Optional[Union[str, Path]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Return the ledger records of all hashes in `hashes` found on the ledger,
+    keyed by hash, reading the ledger once.
+    """
+    try:
+        return ledger.open_ledger(_resolve_path(path)).find_many(hashes)
+    except Exception:
+        return {}
+
+
+def ledger_version(path: Optional[Union[str, Path]] = None) -> Optional[Tuple[int, int]]:
+    """
+    Current `(identity, position)` of the ledger; changes whenever it does.
+    """
     try:
-        with ledger_path.open("r", encoding="utf-8") as f:
-            records = json.load(f)
+        return ledger.open_ledger(_resolve_path(path)).version()
     except Exception:
         return None
 
-    for r in records:
-        if r.get("hash") == h:
-            return r
-    return None
+
+@metrics.timed("inclusion_proof")
+def get_inclusion_proof(h: str, path: Optional[Union[str, Path]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Return a Merkle inclusion proof for hash `h` or None if not found.
+    The proof can be checked offline with `verify_inclusion_proof`.
+    """
+    return ledger.open_ledger(_resolve_path(path)).inclusion_proof(h)
+
+
+def verify_inclusion_proof(proof: Dict[str, Any]) -> bool:
+    """
+    Check an inclusion proof without reading the ledger.
+    """
+    return ledger.verify_inclusion_proof(proof)
 
 
 def clear_ledger(path: Optional[Union[str, Path]] = None) -> None:
     ledger_path = _resolve_path(path)
     try:
-        if ledger_path.exists():
-            ledger_path.unlink()
+        ledger.open_ledger(ledger_path).clear()
     except Exception:
         pass
+    ledger.close_ledger(ledger_path)
+    verify_cache.clear()
@@ -0,0 +1,114 @@
+"""
+Bloom filters for cheap "definitely not seen" membership checks.
+
+`BloomFilter` is a fixed-size filter sized from an expected item count and a
+target false-positive rate. `ScalableBloomFilter` chains filters of growing
+capacity (and tightening error rates) so it never has to be rebuilt as the
+number of items grows past the initial estimate.
+
+Keys are bytes; callers that already have a cryptographic digest (such as an
+invoice fingerprint) can pass it straight in as bytes; strings and short
+keys are hashed with BLAKE2b first. Bit positions come from double hashing the two 64-bit halves
+of the key.
+"""
+
+import hashlib
+import math
+import threading
+from typing import Dict, List, Tuple, Union
+
+Key = Union[bytes, str]
+
+
+def _halves(key: Key) -> Tuple[int, int]:
+    if isinstance(key, str):
+        key = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    elif len(key) < 16:
+        key = hashlib.blake2b(key, digest_size=16).digest()
+    return int.from_bytes(key[:8], "little"), int.from_bytes(key[8:16], "little") | 1
+
+
+class BloomFilter:
+    """Fixed-capacity Bloom filter over a bytearray."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: Key):
+        h1, h2 = _halves(key)
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key: Key) -> None:
+        bits = self._bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: Key) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    def false_positive_rate(self) -> float:
+        """Estimated false-positive probability at the current fill."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by adding stages. Each new stage doubles the
+    capacity and halves the error rate, keeping the compound false-positive
+    rate bounded by roughly twice the initial rate.
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, initial_capacity: int = 100_000, error_rate: float = 0.01):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._stages: List[BloomFilter] = [BloomFilter(initial_capacity, error_rate * (1 - self.TIGHTENING))]
+
+    def add(self, key: Key) -> None:
+        with self._lock:
+            stage = self._stages[-1]
+            if stage.count >= stage.capacity:
+                stage = BloomFilter(stage.capacity * self.GROWTH, stage.error_rate * self.TIGHTENING)
+                self._stages.append(stage)
+            stage.add(key)
+
+    def __contains__(self, key: Key) -> bool:
+        return any(key in stage for stage in self._stages)
+
+    def __len__(self) -> int:
+        return sum(stage.count for stage in self._stages)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(stage.size_bytes for stage in self._stages)
+
+    def false_positive_rate(self) -> float:
+        miss = 1.0
+        for stage in self._stages:
+            miss *= 1 - stage.false_positive_rate()
+        return 1 - miss
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "items": len(self),
+            "stages": len(self._stages),
+            "size_bytes": self.size_bytes,
+            "estimated_fp_rate": self.false_positive_rate(),
+        }
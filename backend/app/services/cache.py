@@ -0,0 +1,267 @@
+"""
+Small thread-safe caches shared by the services: `LRUCache` lives in the
+process, `SQLiteCache` is shared by every worker process on the host.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and, optionally, by the
+    total size of its values as measured by `sizeof`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            self._put(key, value, size)
+
+    def put_unless(self, key: Hashable, value: Any, veto: Callable[[Any], bool]) -> bool:
+        """
+        `put`, unless `veto(current)` is true for the value cached under `key`
+        now; checked and stored atomically. Returns whether it was stored.
+        """
+        size = self._sizeof(value)
+        with self._lock:
+            current = self._data.get(key, _MISSING)
+            if current is not _MISSING and veto(current):
+                return False
+            return self._put(key, value, size)
+
+    def _put(self, key: Hashable, value: Any, size: int) -> bool:
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return False
+        if key in self._data:
+            self._bytes -= self._sizes[key]
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._sizes[key] = size
+        self._bytes += size
+        self._evict()
+        return True
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the cached value, computing and storing it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            # Built outside the lock; concurrent misses may both compute it
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.pop(key, default)
+            self._bytes -= self._sizes.pop(key, 0)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def resize(self, max_entries: int, max_bytes: Optional[int] = None) -> None:
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._data and (
+            len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key, _ = self._data.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteCache:
+    """
+    Key/value cache kept in a SQLite file, so that several worker processes
+    see (and invalidate) the same entries; a local stand-in for a shared
+    store such as Redis. Values must be JSON-serialisable and expire `ttl`
+    seconds after they are written. Same interface as `LRUCache`.
+    """
+
+    # Delete expired rows every this many writes
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: Union[str, Path], ttl: float = 3600.0, max_entries: int = 100_000):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?", (str(key), time.time())
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        conn = self._conn()
+        now = time.time()
+        self._insert(conn, key, value, now)
+        self._written(conn, now)
+
+    def put_unless(self, key: Hashable, value: Any, veto: Callable[[Any], bool]) -> bool:
+        """
+        `put`, unless `veto(current)` is true for the value cached under `key`
+        now; checked and stored in one transaction, so a write by another
+        process cannot land in between. Returns whether it was stored.
+        """
+        if self.max_entries <= 0:
+            return False
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ? AND expires > ?", (str(key), now)).fetchone()
+            if row is not None and veto(json.loads(row[0])):
+                conn.execute("ROLLBACK")
+                return False
+            self._insert(conn, key, value, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._written(conn, now)
+        return True
+
+    def _insert(self, conn: sqlite3.Connection, key: Hashable, value: Any, now: float) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (str(key), json.dumps(value, separators=(",", ":")), now + self.ttl),
+        )
+
+    def _written(self, conn: sqlite3.Connection, now: float) -> None:
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        removed = conn.execute("DELETE FROM cache WHERE expires <= ?", (now,)).rowcount
+        # Over the size bound: drop the entries closest to expiry (the oldest writes)
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires LIMIT ?)", (excess,)
+            ).rowcount
+        with self._lock:
+            self.evictions += removed
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        conn = self._conn()
+        row = conn.execute("DELETE FROM cache WHERE key = ? RETURNING value", (str(key),)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND expires > ?", (str(key), time.time())
+        ).fetchone()
+        return row is not None
+
+    def stats(self) -> Dict[str, Any]:
+        entries = len(self)
+        with self._lock:
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
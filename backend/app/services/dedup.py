@@ -0,0 +1,125 @@
+"""
+Duplicate-invoice detection.
+
+Two invoices are duplicates when they have the same supplier, buyer, amount
+and VAT. `fingerprint()` reduces those fields to a SHA-256 hex digest that is
+stored on `invoices.fingerprint` under a unique index, so the database
+rejects duplicates even when two requests race.
+
+`DuplicateFilter` keeps a Bloom filter of every fingerprint in the table,
+warmed at startup and updated on insert. A "no" from the filter is definite,
+so most new invoices skip the duplicate query entirely; a "maybe" falls back
+to an indexed lookup. Until warming has finished every check goes to the
+database.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.services.bloom import ScalableBloomFilter
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(supplier_tpin: str, buyer_tpin: str, amount: float, vat: float) -> str:
+    """Normalized duplicate key for an invoice."""
+    canonical = "|".join((supplier_tpin.strip(), buyer_tpin.strip(), repr(float(amount)), repr(float(vat))))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DuplicateFilter:
+    """Bloom-filter pre-check in front of the fingerprint index."""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.bloom = ScalableBloomFilter(capacity, error_rate)
+        self.ready = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"checks": 0, "probes_skipped": 0, "probes": 0, "false_positives": 0, "duplicates": 0}
+
+    def warm(self, session_factory: Callable[[], Session], batch_size: int = 10_000) -> int:
+        """Load every stored fingerprint. Returns the number loaded."""
+        loaded = 0
+        with session_factory() as db:
+            rows = (
+                db.query(models.Invoice.fingerprint)
+                .filter(models.Invoice.fingerprint.isnot(None))
+                .execution_options(yield_per=batch_size)
+            )
+            for (fp,) in rows:
+                self.bloom.add(bytes.fromhex(fp))
+                loaded += 1
+        self.ready = True
+        return loaded
+
+    def warm_in_background(self, session_factory: Callable[[], Session]) -> threading.Thread:
+        def run() -> None:
+            try:
+                logger.info("Duplicate filter warmed with %d fingerprints", self.warm(session_factory))
+            except Exception:
+                logger.exception("Could not warm the duplicate filter; duplicate checks will query the database")
+
+        thread = threading.Thread(target=run, name="dedup-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def might_exist(self, fp: str) -> bool:
+        """False only when `fp` is certainly not in the table."""
+        self._count(checks=1)
+        if self.ready and bytes.fromhex(fp) not in self.bloom:
+            self._count(probes_skipped=1)
+            return False
+        return True
+
+    def add(self, fp: str) -> None:
+        self.bloom.add(bytes.fromhex(fp))
+
+    def record_probe(self, found: bool) -> None:
+        """Count a database probe made after `might_exist` returned True."""
+        if found:
+            self._count(probes=1, duplicates=1)
+        elif self.ready:
+            self._count(probes=1, false_positives=1)
+        else:
+            self._count(probes=1)
+
+    def _count(self, **increments: int) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(self.bloom.stats())
+        stats["ready"] = self.ready
+        negatives = stats["probes_skipped"] + stats["false_positives"]
+        stats["observed_fp_rate"] = stats["false_positives"] / negatives if negatives else 0.0
+        return stats
+
+
+_filter: Optional[DuplicateFilter] = None
+
+
+def configure(duplicate_filter: Optional[DuplicateFilter]) -> None:
+    """Install the process-wide filter used by `might_exist`/`remember`."""
+    global _filter
+    _filter = duplicate_filter
+
+
+def might_exist(fp: str) -> bool:
+    return _filter.might_exist(fp) if _filter is not None else True
+
+
+def remember(fp: str) -> None:
+    if _filter is not None:
+        _filter.add(fp)
+
+
+def record_probe(found: bool) -> None:
+    if _filter is not None:
+        _filter.record_probe(found)
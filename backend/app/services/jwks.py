@@ -0,0 +1,190 @@
+"""
+Signing-key cache for Supabase JWT verification.
+
+`JWKSCache` keeps the project's JSON Web Key Set in memory, indexed by `kid`,
+so verifying a token never waits on the network:
+
+* keys are refreshed by a background thread before their cache lifetime
+  (`Cache-Control: max-age`, or `refresh_interval`) runs out;
+* a failed refresh keeps serving the keys already loaded and retries later,
+  so a JWKS endpoint hiccup does not turn into 401s;
+* a token with an unknown `kid` (key rotation) triggers an immediate
+  refetch, but at most once per `min_refetch_interval`, so garbage tokens
+  cannot hammer the endpoint;
+* the set can be bootstrapped from a local JWKS file, for offline use and
+  tests, with or without a URL to refresh from.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSCache:
+    """kid -> signing key map with background refresh."""
+
+    # Refresh once this fraction of the key set's lifetime has passed
+    REFRESH_AT = 0.8
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        local_path: Optional[Union[str, Path]] = None,
+        refresh_interval: float = 600.0,
+        min_refetch_interval: float = 30.0,
+        timeout: float = 5.0,
+    ):
+        if not url and not local_path:
+            raise ValueError("JWKSCache needs a JWKS URL or a local JWKS file")
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._keys: Dict[Optional[str], Any] = {}
+        self._fetch_lock = threading.Lock()
+        self._last_fetch = 0.0  # monotonic time of the last fetch attempt
+        self._next_refresh = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "fetches": 0,
+            "fetch_errors": 0,
+            "refetches_rate_limited": 0,
+            "last_refresh_ms": 0.0,
+            "max_refresh_ms": 0.0,
+        }
+        if local_path:
+            self.load_file(local_path)
+
+    # -- loading -------------------------------------------------------------
+
+    def load_file(self, path: Union[str, Path]) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            self._install(json.load(f))
+        # A file-only cache never refreshes; with a URL, refresh on schedule
+        self._next_refresh = time.monotonic() + self.refresh_interval * self.REFRESH_AT
+
+    def _install(self, jwks: Dict[str, Any]) -> None:
+        keys = {key.key_id: key for key in jwt.PyJWKSet.from_dict(jwks).keys}
+        self._keys = keys
+
+    def _fetch(self) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Download the key set. Returns (jwks, max-age seconds or None)."""
+        request = urllib.request.Request(self.url, headers={"User-Agent": "zra-invoice-service"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            max_age = _MAX_AGE.search(response.headers.get("Cache-Control", "") or "")
+            return json.load(response), float(max_age.group(1)) if max_age else None
+
+    def refresh(self) -> bool:
+        """Fetch the key set now. Returns False (keeping the old keys) on failure."""
+        if not self.url:
+            return False
+        with self._fetch_lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self) -> bool:
+        started = time.monotonic()
+        self._last_fetch = started
+        try:
+            jwks, max_age = self._fetch()
+            self._install(jwks)
+        except Exception as e:
+            self._count(fetch_errors=1)
+            self._next_refresh = started + self.min_refetch_interval
+            logger.warning("JWKS refresh from %s failed: %s", self.url, e)
+            return False
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        lifetime = max_age if max_age else self.refresh_interval
+        self._next_refresh = started + max(lifetime * self.REFRESH_AT, self.min_refetch_interval)
+        with self._stats_lock:
+            self._stats["fetches"] += 1
+            self._stats["last_refresh_ms"] = elapsed_ms
+            self._stats["max_refresh_ms"] = max(self._stats["max_refresh_ms"], elapsed_ms)
+        return True
+
+    # -- lookup --------------------------------------------------------------
+
+    def get_signing_key(self, kid: Optional[str]) -> Any:
+        """
+        Return the verification key for `kid`. Raises `jwt.PyJWKClientError`
+        when no such key is known even after an (allowed) refetch.
+        """
+        key = self._lookup(kid)
+        if key is not None:
+            self._count(hits=1)
+            return key.key
+        self._count(misses=1)
+
+        if self.url:
+            last = self._last_fetch
+            if not last or time.monotonic() - last >= self.min_refetch_interval:
+                with self._fetch_lock:
+                    # Concurrent misses share one fetch
+                    if self._last_fetch == last:
+                        self._refresh_locked()
+                key = self._lookup(kid)
+            else:
+                self._count(refetches_rate_limited=1)
+        if key is None:
+            raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key.key
+
+    def _lookup(self, kid: Optional[str]) -> Any:
+        keys = self._keys
+        key = keys.get(kid)
+        if key is None and kid is None and len(keys) == 1:
+            # Tokens without a kid are accepted when the set has a single key
+            key = next(iter(keys.values()))
+        return key
+
+    # -- background refresh --------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None or not self.url:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if time.monotonic() >= self._next_refresh:
+                self.refresh()
+            self._wake.wait(max(0.0, self._next_refresh - time.monotonic()))
+            self._wake.clear()
+
+    # -- metrics -------------------------------------------------------------
+
+    def _count(self, **increments: int) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["keys"] = len(self._keys)
+        stats["seconds_since_fetch"] = round(time.monotonic() - self._last_fetch, 1) if self._last_fetch else None
+        return stats
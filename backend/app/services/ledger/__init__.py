@@ -0,0 +1,146 @@
+"""
+Pluggable storage engines for the invoice ledger.
+
+`open_ledger(path)` returns the process-wide backend instance for a ledger
+path, so every caller shares the same file handles, locks and group-commit
+queue. `configure()` is called once at startup with values from
+`app.config`; the defaults suit tests and scripts.
+
+`backend` picks the storage engine: "file" (`FileLedger`, the default) or
+"sqlite" (`SqliteLedger`, a WAL-mode database that several processes can
+open at once) or "postgres" (`postgres.PostgresLedger`, tables in the app
+database; `path` is not used).
+
+With `socket` set, the ledger is owned by a separate service process
+(`python -m app.services.ledger.server`) and `open_ledger` returns a client
+for it instead; that is how several app worker processes share one ledger.
+"""
+
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Union
+
+from .base import LedgerBackend, LedgerError, make_record
+from .client import LedgerClient
+from .convert import convert_ledger
+from .file import FileLedger
+from .merkle import verify_inclusion_proof
+from .migrate import migrate_json_ledger
+from .sqlite import SqliteLedger
+from .writer import GroupCommitLedger
+
+
+@dataclass
+class LedgerSettings:
+    path: str = "ledger.json"
+    backend: str = "file"
+    fsync: bool = True
+    max_batch: int = 256
+    max_linger_ms: float = 2.0
+    block_size: int = 1024
+    segment_size: int = 64 * 1024 * 1024
+    compress_segments: bool = False
+    checkpoint_bytes: int = 64 * 1024 * 1024
+    checkpoint_keep: int = 2
+    record_format: str = "binary"
+    # Unix socket of the ledger service; empty = open the ledger files in-process
+    socket: str = ""
+
+
+DEFAULT_SOCKET = "/tmp/zra-ledger.sock"
+
+
+settings = LedgerSettings()
+
+_ledgers: Dict[Path, LedgerBackend] = {}
+_ledgers_lock = threading.Lock()
+
+
+def configure(**kwargs) -> None:
+    """Update ledger settings. Ledgers opened afterwards use the new values."""
+    for name, value in kwargs.items():
+        if not hasattr(settings, name):
+            raise TypeError(f"Unknown ledger setting: {name}")
+        setattr(settings, name, value)
+
+
+def _key(path: Union[str, Path]) -> Path:
+    return Path(path).absolute()
+
+
+def file_ledger(path: Path) -> FileLedger:
+    """A `FileLedger` for `path` with the current settings."""
+    return FileLedger(
+        path,
+        fsync=settings.fsync,
+        block_size=settings.block_size,
+        segment_size=settings.segment_size,
+        compress_segments=settings.compress_segments,
+        checkpoint_bytes=settings.checkpoint_bytes,
+        checkpoint_keep=settings.checkpoint_keep,
+        record_format=settings.record_format,
+    )
+
+
+def local_ledger(path: Path) -> LedgerBackend:
+    """The storage engine selected by `settings.backend` for `path`, with the current settings."""
+    if settings.backend == "file":
+        return file_ledger(path)
+    if settings.backend == "sqlite":
+        return SqliteLedger(path, fsync=settings.fsync, block_size=settings.block_size)
+    if settings.backend == "postgres":
+        # Imported here: it needs the app's database configuration
+        from app.database import engine
+        from .postgres import PostgresLedger
+
+        return PostgresLedger(engine, block_size=settings.block_size)
+    raise LedgerError(f"Unknown ledger backend: {settings.backend}")
+
+
+def _create(path: Path) -> LedgerBackend:
+    if settings.socket:
+        # The service owns the ledger at its own LEDGER_PATH
+        return LedgerClient(settings.socket)
+    return GroupCommitLedger(local_ledger(path), max_batch=settings.max_batch, max_linger=settings.max_linger_ms / 1000.0)
+
+
+def open_ledger(path: Union[str, Path]) -> LedgerBackend:
+    key = _key(path)
+    backend = _ledgers.get(key)
+    if backend is None:
+        with _ledgers_lock:
+            backend = _ledgers.get(key)
+            if backend is None:
+                backend = _create(key)
+                _ledgers[key] = backend
+    return backend
+
+
+def close_ledger(path: Union[str, Path]) -> None:
+    with _ledgers_lock:
+        backend = _ledgers.pop(_key(path), None)
+    if backend is not None:
+        backend.close()
+
+
+__all__ = [
+    "FileLedger",
+    "DEFAULT_SOCKET",
+    "GroupCommitLedger",
+    "LedgerBackend",
+    "LedgerClient",
+    "LedgerError",
+    "LedgerSettings",
+    "SqliteLedger",
+    "close_ledger",
+    "configure",
+    "convert_ledger",
+    "file_ledger",
+    "local_ledger",
+    "make_record",
+    "migrate_json_ledger",
+    "open_ledger",
+    "settings",
+    "verify_inclusion_proof",
+]
@@ -0,0 +1,82 @@
+"""
+Common pieces shared by every ledger backend.
+"""
+
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class LedgerError(RuntimeError):
+    """Raised when a ledger cannot be opened, read or written."""
+
+
+def make_record(h: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a new ledger record for hash `h`.
+    The shape matches what `submit_to_chain` has always returned.
+    """
+    return {
+        "hash": h,
+        "metadata": metadata,
+        "tx_ref": uuid.uuid4().hex,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+class LedgerBackend:
+    """
+    Interface implemented by ledger storage engines.
+
+    Backends only have to provide `append_many`, `find`, `iter_records` and
+    `clear`; the remaining methods have straightforward defaults.
+    """
+
+    def append(self, h: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return self.append_many([(h, metadata)])[0]
+
+    def append_many(self, entries: Sequence[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Append a record per `(hash, metadata)` and return the records in
+        order. Every backend stores a hash once: an entry whose hash is
+        already on the ledger, or earlier in `entries`, is not written and
+        gets the first record back, so it does not move `version` either.
+        """
+        raise NotImplementedError
+
+    def find(self, h: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def find_many(self, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Records for every hash in `hashes` that is in the ledger, keyed by hash."""
+        found = {}
+        for h in hashes:
+            record = self.find(h)
+            if record is not None:
+                found[h] = record
+        return found
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def version(self) -> Optional[Tuple[int, int]]:
+        """
+        `(identity, position)` of the ledger as seen by this process: the
+        position moves on every append and the identity changes when the
+        ledger is recreated, so results derived from the ledger can be cached
+        against it. None if not tracked.
+        """
+        return None
+
+    def inclusion_proof(self, h: str) -> Optional[Dict[str, Any]]:
+        """Merkle inclusion proof for hash `h` (see `merkle.verify_inclusion_proof`)."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_records()
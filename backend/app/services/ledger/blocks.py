@@ -0,0 +1,137 @@
+"""
+Block sealing for the file ledger.
+
+Records are grouped, in log order, into blocks of at most `block_size`
+records. Each block stores the Merkle root of its records' leaf hashes and
+the hash of the previous block, forming a chain. Blocks are kept in their
+own record log (`<ledger>.blocks`) and only reference the main log by
+offset, so sealing never rewrites ledger records.
+"""
+
+import bisect
+import json
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .codec import decode_record
+from .log import MAGIC, RecordLog
+from .merkle import GENESIS_HASH, block_hash, leaf_hash, merkle_root
+
+# Blocks whose leaf lists are kept around for proof generation
+LEAF_CACHE_SIZE = 16
+
+
+class BlockStore:
+    """
+    Sealed blocks plus the pending (not yet sealed) tail of the ledger.
+
+    Not thread-safe; the owning ledger serializes access with its lock.
+    """
+
+    def __init__(self, path: Union[str, Path], block_size: int = 1024, fsync: bool = True):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.path = Path(path)
+        self.block_size = block_size
+        self.blocks: List[Dict[str, Any]] = []
+        self.pending: List[Tuple[int, bytes]] = []
+        self._starts: List[int] = []
+        self._log = RecordLog(self.path, fsync=fsync)
+        self._leaf_cache: "OrderedDict[int, Tuple[List[int], List[bytes]]]" = OrderedDict()
+
+    def open(self) -> None:
+        self._log.open()
+        self.blocks = [json.loads(payload) for _, payload in self._log.scan()]
+        self._starts = [b["first_offset"] for b in self.blocks]
+
+    def close(self) -> None:
+        self._log.close()
+        self.blocks, self._starts, self.pending = [], [], []
+        self._leaf_cache.clear()
+
+    def reset(self) -> None:
+        """Drop every sealed block (used when they no longer match the log)."""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
+        self.open()
+
+    @property
+    def sealed_end(self) -> int:
+        """Log offset just past the last sealed record."""
+        return self.blocks[-1]["end_offset"] if self.blocks else len(MAGIC)
+
+    @property
+    def head_hash(self) -> str:
+        return self.blocks[-1]["block_hash"] if self.blocks else GENESIS_HASH
+
+    def has_head(self, height: int, head_hash: str) -> bool:
+        """Whether the chain's first `height` blocks end in `head_hash`."""
+        if height > len(self.blocks):
+            return False
+        return (self.blocks[height - 1]["block_hash"] if height else GENESIS_HASH) == head_hash
+
+    def add_pending(self, offset: int, record: Dict[str, Any]) -> None:
+        self.pending.append((offset, leaf_hash(record)))
+
+    def maybe_seal(self, log_end: int) -> None:
+        """Seal full blocks from the pending tail."""
+        while len(self.pending) >= self.block_size:
+            self.seal(log_end, self.block_size)
+
+    def seal(self, log_end: int, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Seal up to `limit` pending records (all of them by default) into a new
+        block. `log_end` is the end of the main log, used as the block's end
+        offset when every pending record is included.
+        """
+        if not self.pending:
+            return None
+        take = self.pending[: limit or len(self.pending)]
+        rest = self.pending[len(take):]
+        block = {
+            "height": len(self.blocks),
+            "prev_hash": self.head_hash,
+            "merkle_root": merkle_root([leaf for _, leaf in take]).hex(),
+            "count": len(take),
+            "sealed_at": datetime.utcnow().isoformat() + "Z",
+            "first_offset": take[0][0],
+            "end_offset": rest[0][0] if rest else log_end,
+        }
+        block["block_hash"] = block_hash(block)
+        self._log.append([json.dumps(block, separators=(",", ":")).encode("utf-8")])
+        self.blocks.append(block)
+        self._starts.append(block["first_offset"])
+        self._leaf_cache[block["height"]] = ([offset for offset, _ in take], [leaf for _, leaf in take])
+        self._trim_cache()
+        self.pending = rest
+        return block
+
+    def block_for(self, offset: int) -> Optional[Dict[str, Any]]:
+        """The sealed block holding the record at log `offset`, if any."""
+        i = bisect.bisect_right(self._starts, offset) - 1
+        if i < 0 or offset >= self.blocks[i]["end_offset"]:
+            return None
+        return self.blocks[i]
+
+    def leaves(self, block: Dict[str, Any], log: RecordLog) -> Tuple[List[int], List[bytes]]:
+        """Record offsets and leaf hashes of a sealed block, read from `log` on a cache miss."""
+        cached = self._leaf_cache.get(block["height"])
+        if cached is not None:
+            self._leaf_cache.move_to_end(block["height"])
+            return cached
+        offsets, leaves = [], []
+        for offset, payload in log.scan(block["first_offset"]):
+            if offset >= block["end_offset"]:
+                break
+            offsets.append(offset)
+            leaves.append(leaf_hash(decode_record(payload)))
+        self._leaf_cache[block["height"]] = (offsets, leaves)
+        self._trim_cache()
+        return offsets, leaves
+
+    def _trim_cache(self) -> None:
+        while len(self._leaf_cache) > LEAF_CACHE_SIZE:
+            self._leaf_cache.popitem(last=False)
@@ -0,0 +1,149 @@
+"""
+Checkpoint snapshots of the file ledger's hash index.
+
+The live index is only trusted at startup if it was closed cleanly, or if
+the process that crashed ran in the same kernel boot; otherwise it is
+rebuilt by replaying the whole log, which takes seconds per million
+records. A checkpoint is a consistent copy of the index taken every
+`checkpoint_bytes` of appends, together with the log position it covers and
+the head of the block chain at that point::
+
+    <ledger>.checkpoints/<position>.idx     copy of the index file (clean)
+    <ledger>.checkpoints/<position>.json    metadata, written last
+
+When the index cannot be trusted, the newest checkpoint that still matches
+the log is copied into place and only the records after its position are
+replayed.
+"""
+
+import json
+import logging
+import os
+import shutil
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
+
+from .index import HashIndex
+
+logger = logging.getLogger(__name__)
+
+# (index, staged copy path, metadata) between `capture` and `finish`
+Pending = Tuple[HashIndex, Path, Dict[str, Any]]
+
+
+def _crc32(path: Path) -> int:
+    crc = 0
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+
+class CheckpointStore:
+    """The checkpoints of one ledger, newest `keep` retained."""
+
+    def __init__(self, directory: Union[str, Path], keep: int = 2, fsync: bool = True):
+        if keep < 1:
+            raise ValueError("keep must be at least 1")
+        self.dir = Path(directory)
+        self.keep = keep
+        self.fsync = fsync
+
+    @staticmethod
+    def _name(position: int) -> str:
+        return f"{position:020d}"
+
+    def capture(self, index: HashIndex, log_id: int, blocks: Dict[str, Any]) -> Pending:
+        """
+        Note the log position `index` is complete up to. Must be called under
+        the ledger's append lock, so `blocks` and the position agree; the copy
+        itself (`finish`) runs after the lock is released, while appends go on.
+        """
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for leftover in self.dir.glob("*.tmp"):
+            # From a checkpoint interrupted by a crash; only one runs at a time
+            leftover.unlink()
+        staged = self.dir / (self._name(index.indexed_upto) + ".idx.tmp")
+        meta = {
+            "position": index.indexed_upto,
+            "log_id": log_id,
+            "capacity": index.capacity,
+            "blocks": blocks,
+            "created": datetime.utcnow().isoformat() + "Z",
+        }
+        return index, staged, meta
+
+    def finish(self, index: HashIndex, staged: Path, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Copy the index as of the captured position, checksum and publish it,
+        then drop the oldest checkpoints. Returns None, publishing nothing,
+        when the index grew since `capture`.
+        """
+        count = index.snapshot(staged, meta["position"], meta["capacity"])
+        if count is None:
+            staged.unlink()
+            logger.info("Ledger index grew during checkpoint %s; skipping it", staged.name)
+            return None
+        name = self._name(meta["position"])
+        meta = dict(meta, count=count, crc32=_crc32(staged), size=staged.stat().st_size)
+        if self.fsync:
+            with staged.open("rb") as f:
+                os.fsync(f.fileno())
+        os.replace(staged, self.dir / (name + ".idx"))
+        # The metadata is what makes a checkpoint visible, so it goes last
+        tmp = self.dir / (name + ".json.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.dir / (name + ".json"))
+        for _, old in list(self.entries())[self.keep:]:
+            self._remove(old)
+        return meta
+
+    def entries(self) -> Iterator[Tuple[Dict[str, Any], Path]]:
+        """(metadata, index copy) of every published checkpoint, newest first."""
+        if not self.dir.exists():
+            return
+        for meta_path in sorted(self.dir.glob("*.json"), reverse=True):
+            try:
+                with meta_path.open("r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            yield meta, meta_path.with_suffix(".idx")
+
+    def restore(self, dest: Path, accept: Callable[[Dict[str, Any]], bool]) -> Optional[Dict[str, Any]]:
+        """
+        Copy the newest intact checkpoint for which `accept(metadata)` holds
+        to `dest`. Returns its metadata, or None if there is none.
+        """
+        for meta, path in self.entries():
+            try:
+                if not accept(meta):
+                    continue
+                if path.stat().st_size != meta["size"] or _crc32(path) != meta["crc32"]:
+                    logger.warning("Ledger checkpoint %s is damaged; skipping", path)
+                    continue
+                tmp = dest.with_name(dest.name + ".restore")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, dest)
+                return meta
+            except (OSError, KeyError, TypeError):
+                continue
+        return None
+
+    def _remove(self, path: Path) -> None:
+        for p in (path.with_suffix(".json"), path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,156 @@
+"""
+Client side of the single-writer ledger service (see `server`).
+
+`LedgerClient` is a `LedgerBackend`, so `open_ledger` hands it out in place
+of a local `FileLedger` when `settings.socket` is set and the rest of the
+app is unchanged. One connection per process is shared by every thread:
+requests are pipelined on it and a reader thread matches replies to
+waiting callers by request id.
+"""
+
+import itertools
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from . import protocol
+from .base import LedgerBackend, LedgerError
+
+READ_SIZE = 256 * 1024
+
+
+class LedgerClient(LedgerBackend):
+    """Forwards ledger calls to a `LedgerServer` on the Unix socket `socket_path`."""
+
+    def __init__(self, socket_path: Union[str, Path], timeout: float = 30.0, connect_timeout: float = 5.0):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._pid = 0
+        self._ids = itertools.count(1)
+        self._waiting: Dict[int, Future] = {}
+
+    # -- connection --------------------------------------------------------
+
+    def _connect(self) -> socket.socket:
+        """Connect (or reconnect after a failure or fork). Called with the lock held."""
+        if self._sock is not None and self._pid == os.getpid():
+            return self._sock
+        # After a fork the inherited socket and reader thread belong to the parent
+        self._sock, self._waiting = None, {}
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                break
+            except OSError as e:
+                sock.close()
+                # The service may still be starting
+                if time.monotonic() >= deadline:
+                    raise LedgerError(f"Ledger service at {self.socket_path} is unavailable: {e}") from e
+                time.sleep(0.05)
+        self._sock, self._pid = sock, os.getpid()
+        threading.Thread(target=self._read_replies, args=(sock,), name="ledger-client", daemon=True).start()
+        return sock
+
+    def _read_replies(self, sock: socket.socket) -> None:
+        buf = bytearray()
+        error: Exception = LedgerError("Ledger service closed the connection")
+        try:
+            while True:
+                data = sock.recv(READ_SIZE)
+                if not data:
+                    break
+                buf += data
+                pos = 0
+                while len(buf) - pos >= protocol.HEADER.size:
+                    length, request_id, status = protocol.HEADER.unpack_from(buf, pos)
+                    end = pos + protocol.HEADER.size + length
+                    if end > len(buf):
+                        break
+                    body = bytes(buf[pos + protocol.HEADER.size : end])
+                    pos = end
+                    with self._lock:
+                        future = self._waiting.pop(request_id, None)
+                    if future is None:
+                        continue
+                    if status == protocol.OK:
+                        future.set_result(body)
+                    else:
+                        future.set_exception(LedgerError(body.decode("utf-8", "replace")))
+                del buf[:pos]
+        except OSError as e:
+            error = LedgerError(f"Ledger service connection failed: {e}")
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+                waiting, self._waiting = self._waiting, {}
+            else:
+                waiting = {}
+        sock.close()
+        for future in waiting.values():
+            future.set_exception(error)
+
+    def _call(self, op: int, body: bytes = b"") -> bytes:
+        future: Future = Future()
+        with self._lock:
+            sock = self._connect()
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self._waiting[request_id] = future
+            try:
+                sock.sendall(protocol.frame(request_id, op, body))
+            except OSError as e:
+                self._waiting.pop(request_id, None)
+                raise LedgerError(f"Ledger service connection failed: {e}") from e
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._waiting.pop(request_id, None)
+            raise LedgerError(f"Ledger service did not answer within {self.timeout}s")
+
+    # -- LedgerBackend -----------------------------------------------------
+
+    def append_many(self, entries: Sequence[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        if not entries:
+            return []
+        return protocol.decode_records(self._call(protocol.OP_APPEND, protocol.encode_append(entries)))
+
+    def find(self, h: str) -> Optional[Dict[str, Any]]:
+        return protocol.decode_records(self._call(protocol.OP_FIND, protocol.encode_find([h])))[0]
+
+    def find_many(self, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        records = protocol.decode_records(self._call(protocol.OP_FIND, protocol.encode_find(hashes)))
+        return {h: record for h, record in zip(hashes, records) if record is not None}
+
+    def version(self) -> Optional[Tuple[int, int]]:
+        return protocol.decode_version(self._call(protocol.OP_VERSION))
+
+    def inclusion_proof(self, h: str) -> Optional[Dict[str, Any]]:
+        return protocol.decode_json(self._call(protocol.OP_PROOF, protocol.encode_proof(h)))
+
+    def clear(self) -> None:
+        self._call(protocol.OP_CLEAR)
+
+    def close(self) -> None:
+        with self._lock:
+            sock, self._sock = self._sock, None
+            waiting, self._waiting = self._waiting, {}
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        for future in waiting.values():
+            future.set_exception(LedgerError("Ledger client closed"))
@@ -0,0 +1,125 @@
+"""
+Record encodings stored in ledger frames.
+
+Two payload formats coexist in a log, told apart by their first byte:
+
+    JSON       compact UTF-8 JSON object, always starts with ``{``
+    binary v1  <version: u8 = 1> <hash: 32 bytes> <tx_ref: 16 bytes>
+               <timestamp: i64, microseconds since the epoch, UTC>
+               <metadata JSON length: u32> <metadata JSON>
+               <crc32 of everything before it: u32>
+
+Integers are little-endian. A binary record decodes to exactly the dict it
+was encoded from (same hash and tx_ref hex, same ISO timestamp string), so
+Merkle leaves and block hashes do not depend on how a record is stored.
+Records that do not fit the binary layout (a hash that is not 64 lowercase
+hex digits, a non-uuid tx_ref, an unusual timestamp string or extra fields,
+e.g. from a migrated legacy ledger) are written as JSON instead.
+"""
+
+import json
+import struct
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from .base import LedgerError
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+BINARY_V1 = 1
+_BINARY_PREFIX = bytes([BINARY_V1])
+_HEAD = struct.Struct("<B32s16sqI")
+_CRC = struct.Struct("<I")
+_FIELDS = ("hash", "metadata", "tx_ref", "timestamp")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_decode_json = json.JSONDecoder().decode
+
+
+@lru_cache(maxsize=1024)
+def _format_second(seconds: int) -> str:
+    return (_EPOCH + timedelta(seconds=seconds)).isoformat()
+
+
+def _format_timestamp(micros: int) -> str:
+    # Same string as datetime.isoformat() + "Z"; consecutive records mostly
+    # share their second, so only the fraction is formatted each time
+    seconds, fraction = divmod(micros, 1_000_000)
+    return f"{_format_second(seconds)}.{fraction:06d}Z" if fraction else _format_second(seconds) + "Z"
+
+
+def _parse_timestamp(ts: Any) -> Optional[int]:
+    """Microseconds since the epoch for a `make_record` timestamp, or None if it would not round-trip."""
+    if not isinstance(ts, str) or not ts.endswith("Z"):
+        return None
+    try:
+        micros = (datetime.fromisoformat(ts[:-1]) - _EPOCH) // _MICROSECOND
+    except (ValueError, TypeError):
+        return None
+    return micros if _format_timestamp(micros) == ts else None
+
+
+def _raw_hex(value: Any, size: int) -> Optional[bytes]:
+    if not isinstance(value, str) or len(value) != 2 * size:
+        return None
+    try:
+        raw = bytes.fromhex(value)
+    except ValueError:
+        return None
+    # bytes.fromhex accepts upper case, which would not decode back unchanged
+    return raw if raw.hex() == value else None
+
+
+def encode_json(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def encode_binary(record: Dict[str, Any]) -> Optional[bytes]:
+    """Binary v1 payload for `record`, or None when it cannot be stored that way."""
+    if len(record) != len(_FIELDS) or any(k not in record for k in _FIELDS):
+        return None
+    h = _raw_hex(record["hash"], 32)
+    tx_ref = _raw_hex(record["tx_ref"], 16)
+    micros = _parse_timestamp(record["timestamp"])
+    if h is None or tx_ref is None or micros is None:
+        return None
+    metadata = encode_json(record["metadata"])
+    body = _HEAD.pack(BINARY_V1, h, tx_ref, micros, len(metadata)) + metadata
+    return body + _CRC.pack(zlib.crc32(body))
+
+
+def decode_binary(payload: bytes) -> Dict[str, Any]:
+    end = len(payload) - _CRC.size
+    if end < _HEAD.size:
+        raise LedgerError("Truncated binary ledger record")
+    if zlib.crc32(memoryview(payload)[:end]) != _CRC.unpack_from(payload, end)[0]:
+        raise LedgerError("Binary ledger record checksum mismatch")
+    version, h, tx_ref, micros, length = _HEAD.unpack_from(payload)
+    if version != BINARY_V1:
+        raise LedgerError(f"Unknown ledger record version {version}")
+    if _HEAD.size + length != end:
+        raise LedgerError("Binary ledger record length mismatch")
+    return {
+        "hash": h.hex(),
+        "metadata": _decode_json(payload[_HEAD.size : end].decode("utf-8")),
+        "tx_ref": tx_ref.hex(),
+        "timestamp": _format_timestamp(micros),
+    }
+
+
+def encode_record(record: Dict[str, Any], record_format: str = FORMAT_JSON) -> bytes:
+    if record_format == FORMAT_BINARY:
+        payload = encode_binary(record)
+        if payload is not None:
+            return payload
+    return encode_json(record)
+
+
+def decode_record(payload: bytes) -> Dict[str, Any]:
+    if payload[:1] == _BINARY_PREFIX:
+        return decode_binary(payload)
+    return _decode_json(payload.decode("utf-8"))
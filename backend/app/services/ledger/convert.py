@@ -0,0 +1,197 @@
+"""
+Offline conversion of an existing ledger's records to another encoding
+(see `codec`).
+
+Usage (from the `backend` folder, with the app and ledger service stopped)::
+
+    python -m app.services.ledger.convert ledger.json               # to binary, keeps ledger.json.bak
+    python -m app.services.ledger.convert ledger.json --to json
+
+Every segment is rewritten record by record into a new log next to the
+original. Records decode to the same dicts as before, so the Merkle roots
+and block hashes are unchanged; only the log offsets stored in each block
+are remapped. The hash index and checkpoints refer to the old offsets and
+are rebuilt.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from .base import LedgerError
+from .codec import FORMAT_BINARY, FORMATS, decode_record, encode_record
+from .file import FileLedger
+from .log import FRAME_HEADER, RecordLog
+from .migrate import is_legacy_json
+from .segments import SegmentedLog, position, split_position
+
+# Records written per append while converting
+CHUNK = 4096
+
+
+def _companions(path: Path) -> List[Path]:
+    """The ledger's own files besides the active segment, as `FileLedger` names them."""
+    return [path.with_name(path.name + suffix) for suffix in (".segments", ".blocks")]
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def _convert_log(src: SegmentedLog, dst: Path, record_format: str, boundaries: Set[int]) -> Tuple[int, Dict[int, int]]:
+    """
+    Write every record of `src` re-encoded into a segmented log at `dst`,
+    keeping segment ids. Returns the record count and the new position of
+    each old position in `boundaries` (record starts and ends).
+    """
+    seg_dir = dst.with_name(dst.name + ".segments")
+    seg_dir.mkdir()
+    active_id = split_position(src.size)[0]
+    remap: Dict[int, int] = {}
+    count = 0
+    out: Optional[RecordLog] = None
+    out_id = -1
+    old: List[Tuple[int, int]] = []  # (position, payload length) of each record in `batch`
+    batch: List[bytes] = []
+
+    def flush() -> None:
+        for (old_pos, old_length), payload, new_offset in zip(old, batch, out.append(batch)):
+            new_pos = position(out_id, new_offset)
+            if old_pos in boundaries:
+                remap[old_pos] = new_pos
+            if old_pos + FRAME_HEADER.size + old_length in boundaries:
+                remap[old_pos + FRAME_HEADER.size + old_length] = new_pos + FRAME_HEADER.size + len(payload)
+        old.clear()
+        batch.clear()
+
+    for pos, payload in src.scan():
+        seg_id = split_position(pos)[0]
+        if seg_id != out_id:
+            if out is not None:
+                flush()
+                out.close()
+                os.chmod(out.path, 0o444)
+            out_id = seg_id
+            out = RecordLog(dst if seg_id == active_id else seg_dir / f"{seg_id:08d}.seg")
+            out.open(recover=False)
+        old.append((pos, len(payload)))
+        batch.append(encode_record(decode_record(payload), record_format))
+        count += 1
+        if len(batch) >= CHUNK:
+            flush()
+    if out is not None:
+        flush()
+        out.close()
+        if out_id != active_id:
+            os.chmod(out.path, 0o444)
+    if out_id != active_id:
+        # The active segment is empty (or the whole ledger is)
+        empty = RecordLog(dst)
+        empty.open(recover=False)
+        empty.close()
+    return count, remap
+
+
+def _convert_blocks(src: Path, dst: Path, remap: Dict[int, int]) -> None:
+    old = RecordLog(src, fsync=False)
+    new = RecordLog(dst, fsync=True)
+    try:
+        old.open()
+        new.open(recover=False)
+        payloads = []
+        for _, payload in old.scan():
+            block = json.loads(payload)
+            try:
+                block["first_offset"] = remap[block["first_offset"]]
+                block["end_offset"] = remap[block["end_offset"]]
+            except KeyError:
+                raise LedgerError(f"Block {block['height']} in {src} does not line up with the ledger records")
+            payloads.append(json.dumps(block, separators=(",", ":")).encode("utf-8"))
+        new.append(payloads)
+    finally:
+        old.close()
+        new.close()
+
+
+def convert_ledger(path: Union[str, Path], record_format: str = FORMAT_BINARY, backup: bool = True) -> int:
+    """
+    Rewrite every record of the ledger at `path` in `record_format`.
+
+    The converted ledger is built beside the original and swapped in only
+    once complete, so an interrupted run leaves the original untouched. With
+    `backup` the original files are kept under `<path>.bak` (itself a
+    readable ledger). The ledger must not be open anywhere else meanwhile.
+    Returns the number of records converted.
+    """
+    path = Path(path)
+    if record_format not in FORMATS:
+        raise ValueError(f"record_format must be one of {', '.join(FORMATS)}")
+    if is_legacy_json(path):
+        raise LedgerError(f"{path} is a legacy JSON ledger; migrate it first")
+    if not path.exists():
+        raise LedgerError(f"No ledger at {path}")
+
+    blocks_path = path.with_name(path.name + ".blocks")
+    blocks = []
+    if blocks_path.exists():
+        log = RecordLog(blocks_path, fsync=False)
+        log.open()
+        blocks = [json.loads(payload) for _, payload in log.scan()]
+        log.close()
+    boundaries = {b["first_offset"] for b in blocks} | {b["end_offset"] for b in blocks}
+
+    tmp = path.with_name(path.name + ".converting")
+    for p in [tmp] + _companions(tmp):
+        _remove(p)
+    src = SegmentedLog(path, fsync=False, segment_size=0)
+    try:
+        src.open()
+        count, remap = _convert_log(src, tmp, record_format, boundaries)
+    finally:
+        src.close()
+    if blocks:
+        _convert_blocks(blocks_path, tmp.with_name(tmp.name + ".blocks"), remap)
+
+    # Offsets changed: the index and its checkpoints no longer apply
+    for suffix in (".idx", ".checkpoints"):
+        _remove(path.with_name(path.name + suffix))
+    bak = path.with_name(path.name + ".bak")
+    for old, keep in zip([path] + _companions(path), [bak] + _companions(bak)):
+        if not old.exists():
+            continue
+        if backup:
+            _remove(keep)
+            os.replace(old, keep)
+        else:
+            _remove(old)
+    for new, final in zip([tmp] + _companions(tmp), [path] + _companions(path)):
+        if new.exists():
+            os.replace(new, final)
+
+    # Rebuild the index now rather than on the app's first request
+    ledger = FileLedger(path)
+    ledger.version()
+    ledger.close()
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rewrite a ledger's records in another encoding")
+    parser.add_argument("path")
+    parser.add_argument("--to", choices=FORMATS, default=FORMAT_BINARY)
+    parser.add_argument("--no-backup", action="store_true", help="do not keep the original as <path>.bak")
+    args = parser.parse_args(argv)
+    count = convert_ledger(args.path, args.to, backup=not args.no_backup)
+    print(f"Converted {count} records in {args.path} to {args.to}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Flat-file ledger backend built on the append-only record log.
+"""
+
+import logging
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .base import LedgerBackend, make_record
+from .blocks import BlockStore
+from .checkpoint import CheckpointStore, Pending
+from .codec import FORMAT_BINARY, FORMATS, decode_record, encode_record
+from .index import HashIndex, index_key
+from .log import FRAME_HEADER
+from .merkle import make_proof
+from .migrate import is_legacy_json, migrate_json_ledger
+from .segments import SegmentedLog
+
+logger = logging.getLogger(__name__)
+
+
+def _describe(payload: bytes) -> Tuple[str, str]:
+    record = decode_record(payload)
+    return record["hash"], record["timestamp"]
+
+
+class FileLedger(LedgerBackend):
+    """
+    Ledger stored as an append-only record log at `path`, with a persistent
+    hash index in `<path>.idx`.
+
+    The log rolls over into sealed, read-only segments under
+    `<path>.segments/` every `segment_size` bytes (0 disables rollover);
+    sealed segments are optionally compressed and are read through mmap.
+
+    The index is updated on every append and replayed from the log tail (or
+    rebuilt from scratch when missing or stale) when the ledger is opened, so
+    `find` reads a single record instead of scanning the log. A hash that is
+    already on the ledger is not appended again; the first record is
+    returned for it, as with the database backends.
+
+    Records are sealed into Merkle blocks of `block_size` records, chained by
+    hash, in `<path>.blocks`; see `inclusion_proof`.
+
+    Every `checkpoint_bytes` of appends (0 disables) a copy of the index is
+    kept under `<path>.checkpoints/`, so an index that cannot be trusted
+    after a crash is restored from it instead of rebuilt from the whole log.
+
+    New records are written in `record_format`: "binary" (see `codec`) or
+    "json". Both can be read, so a log may mix them; `convert` rewrites an
+    existing log in one format.
+
+    A legacy JSON-array ledger found at `path` is migrated in place the first
+    time the ledger is opened (the original is kept as `<path>.bak`).
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        fsync: bool = True,
+        block_size: int = 1024,
+        segment_size: int = 0,
+        compress_segments: bool = False,
+        checkpoint_bytes: int = 0,
+        checkpoint_keep: int = 2,
+        record_format: str = FORMAT_BINARY,
+    ):
+        if record_format not in FORMATS:
+            raise ValueError(f"record_format must be one of {', '.join(FORMATS)}")
+        self.path = Path(path)
+        self.record_format = record_format
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.blocks_path = self.path.with_name(self.path.name + ".blocks")
+        self._log = SegmentedLog(
+            self.path, fsync=fsync, segment_size=segment_size, compress=compress_segments, describe=_describe
+        )
+        self._index: Optional[HashIndex] = None
+        self._blocks = BlockStore(self.blocks_path, block_size=block_size, fsync=fsync)
+        self.checkpoint_bytes = checkpoint_bytes
+        self._checkpoints = CheckpointStore(
+            self.path.with_name(self.path.name + ".checkpoints"), keep=checkpoint_keep, fsync=fsync
+        )
+        self._since_checkpoint = 0
+        self._checkpoint_worker: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        self._identity = 0
+
+    def _open(self, create: bool) -> bool:
+        """Open the log if needed. Returns False when it does not exist and `create` is False."""
+        # The index is set last, so other threads never see a half-open ledger
+        if self._index is not None:
+            return True
+        with self._lock:
+            if self._index is not None:
+                return True
+            if not self._log.exists() and not create:
+                return False
+            if is_legacy_json(self.path):
+                count = migrate_json_ledger(self.path)
+                logger.info("Migrated legacy JSON ledger %s (%d records)", self.path, count)
+            self._log.open(recover=False)
+            self._identity = self._log.identity
+            # Blocks first: restoring a checkpoint checks the chain head
+            self._load_blocks()
+            self._index = self._load_index()
+            return True
+
+    def _load_index(self) -> HashIndex:
+        log_id = self._log.identity
+        index = HashIndex.load(self.index_path, log_id)
+        if index is not None and index.indexed_upto > self._log.size:
+            index.close()
+            index = None
+        if index is None:
+            index = self._restore_checkpoint(log_id)
+        if index is None:
+            logger.info("Rebuilding ledger index %s", self.index_path)
+            index = HashIndex.create(self.index_path, log_id)
+
+        def visit(offset: int, payload: bytes) -> None:
+            index.add(index_key(decode_record(payload)["hash"]), offset)
+
+        # Only the part of the log the index has not seen needs replaying;
+        # this is also the only part that can hold a torn write.
+        self._log.recover(index.indexed_upto or None, visit)
+        index.mark_indexed(self._log.size)
+        return index
+
+    def _restore_checkpoint(self, log_id: int) -> Optional[HashIndex]:
+        def matches(meta: Dict[str, Any]) -> bool:
+            # Same log, a prefix of it, and the same block chain up to there
+            blocks = meta["blocks"]
+            return (
+                meta["log_id"] == log_id
+                and meta["position"] <= self._log.size
+                and self._log.is_boundary(meta["position"])
+                and self._blocks.has_head(blocks["height"], blocks["head_hash"])
+            )
+
+        meta = self._checkpoints.restore(self.index_path, matches)
+        if meta is None:
+            return None
+        logger.info("Restored ledger index %s from the checkpoint at %d", self.index_path, meta["position"])
+        return HashIndex.load(self.index_path, log_id)
+
+    def _load_blocks(self) -> None:
+        self._blocks.open()
+        if self._blocks.sealed_end > self._log.size:
+            logger.warning("Ledger blocks %s extend past the log; resealing", self.blocks_path)
+            self._blocks.reset()
+        for offset, payload in self._log.scan(self._blocks.sealed_end):
+            self._blocks.add_pending(offset, decode_record(payload))
+        self._blocks.maybe_seal(self._log.size)
+
+    def append_many(self, entries: Sequence[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        records = [make_record(h, metadata) for h, metadata in entries]
+        payloads = [encode_record(r, self.record_format) for r in records]
+        with self._lock:
+            self._open(create=True)
+            # Hashes already on the ledger, or repeated in this batch, keep their first record
+            results, new = [], {}
+            for record, payload in zip(records, payloads):
+                existing = new.get(record["hash"], (None,))[0] or self._locate(record["hash"])[1]
+                if existing is None:
+                    new[record["hash"]] = (record, payload)
+                results.append(existing or record)
+            if not new:
+                return results
+            records, payloads = zip(*new.values())
+            offsets = self._log.append(payloads)
+            for record, offset in zip(records, offsets):
+                self._index.add(index_key(record["hash"]), offset)
+                self._blocks.add_pending(offset, record)
+            self._index.mark_indexed(self._log.size)
+            self._blocks.maybe_seal(self._log.size)
+            self._since_checkpoint += sum(len(p) for p in payloads) + FRAME_HEADER.size * len(payloads)
+            if self.checkpoint_bytes and self._since_checkpoint >= self.checkpoint_bytes and not self._checkpointing:
+                worker = threading.Thread(
+                    target=self._finish_checkpoint, args=self._capture_checkpoint(), name="ledger-checkpoint", daemon=True
+                )
+                self._checkpoint_worker = worker
+                worker.start()
+        return results
+
+    @property
+    def _checkpointing(self) -> bool:
+        return self._checkpoint_worker is not None and self._checkpoint_worker.is_alive()
+
+    def _capture_checkpoint(self) -> Pending:
+        # Under the lock, so the block head matches the position; the index is copied later
+        self._since_checkpoint = 0
+        blocks = {"height": len(self._blocks.blocks), "sealed_end": self._blocks.sealed_end, "head_hash": self._blocks.head_hash}
+        return self._checkpoints.capture(self._index, self._identity, blocks)
+
+    def _finish_checkpoint(self, index: HashIndex, staged: Path, meta: Dict[str, Any]) -> None:
+        try:
+            self._checkpoints.finish(index, staged, meta)
+        except Exception:
+            logger.exception("Failed to write ledger checkpoint in %s", self._checkpoints.dir)
+
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Write a checkpoint now and wait for it. Returns its metadata, or None for an empty ledger."""
+        with self._lock:
+            if not self._open(create=False):
+                return None
+            if self._checkpointing:
+                self._checkpoint_worker.join()
+            # Finished under the lock too, so it never overlaps a background one
+            return self._checkpoints.finish(*self._capture_checkpoint())
+
+    def _locate(self, h: str) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+        if not self._open(create=False):
+            return None, None
+        offset = self._index.lookup(index_key(h))
+        if offset is None:
+            return None, None
+        record = decode_record(self._log.read_at(offset))
+        return (offset, record) if record.get("hash") == h else (None, None)
+
+    def find(self, h: str) -> Optional[Dict[str, Any]]:
+        return self._locate(h)[1]
+
+    def find_many(self, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        if not self._open(create=False):
+            return {}
+        lookup = self._index.lookup
+        offsets = []
+        for h in set(hashes):
+            offset = lookup(index_key(h))
+            if offset is not None:
+                offsets.append((offset, h))
+        # Read in log order so a large batch walks the file front to back
+        offsets.sort()
+        found = {}
+        for offset, h in offsets:
+            record = decode_record(self._log.read_at(offset))
+            if record.get("hash") == h:
+                found[h] = record
+        return found
+
+    def version(self) -> Tuple[int, int]:
+        if not self._open(create=False):
+            return 0, 0
+        return self._identity, self._log.size
+
+    def seal(self) -> Optional[Dict[str, Any]]:
+        """Seal all pending records into a block now. Returns the block, if any."""
+        with self._lock:
+            if not self._open(create=False):
+                return None
+            return self._blocks.seal(self._log.size)
+
+    def inclusion_proof(self, h: str) -> Optional[Dict[str, Any]]:
+        """
+        Merkle inclusion proof for the record with hash `h`, or None if the
+        hash is not in the ledger. A record still in the pending tail gets a
+        pending proof (see `merkle.make_proof`); nothing is sealed here.
+        """
+        offset, record = self._locate(h)
+        if record is None:
+            return None
+        with self._lock:
+            block = self._blocks.block_for(offset)
+            if block is None:
+                block = {"height": len(self._blocks.blocks), "prev_hash": self._blocks.head_hash}
+                offsets = [o for o, _ in self._blocks.pending]
+                leaves = [leaf for _, leaf in self._blocks.pending]
+            else:
+                offsets, leaves = self._blocks.leaves(block, self._log)
+        return make_proof(record, leaves, offsets.index(offset), block)
+
+    def iter_records(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Records in ledger order, optionally limited to ISO timestamps in
+        [`since`, `until`]. Sealed segments entirely outside the range are
+        skipped using their metadata.
+        """
+        if not self._open(create=False):
+            return
+
+        def overlaps(meta: Dict[str, Any]) -> bool:
+            if "first_timestamp" not in meta:
+                return meta.get("records", 1) > 0
+            return (until is None or meta["first_timestamp"] <= until) and (since is None or meta["last_timestamp"] >= since)
+
+        segment_filter = overlaps if since is not None or until is not None else None
+        for _, payload in self._log.scan(segment_filter=segment_filter):
+            record = decode_record(payload)
+            if (since is None or record["timestamp"] >= since) and (until is None or record["timestamp"] <= until):
+                yield record
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """Metadata (size, record count, hash and timestamp range) of sealed segments."""
+        if not self._open(create=False):
+            return []
+        return self._log.segments()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.close()
+            for p in (self.path, self.index_path, self.blocks_path):
+                if p.exists():
+                    p.unlink()
+            shutil.rmtree(self._log.dir, ignore_errors=True)
+            self._checkpoints.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._checkpoint_worker is not None:
+                self._checkpoint_worker.join()
+                self._checkpoint_worker = None
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            self._blocks.close()
+            self._log.close()
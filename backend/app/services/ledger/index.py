@@ -0,0 +1,264 @@
+"""
+Persistent hash -> log offset index for the file ledger.
+
+The index is an open-addressing hash table (linear probing) stored in a
+memory-mapped sidecar file next to the log, so lookups cost O(1) page reads
+and nothing has to be loaded into Python objects at startup::
+
+    header (64 bytes) | slot | slot | ...
+
+    slot = <key: first 16 bytes of the record hash> <log offset: u64 LE>
+
+A slot with offset 0 is empty (offset 0 is inside the log magic, so it is
+never a real frame). The header records how far into the log the index is
+known to be complete (`indexed_upto`); on open only the log tail after that
+point has to be replayed.
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+INDEX_MAGIC = b"ZRAIDX1\0"
+# magic, capacity, count, indexed_upto, log identity, clean flag, boot id
+_HEADER = struct.Struct("<8sQQQQB16s")
+HEADER_SIZE = 64
+_SLOT = struct.Struct("<16sQ")
+_EMPTY_SLOT = bytes(_SLOT.size)
+KEY_SIZE = 16
+
+MIN_CAPACITY = 1024
+MAX_LOAD = 0.7
+
+
+def index_key(h: str) -> bytes:
+    """Fixed-size index key for a ledger hash string."""
+    if len(h) == 64:
+        try:
+            return bytes.fromhex(h)[:KEY_SIZE]
+        except ValueError:
+            pass
+    return hashlib.sha256(h.encode("utf-8")).digest()[:KEY_SIZE]
+
+
+def _boot_id() -> bytes:
+    """
+    Identifier of the running kernel boot (Linux). An index left unclean by a
+    crashed process is still trustworthy within the same boot, because its
+    dirty pages live in the shared page cache; after a reboot it is not.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return bytes.fromhex(f.read().strip().replace("-", ""))[:16]
+    except (OSError, ValueError):
+        return b""
+
+
+class _Table:
+    """A mapped slot array; replaced wholesale when the index grows."""
+
+    __slots__ = ("mm", "capacity", "mask")
+
+    def __init__(self, mm: mmap.mmap, capacity: int):
+        self.mm = mm
+        self.capacity = capacity
+        self.mask = capacity - 1
+
+
+class HashIndex:
+    """
+    Memory-mapped hash index. Lookups are lock-free; inserts and growth must
+    be serialized by the caller (the ledger's append lock).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.count = 0
+        self.indexed_upto = 0
+        self.log_id = 0
+        # Read once: the header is rewritten on every append
+        self._boot = _boot_id()
+        self._table: Optional[_Table] = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    @classmethod
+    def load(cls, path: Union[str, Path], log_id: int) -> Optional["HashIndex"]:
+        """
+        Open an existing index file. Returns None when it is missing, damaged,
+        belongs to a different log, or was left unclean before a reboot.
+        """
+        index = cls(path)
+        try:
+            with index.path.open("rb") as f:
+                header = f.read(HEADER_SIZE)
+            magic, capacity, count, upto, owner, clean, boot = _HEADER.unpack_from(header)
+        except (OSError, struct.error):
+            return None
+        if magic != INDEX_MAGIC or owner != log_id or capacity < MIN_CAPACITY or capacity & (capacity - 1):
+            return None
+        if not clean and (not boot or boot != index._boot):
+            return None
+        if index.path.stat().st_size != HEADER_SIZE + capacity * _SLOT.size:
+            return None
+        index.count, index.indexed_upto, index.log_id = count, upto, owner
+        index._table = index._map(index.path, capacity)
+        index._write_header(clean=False)
+        return index
+
+    @classmethod
+    def create(cls, path: Union[str, Path], log_id: int, capacity: int = MIN_CAPACITY) -> "HashIndex":
+        index = cls(path)
+        index.log_id = log_id
+        index._table = index._new_table(index.path, capacity)
+        index._write_header(clean=False)
+        return index
+
+    def close(self) -> None:
+        """Flush and mark the index clean so the next open can trust it."""
+        if self._table is None:
+            return
+        self._write_header(clean=True)
+        self._table.mm.flush()
+        self._table.mm.close()
+        self._table = None
+
+    @property
+    def capacity(self) -> int:
+        return self._table.capacity
+
+    def snapshot(self, dest: Union[str, Path], upto: int, capacity: int) -> Optional[int]:
+        """
+        Copy the index to `dest` as a clean index complete up to `upto`, with
+        `upto` and `capacity` read together under the append lock. Inserts
+        may run during the copy; the slots they filled (log offsets from
+        `upto` on, or half written) are emptied in the copy. That cannot cut
+        a probe chain short, since every older key was placed before them.
+
+        Returns the number of keys kept, or None if the index grew during the
+        copy: rehashing mixes old and new keys, so no consistent copy exists.
+        """
+        # The mapping is shared, so the file already holds every insert
+        shutil.copyfile(self.path, dest)
+        with open(dest, "r+b") as f:
+            data = f.read()
+            if len(data) != HEADER_SIZE + capacity * _SLOT.size:
+                return None
+            count = 0
+            for slot, (key, offset) in enumerate(_SLOT.iter_unpack(memoryview(data)[HEADER_SIZE:])):
+                if 0 < offset < upto:
+                    count += 1
+                elif offset or any(key):
+                    f.seek(HEADER_SIZE + slot * _SLOT.size)
+                    f.write(_EMPTY_SLOT)
+            f.seek(0)
+            f.write(_HEADER.pack(INDEX_MAGIC, capacity, count, upto, self.log_id, 1, b""))
+        return count
+
+    @staticmethod
+    def _map(path: Path, capacity: int) -> _Table:
+        with path.open("r+b") as f:
+            mm = mmap.mmap(f.fileno(), HEADER_SIZE + capacity * _SLOT.size)
+        return _Table(mm, capacity)
+
+    @classmethod
+    def _new_table(cls, path: Path, capacity: int) -> _Table:
+        with path.open("wb") as f:
+            f.truncate(HEADER_SIZE + capacity * _SLOT.size)
+        return cls._map(path, capacity)
+
+    def _write_header(self, clean: bool) -> None:
+        table = self._table
+        header = _HEADER.pack(
+            INDEX_MAGIC, table.capacity, self.count, self.indexed_upto, self.log_id, int(clean), self._boot
+        )
+        table.mm[: len(header)] = header
+
+    # -- operations --------------------------------------------------------
+
+    def lookup(self, key: bytes) -> Optional[int]:
+        """Return the log offset stored for `key`, or None."""
+        while True:
+            table = self._table
+            if table is None:
+                return None
+            try:
+                return self._probe(table, key)
+            except ValueError:
+                # The table was unmapped under us by `_grow` or `close`; retry on the current one
+                if self._table is table:
+                    raise
+
+    @staticmethod
+    def _probe(table: _Table, key: bytes) -> Optional[int]:
+        mm, mask = table.mm, table.mask
+        slot = int.from_bytes(key[:8], "little") & mask
+        while True:
+            stored, offset = _SLOT.unpack_from(mm, HEADER_SIZE + slot * _SLOT.size)
+            if offset == 0:
+                return None
+            if stored == key:
+                return offset
+            slot = (slot + 1) & mask
+
+    def add(self, key: bytes, offset: int) -> bool:
+        """
+        Insert `key` -> `offset` unless the key is already present (the first
+        record for a hash wins, matching a front-to-back scan). Returns True
+        when inserted.
+        """
+        if (self.count + 1) > self._table.capacity * MAX_LOAD:
+            self._grow()
+        inserted = self._insert(self._table, key, offset)
+        if inserted:
+            self.count += 1
+        return inserted
+
+    def add_many(self, items: Iterable[Tuple[bytes, int]], indexed_upto: int) -> None:
+        for key, offset in items:
+            self.add(key, offset)
+        self.mark_indexed(indexed_upto)
+
+    def mark_indexed(self, indexed_upto: int) -> None:
+        self.indexed_upto = indexed_upto
+        self._write_header(clean=False)
+
+    def items(self) -> Iterator[Tuple[bytes, int]]:
+        mm = self._table.mm
+        for slot in range(self._table.capacity):
+            key, offset = _SLOT.unpack_from(mm, HEADER_SIZE + slot * _SLOT.size)
+            if offset:
+                yield key, offset
+
+    @staticmethod
+    def _insert(table: _Table, key: bytes, offset: int) -> bool:
+        mm, mask = table.mm, table.mask
+        slot = int.from_bytes(key[:8], "little") & mask
+        while True:
+            pos = HEADER_SIZE + slot * _SLOT.size
+            stored, existing = _SLOT.unpack_from(mm, pos)
+            if existing == 0:
+                # Offset first, then key: a concurrent reader never sees a
+                # matching key without its offset.
+                mm[pos + KEY_SIZE : pos + _SLOT.size] = offset.to_bytes(8, "little")
+                mm[pos : pos + KEY_SIZE] = key
+                return True
+            if stored == key:
+                return False
+            slot = (slot + 1) & mask
+
+    def _grow(self) -> None:
+        old = self._table
+        tmp = self.path.with_name(self.path.name + ".grow")
+        new = self._new_table(tmp, old.capacity * 2)
+        for key, offset in self.items():
+            self._insert(new, key, offset)
+        os.replace(tmp, self.path)
+        self._table = new
+        self._write_header(clean=False)
+        # A lookup still probing the old table gets a ValueError and retries on the new one
+        old.mm.close()
@@ -0,0 +1,190 @@
+"""
+Append-only record log used by the file ledger.
+
+File layout::
+
+    MAGIC | frame | frame | ...
+
+    frame = <payload length: u32 LE> <crc32(payload): u32 LE> <payload>
+
+Appends only ever write at the end of the file, so an append costs O(1)
+regardless of how many records the log holds. A crash in the middle of a
+write leaves at most one incomplete (torn) frame at the tail; `recover()`
+detects it through the length/CRC check and truncates it away.
+"""
+
+import logging
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .base import LedgerError
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ZRALOG1\n"
+FRAME_HEADER = struct.Struct("<II")
+# Upper bound on a single record; anything larger is treated as corruption.
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def encode_frame(payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class RecordLog:
+    """
+    A single append-only file of CRC-checked frames.
+
+    Offsets returned by `append` point at the frame header and stay valid
+    for the lifetime of the file, so callers can keep them in an index.
+    """
+
+    def __init__(self, path: Union[str, Path], fsync: bool = True):
+        self.path = Path(path)
+        self.fsync = fsync
+        self.size = 0
+        self._fd: Optional[int] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._fd is not None
+
+    @property
+    def identity(self) -> int:
+        """Stable identifier of this log file (its inode)."""
+        return os.fstat(self._fd).st_ino
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def open(self, recover: bool = True) -> None:
+        """
+        Open (creating if needed) the log and, unless `recover` is false,
+        repair a torn tail by checking every frame.
+        """
+        if self._fd is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size == 0:
+                os.write(fd, MAGIC)
+                if self.fsync:
+                    os.fsync(fd)
+            elif os.pread(fd, len(MAGIC), 0) != MAGIC:
+                raise LedgerError(f"{self.path} is not a ledger log file")
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self.size = os.fstat(fd).st_size
+        if recover:
+            self.recover()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def recover(self, start: Optional[int] = None, visit: Optional[Callable[[int, bytes], Any]] = None) -> int:
+        """
+        Walk frames from `start` (a known-good frame boundary) and truncate the
+        file after the last intact one, calling `visit(offset, payload)` for
+        each frame on the way. Returns the new end-of-log offset.
+        """
+        end = len(MAGIC) if start is None or start < len(MAGIC) else start
+        for offset, payload in self.scan(end):
+            if visit is not None:
+                visit(offset, payload)
+            end = offset + FRAME_HEADER.size + len(payload)
+        if end < self.size:
+            logger.warning("Truncating torn ledger tail in %s: %d -> %d bytes", self.path, self.size, end)
+            os.ftruncate(self._fd, end)
+            if self.fsync:
+                os.fsync(self._fd)
+            self.size = end
+        return end
+
+    def append(self, payloads: Sequence[bytes]) -> List[int]:
+        """
+        Append frames with a single write (and fsync) and return their offsets.
+        Callers are responsible for serializing concurrent appends.
+        """
+        if self._fd is None:
+            self.open()
+        offsets = []
+        chunks = []
+        pos = self.size
+        for payload in payloads:
+            frame = encode_frame(payload)
+            offsets.append(pos)
+            chunks.append(frame)
+            pos += len(frame)
+        data = b"".join(chunks)
+        written = os.pwrite(self._fd, data, self.size)
+        if written != len(data):
+            # Leave the partial frame for recover() rather than pretending it worked
+            raise LedgerError(f"Short write to {self.path}: {written} of {len(data)} bytes")
+        if self.fsync:
+            os.fsync(self._fd)
+        self.size = pos
+        return offsets
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Raw bytes at `offset`, without any frame checks."""
+        return os.pread(self._fd, length, offset)
+
+    def read_at(self, offset: int) -> bytes:
+        """Return the payload of the frame starting at `offset`."""
+        header = os.pread(self._fd, FRAME_HEADER.size, offset)
+        if len(header) < FRAME_HEADER.size:
+            raise LedgerError(f"No frame at offset {offset} in {self.path}")
+        length, crc = FRAME_HEADER.unpack(header)
+        payload = os.pread(self._fd, length, offset + FRAME_HEADER.size)
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise LedgerError(f"Corrupt frame at offset {offset} in {self.path}")
+        return payload
+
+    def scan(self, start: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yield `(offset, payload)` for every intact frame from `start`, stopping
+        at end-of-file or at the first torn/corrupt frame. An open log is read
+        through a duplicate of its descriptor, taken now, so the scan keeps
+        reading this file even if the path is renamed or replaced meanwhile.
+        """
+        offset = len(MAGIC) if start is None else start
+        if self._fd is not None:
+            f = os.fdopen(os.dup(self._fd), "rb", buffering=1024 * 1024)
+        else:
+            f = open(self.path, "rb", buffering=1024 * 1024)
+        return self._frames(f, offset)
+
+    @staticmethod
+    def _frames(f, offset: int) -> Iterator[Tuple[int, bytes]]:
+        with f:
+            f.seek(offset)
+            while True:
+                header = f.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    return
+                length, crc = FRAME_HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    return
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                yield offset, payload
+                offset += FRAME_HEADER.size + length
+
+
+def is_log_file(path: Union[str, Path]) -> bool:
+    path = Path(path)
+    try:
+        with path.open("rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
@@ -0,0 +1,137 @@
+"""
+Merkle tree helpers for sealing ledger records into blocks.
+
+Leaves and inner nodes are domain-separated (0x00 / 0x01 prefixes) and an
+odd node at any level is promoted unchanged rather than duplicated, so two
+different record lists can never produce the same root. Links of the per-record
+hash chain kept by the database ledger (`chain_hash`) use a 0x02 prefix.
+
+Everything here is pure and works on plain dicts, so an auditor can check a
+proof returned by the API with nothing but this module::
+
+    from app.services.ledger.merkle import verify_inclusion_proof
+    assert verify_inclusion_proof(proof)
+
+That establishes that the record is part of the block described in the proof
+and that the block header is self-consistent. Checking that the block itself
+belongs to the chain is done by comparing `block_hash` with an independently
+obtained copy of the chain (each block links to `prev_hash`).
+
+A record that is not sealed into a block yet gets a `"pending"` proof
+against the root of the records pending so far; its block has no
+`sealed_at` or `block_hash` until the block is sealed, when the proof
+should be fetched again. Reads never seal blocks.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Sequence
+
+GENESIS_HASH = "0" * 64
+# Fields of a block that are covered by its hash
+BLOCK_HEADER_FIELDS = ("height", "prev_hash", "merkle_root", "count", "sealed_at")
+PROOF_SEALED = "sealed"
+PROOF_PENDING = "pending"
+
+
+def _canonical(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def leaf_hash(record: Dict[str, Any]) -> bytes:
+    """Leaf digest committing to the whole record (hash, metadata, tx_ref, timestamp)."""
+    return hashlib.sha256(b"\x00" + _canonical(record)).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def merkle_root(leaves: Sequence[bytes]) -> bytes:
+    if not leaves:
+        raise ValueError("Cannot compute the Merkle root of an empty block")
+    level = list(leaves)
+    while len(level) > 1:
+        level = [node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def merkle_path(leaves: Sequence[bytes], index: int) -> List[Dict[str, str]]:
+    """
+    Sibling hashes from leaf `index` up to the root, O(log n) entries.
+    `side` says on which side the sibling sits.
+    """
+    if not 0 <= index < len(leaves):
+        raise IndexError("leaf index out of range")
+    path = []
+    level = list(leaves)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append({"side": "left" if sibling < index else "right", "hash": level[sibling].hex()})
+        level = [node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+        index //= 2
+    return path
+
+
+def root_from_path(leaf: bytes, path: Sequence[Dict[str, str]]) -> bytes:
+    node = leaf
+    for step in path:
+        sibling = bytes.fromhex(step["hash"])
+        node = node_hash(sibling, node) if step["side"] == "left" else node_hash(node, sibling)
+    return node
+
+
+def chain_hash(prev_hash: str, leaf: bytes) -> str:
+    """
+    Next link of a hash chain over records, from the previous link and the
+    record's `leaf_hash`; the first record links to GENESIS_HASH.
+    """
+    return hashlib.sha256(b"\x02" + bytes.fromhex(prev_hash) + leaf).hexdigest()
+
+
+def block_hash(block: Dict[str, Any]) -> str:
+    return hashlib.sha256(_canonical({k: block[k] for k in BLOCK_HEADER_FIELDS})).hexdigest()
+
+
+def make_proof(record: Dict[str, Any], leaves: Sequence[bytes], leaf_index: int, block: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inclusion proof of `record`, leaf `leaf_index` of `leaves`. For a sealed
+    record `leaves` are its block's and `block` is that block; otherwise
+    they are the pending records and `block` only has the `height` and
+    `prev_hash` the next block will get, and the proof is pending.
+    """
+    if "block_hash" in block:
+        status, header = PROOF_SEALED, {k: block[k] for k in BLOCK_HEADER_FIELDS + ("block_hash",)}
+    else:
+        status = PROOF_PENDING
+        header = {
+            "height": block["height"],
+            "prev_hash": block["prev_hash"],
+            "merkle_root": merkle_root(leaves).hex(),
+            "count": len(leaves),
+        }
+    return {
+        "record": record,
+        "leaf_index": leaf_index,
+        "path": merkle_path(leaves, leaf_index),
+        "status": status,
+        "block": header,
+    }
+
+
+def verify_inclusion_proof(proof: Dict[str, Any]) -> bool:
+    """
+    Check a proof produced by `FileLedger.inclusion_proof` without access to
+    the ledger: the record must hash up to the block's Merkle root, and the
+    block header must hash to its `block_hash`. A pending proof has no block
+    hash yet; only its root is checked.
+    """
+    try:
+        block = proof["block"]
+        root = root_from_path(leaf_hash(proof["record"]), proof["path"])
+        if root.hex() != block["merkle_root"]:
+            return False
+        return proof.get("status") == PROOF_PENDING or block_hash(block) == block["block_hash"]
+    except (KeyError, TypeError, ValueError):
+        return False
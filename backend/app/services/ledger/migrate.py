@@ -0,0 +1,87 @@
+"""
+One-shot migration from the legacy ledger format (a single pretty-printed
+JSON array rewritten on every append) to the append-only record log.
+
+Usage (from the `backend` folder)::
+
+    python -m app.services.ledger.migrate ledger.json            # in place, keeps ledger.json.bak
+    python -m app.services.ledger.migrate ledger.json ledger.log  # to a new file
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Union
+
+from .base import LedgerError
+from .codec import encode_record
+from .log import RecordLog, is_log_file
+
+
+def is_legacy_json(path: Union[str, Path]) -> bool:
+    """True when `path` holds a legacy JSON-array ledger."""
+    path = Path(path)
+    try:
+        with path.open("rb") as f:
+            head = f.read(64).lstrip()
+    except OSError:
+        return False
+    return head.startswith(b"[")
+
+
+def migrate_json_ledger(
+    src: Union[str, Path],
+    dst: Optional[Union[str, Path]] = None,
+    backup: bool = True,
+) -> int:
+    """
+    Convert the legacy JSON ledger at `src` into a record log at `dst`
+    (defaults to `src`, replacing it in place). Record order is preserved.
+
+    The log is written to a temporary file and renamed into place, so an
+    interrupted migration leaves the original untouched. When migrating in
+    place and `backup` is true the original is kept as `<src>.bak`.
+    Returns the number of records migrated.
+    """
+    src = Path(src)
+    dst = Path(dst) if dst is not None else src
+    if is_log_file(src):
+        raise LedgerError(f"{src} is already in the record log format")
+
+    try:
+        with src.open("r", encoding="utf-8") as f:
+            records = json.load(f)
+    except (OSError, ValueError) as e:
+        raise LedgerError(f"Could not read legacy ledger {src}: {e}")
+    if not isinstance(records, list):
+        raise LedgerError(f"Legacy ledger {src} is not a JSON array")
+
+    tmp = dst.with_name(dst.name + ".migrating")
+    if tmp.exists():
+        tmp.unlink()
+    log = RecordLog(tmp)
+    try:
+        log.open()
+        log.append([encode_record(r) for r in records if isinstance(r, dict)])
+    finally:
+        log.close()
+
+    if dst == src and backup:
+        os.replace(src, src.with_name(src.name + ".bak"))
+    os.replace(tmp, dst)
+    return len(records)
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or len(argv) > 2:
+        print("usage: python -m app.services.ledger.migrate SRC [DST]")
+        return 2
+    count = migrate_json_ledger(argv[0], argv[1] if len(argv) == 2 else None)
+    print(f"Migrated {count} records from {argv[0]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
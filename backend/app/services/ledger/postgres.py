@@ -0,0 +1,353 @@
+"""
+Ledger stored in the app's own database (LEDGER_BACKEND=postgres).
+
+Records are appended to the `chain_records` table next to the invoices, so
+they are backed up and replicated with them, and verification can join
+`invoices.blockchain_hash` to the ledger in the same query
+(`crud.get_invoices_on_ledger_async`). Every row carries the chain hash of
+the row before it (`verify_chain` walks it); Merkle blocks over the rows go
+to `chain_blocks` as in the file ledger, so inclusion proofs look the same.
+
+Appends serialize on the one `chain_head` row (`SELECT ... FOR UPDATE`),
+which holds the last sequence number and chain hash. Large batches are
+written with `COPY` when the driver is psycopg2 and with multi-row
+`INSERT`s otherwise. The tables come from the Alembic migration; the SQLite
+stand-in used by tests gets them from `create_all`.
+"""
+
+import csv
+import io
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.models import models
+
+from .base import LedgerBackend, make_record
+from .merkle import GENESIS_HASH, block_hash, chain_hash, leaf_hash, make_proof, merkle_root
+
+# Batches of at least this many new rows are written with COPY (psycopg2 only)
+COPY_MIN_ROWS = 1000
+# Rows per multi-row INSERT, and hashes per `IN (...)` lookup
+INSERT_CHUNK = 1000
+LOOKUP_CHUNK = 1000
+# Blocks whose leaf lists are kept around for proof generation
+LEAF_CACHE_SIZE = 16
+
+_records = models.ChainRecord.__table__
+_blocks = models.ChainBlock.__table__
+_head = models.ChainHead.__table__
+_RECORD_COLUMNS = (_records.c.hash, _records.c["metadata"], _records.c.tx_ref, _records.c.timestamp)
+
+
+def _to_datetime(ts: str) -> datetime:
+    # `make_record` timestamps are naive UTC ISO strings with a trailing Z
+    return datetime.fromisoformat(ts[:-1]).replace(tzinfo=timezone.utc)
+
+
+def _to_timestamp(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat() + "Z"
+
+
+def record_from_row(row: Sequence[Any]) -> Dict[str, Any]:
+    """Ledger record from `(hash, metadata, tx_ref, timestamp)` columns of `chain_records`."""
+    h, metadata, tx_ref, ts = row
+    return {"hash": h, "metadata": metadata, "tx_ref": tx_ref, "timestamp": _to_timestamp(ts)}
+
+
+class PostgresLedger(LedgerBackend):
+    """
+    Ledger in the `chain_records` table of the database behind `engine`.
+
+    A hash that is already on the ledger is not stored again (the hash
+    column is unique): appending it returns the existing record. `version`
+    is read from the database at most every `version_ttl` seconds, so
+    verify results cached by this process notice appends made by other
+    processes within that time.
+    """
+
+    def __init__(self, engine: Engine, block_size: int = 1024, version_ttl: float = 1.0):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.engine = engine
+        self.block_size = block_size
+        self.version_ttl = version_ttl
+        self._ready = False
+        # Appends from this process queue here instead of on the head row lock
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple[int, int]] = None
+        self._version_at = 0.0
+        self._leaf_cache: "OrderedDict[Tuple[int, int], List[bytes]]" = OrderedDict()
+
+    def _init(self) -> None:
+        if self._ready:
+            return
+        try:
+            with self.engine.begin() as conn:
+                if conn.execute(select(_head.c.id).where(_head.c.id == 1)).first() is None:
+                    conn.execute(
+                        insert(_head).values(id=1, ledger_id=random.getrandbits(62), last_seq=0, chain_hash=GENESIS_HASH)
+                    )
+        except IntegrityError:
+            pass  # another process created it first
+        self._ready = True
+
+    def _lock_head(self, conn: Connection):
+        return conn.execute(select(_head).where(_head.c.id == 1).with_for_update()).one()
+
+    def _set_version(self, version: Tuple[int, int]) -> None:
+        with self._lock:
+            self._version, self._version_at = version, time.monotonic()
+
+    # -- records -----------------------------------------------------------
+
+    def append_many(self, entries: Sequence[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        records = [make_record(h, metadata) for h, metadata in entries]
+        if not records:
+            return []
+        self._init()
+        with self._write_lock, self.engine.begin() as conn:
+            head = self._lock_head(conn)
+            stored = self._select_many(conn, [r["hash"] for r in records])
+            seq, link = head.last_seq, head.chain_hash
+            rows, leaves, results = [], {}, []
+            for record in records:
+                existing = stored.get(record["hash"])
+                if existing is not None:
+                    results.append(existing)
+                    continue
+                leaf = leaf_hash(record)
+                seq += 1
+                prev, link = link, chain_hash(link, leaf)
+                rows.append(
+                    {
+                        "seq": seq,
+                        "hash": record["hash"],
+                        "tx_ref": record["tx_ref"],
+                        "timestamp": _to_datetime(record["timestamp"]),
+                        "metadata": record["metadata"],
+                        "prev_hash": prev,
+                        "chain_hash": link,
+                    }
+                )
+                leaves[seq] = leaf
+                stored[record["hash"]] = record
+                results.append(record)
+            if rows:
+                self._insert(conn, rows)
+                conn.execute(update(_head).where(_head.c.id == 1).values(last_seq=seq, chain_hash=link))
+                self._seal_full(conn, seq, leaves)
+        self._set_version((head.ledger_id, seq))
+        return results
+
+    def _insert(self, conn: Connection, rows: List[Dict[str, Any]]) -> None:
+        dialect = self.engine.dialect
+        if len(rows) >= COPY_MIN_ROWS and dialect.name == "postgresql" and dialect.driver == "psycopg2":
+            self._copy(conn, rows)
+            return
+        for lo in range(0, len(rows), INSERT_CHUNK):
+            conn.execute(insert(_records).values(rows[lo : lo + INSERT_CHUNK]))
+
+    def _copy(self, conn: Connection, rows: List[Dict[str, Any]]) -> None:
+        columns = ("seq", "hash", "tx_ref", "timestamp", "metadata", "prev_hash", "chain_hash")
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow(
+                [
+                    row["seq"], row["hash"], row["tx_ref"], row["timestamp"].isoformat(),
+                    json.dumps(row["metadata"], ensure_ascii=False), row["prev_hash"], row["chain_hash"],
+                ]
+            )
+        buf.seek(0)
+        # Same DBAPI connection, so the rows are part of this transaction
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {_records.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+        finally:
+            cursor.close()
+
+    def _select_many(self, conn: Connection, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        hashes = list(set(hashes))
+        for lo in range(0, len(hashes), LOOKUP_CHUNK):
+            rows = conn.execute(select(*_RECORD_COLUMNS).where(_records.c.hash.in_(hashes[lo : lo + LOOKUP_CHUNK])))
+            for row in rows:
+                found[row[0]] = record_from_row(row)
+        return found
+
+    def find(self, h: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*_RECORD_COLUMNS).where(_records.c.hash == h)).first()
+        return record_from_row(row) if row is not None else None
+
+    def find_many(self, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            return self._select_many(conn, hashes)
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            rows = conn.execution_options(stream_results=True, max_row_buffer=1000).execute(
+                select(*_RECORD_COLUMNS).order_by(_records.c.seq)
+            )
+            for row in rows:
+                yield record_from_row(row)
+
+    def version(self) -> Tuple[int, int]:
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._version_at < self.version_ttl:
+                return self._version
+        self._init()
+        with self.engine.connect() as conn:
+            row = conn.execute(select(_head.c.ledger_id, _head.c.last_seq).where(_head.c.id == 1)).one()
+        version = (row.ledger_id, row.last_seq)
+        self._set_version(version)
+        return version
+
+    def verify_chain(self) -> Optional[int]:
+        """
+        Walk the hash chain from the first row. Returns the `seq` where it
+        first breaks (a row edited, removed or out of place), or None when
+        every link and the head check out.
+        """
+        self._init()
+        link, expected = GENESIS_HASH, 1
+        columns = (_records.c.seq, *_RECORD_COLUMNS, _records.c.prev_hash, _records.c.chain_hash)
+        with self.engine.connect() as conn:
+            rows = conn.execution_options(stream_results=True, max_row_buffer=1000).execute(
+                select(*columns).order_by(_records.c.seq)
+            )
+            for row in rows:
+                record = record_from_row(row[1:5])
+                if row.seq != expected or row.prev_hash != link or chain_hash(link, leaf_hash(record)) != row.chain_hash:
+                    return row.seq
+                link, expected = row.chain_hash, expected + 1
+            head = conn.execute(select(_head).where(_head.c.id == 1)).one()
+        if head.last_seq != expected - 1 or head.chain_hash != link:
+            return expected
+        return None
+
+    # -- blocks ------------------------------------------------------------
+
+    def _block_head(self, conn: Connection) -> Tuple[int, int, str]:
+        """Next block height, last sealed seq and head block hash."""
+        row = conn.execute(
+            select(_blocks.c.height, _blocks.c.last_seq, _blocks.c.block_hash).order_by(_blocks.c.height.desc()).limit(1)
+        ).first()
+        return (row.height + 1, row.last_seq, row.block_hash) if row is not None else (0, 0, GENESIS_HASH)
+
+    def _leaves(self, conn: Connection, first: int, last: int, known: Dict[int, bytes]) -> List[bytes]:
+        """Leaf hashes of rows `first`..`last`, from `known` or read from the table."""
+        unknown = [s for s in range(first, last + 1) if s not in known]
+        if unknown:
+            rows = conn.execute(
+                select(_records.c.seq, *_RECORD_COLUMNS).where(_records.c.seq.between(unknown[0], unknown[-1]))
+            )
+            known = dict(known)
+            for row in rows:
+                known[row.seq] = leaf_hash(record_from_row(row[1:]))
+        return [known[s] for s in range(first, last + 1)]
+
+    def _seal(self, conn: Connection, last_seq: int, known: Dict[int, bytes], limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        height, sealed_upto, head = self._block_head(conn)
+        if last_seq <= sealed_upto:
+            return None
+        end = min(last_seq, sealed_upto + limit) if limit else last_seq
+        leaves = self._leaves(conn, sealed_upto + 1, end, known)
+        block = {
+            "height": height,
+            "prev_hash": head,
+            "merkle_root": merkle_root(leaves).hex(),
+            "count": len(leaves),
+            "sealed_at": datetime.utcnow().isoformat() + "Z",
+            "first_seq": sealed_upto + 1,
+            "last_seq": end,
+        }
+        block["block_hash"] = block_hash(block)
+        conn.execute(insert(_blocks).values(**block))
+        return block
+
+    def _seal_full(self, conn: Connection, last_seq: int, known: Dict[int, bytes]) -> None:
+        """Seal every full block of pending rows."""
+        while last_seq - self._block_head(conn)[1] >= self.block_size:
+            self._seal(conn, last_seq, known, self.block_size)
+
+    def seal(self) -> Optional[Dict[str, Any]]:
+        """Seal all pending rows into a block now. Returns the block, if any."""
+        self._init()
+        with self._write_lock, self.engine.begin() as conn:
+            head = self._lock_head(conn)
+            return self._seal(conn, head.last_seq, {})
+
+    def _block_leaves(self, conn: Connection, ledger_id: int, block) -> List[bytes]:
+        key = (ledger_id, block.height)
+        with self._lock:
+            cached = self._leaf_cache.get(key)
+            if cached is not None:
+                self._leaf_cache.move_to_end(key)
+                return cached
+        leaves = self._leaves(conn, block.first_seq, block.last_seq, {})
+        with self._lock:
+            self._leaf_cache[key] = leaves
+            while len(self._leaf_cache) > LEAF_CACHE_SIZE:
+                self._leaf_cache.popitem(last=False)
+        return leaves
+
+    def inclusion_proof(self, h: str) -> Optional[Dict[str, Any]]:
+        """
+        Merkle inclusion proof for the record with hash `h`, or None if the
+        hash is not in the ledger. A pending record gets a pending proof (see
+        `merkle.make_proof`); nothing is sealed here.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(select(_records.c.seq, *_RECORD_COLUMNS).where(_records.c.hash == h)).first()
+            if row is None:
+                return None
+            seq, record = row.seq, record_from_row(row[1:])
+            block_query = select(_blocks).where(_blocks.c.last_seq >= seq).order_by(_blocks.c.last_seq).limit(1)
+            block = conn.execute(block_query).first()
+            if block is None:
+                height, sealed_upto, head = self._block_head(conn)
+                if seq > sealed_upto:
+                    rows = conn.execute(
+                        select(_records.c.seq, *_RECORD_COLUMNS).where(_records.c.seq > sealed_upto).order_by(_records.c.seq)
+                    ).all()
+                    leaves = [leaf_hash(record_from_row(r[1:])) for r in rows]
+                    block = {"height": height, "prev_hash": head}
+                    return make_proof(record, leaves, [r.seq for r in rows].index(seq), block)
+                # Sealed since the first look
+                block = conn.execute(block_query).one()
+            ledger_id = conn.execute(select(_head.c.ledger_id).where(_head.c.id == 1)).scalar_one()
+            leaves = self._block_leaves(conn, ledger_id, block)
+        return make_proof(record, leaves, seq - block.first_seq, dict(block._mapping))
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def clear(self) -> None:
+        self._init()
+        with self._write_lock, self.engine.begin() as conn:
+            self._lock_head(conn)
+            conn.execute(delete(_blocks))
+            conn.execute(delete(_records))
+            # A new identity, so results cached against the old ledger are dropped
+            ledger_id = random.getrandbits(62)
+            conn.execute(update(_head).where(_head.c.id == 1).values(ledger_id=ledger_id, last_seq=0, chain_hash=GENESIS_HASH))
+        self._set_version((ledger_id, 0))
+        with self._lock:
+            self._leaf_cache.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._leaf_cache.clear()
+            self._version = None
@@ -0,0 +1,156 @@
+"""
+Wire format between `LedgerClient` and `LedgerServer`.
+
+Every message is a fixed header followed by a body::
+
+    request = <body length: u32> <request id: u32> <op: u8> <body>
+    reply   = <body length: u32> <request id: u32> <status: u8> <body>
+
+Requests on a connection are pipelined: a client sends as many as it likes
+without waiting, and replies carry the request id they answer, in any
+order. Integers are little-endian. Bodies:
+
+    APPEND   <count: u32> (<hash> <metadata JSON: u32-prefixed>)*
+             -> (<record JSON: u32-prefixed>)*
+    FIND     <count: u32> (<hash>)*
+             -> (<record JSON: u32-prefixed, empty when absent>)*
+    VERSION  -> <identity: u64> <position: u64>, or empty when untracked
+    PROOF    <hash> -> <proof JSON>, or empty when absent
+    CLEAR    -> empty
+
+A hash is u16-prefixed UTF-8. An ERROR reply's body is the message.
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .base import LedgerError
+
+HEADER = struct.Struct("<IIB")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_VERSION = struct.Struct("<QQ")
+
+# Upper bound on a body; anything larger is treated as a broken stream
+MAX_BODY = 64 * 1024 * 1024
+
+OP_APPEND = 1
+OP_FIND = 2
+OP_VERSION = 3
+OP_PROOF = 4
+OP_CLEAR = 5
+
+OK = 0
+ERROR = 1
+
+
+def frame(request_id: int, code: int, body: bytes = b"") -> bytes:
+    return HEADER.pack(len(body), request_id, code) + body
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def u32(self) -> int:
+        (value,) = _U32.unpack_from(self.data, self.pos)
+        self.pos += 4
+        return value
+
+    def blob(self, prefix: struct.Struct) -> bytes:
+        (length,) = prefix.unpack_from(self.data, self.pos)
+        start = self.pos + prefix.size
+        self.pos = start + length
+        if self.pos > len(self.data):
+            raise LedgerError("Truncated ledger message")
+        return self.data[start : self.pos]
+
+
+def _hash(h: str) -> bytes:
+    raw = h.encode("utf-8")
+    return _U16.pack(len(raw)) + raw
+
+
+def _json_list(values: Sequence[Optional[Any]]) -> bytes:
+    parts = []
+    for value in values:
+        raw = b"" if value is None else _dumps(value)
+        parts.append(_U32.pack(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def _read_json_list(body: bytes) -> List[Optional[Any]]:
+    reader, values = _Reader(body), []
+    while reader.pos < len(body):
+        raw = reader.blob(_U32)
+        values.append(json.loads(raw) if raw else None)
+    return values
+
+
+# -- requests -------------------------------------------------------------------
+
+
+def encode_append(entries: Sequence[Tuple[str, Dict[str, Any]]]) -> bytes:
+    parts = [_U32.pack(len(entries))]
+    for h, metadata in entries:
+        raw = _dumps(metadata)
+        parts += [_hash(h), _U32.pack(len(raw)), raw]
+    return b"".join(parts)
+
+
+def decode_append(body: bytes) -> List[Tuple[str, Dict[str, Any]]]:
+    reader = _Reader(body)
+    return [(reader.blob(_U16).decode("utf-8"), json.loads(reader.blob(_U32))) for _ in range(reader.u32())]
+
+
+def encode_find(hashes: Sequence[str]) -> bytes:
+    return _U32.pack(len(hashes)) + b"".join(_hash(h) for h in hashes)
+
+
+def decode_find(body: bytes) -> List[str]:
+    reader = _Reader(body)
+    return [reader.blob(_U16).decode("utf-8") for _ in range(reader.u32())]
+
+
+def encode_proof(h: str) -> bytes:
+    return _hash(h)
+
+
+def decode_proof(body: bytes) -> str:
+    return _Reader(body).blob(_U16).decode("utf-8")
+
+
+# -- replies --------------------------------------------------------------------
+
+
+def encode_records(records: Sequence[Optional[Dict[str, Any]]]) -> bytes:
+    return _json_list(records)
+
+
+def decode_records(body: bytes) -> List[Optional[Dict[str, Any]]]:
+    return _read_json_list(body)
+
+
+def encode_version(version: Optional[Tuple[int, int]]) -> bytes:
+    return b"" if version is None else _VERSION.pack(*version)
+
+
+def decode_version(body: bytes) -> Optional[Tuple[int, int]]:
+    return _VERSION.unpack(body) if body else None
+
+
+def encode_json(value: Optional[Any]) -> bytes:
+    return b"" if value is None else _dumps(value)
+
+
+def decode_json(body: bytes) -> Optional[Any]:
+    return json.loads(body) if body else None
@@ -0,0 +1,432 @@
+"""
+Segmented record log.
+
+The ledger is split into fixed-size segments. The active segment lives at the
+ledger path and is an ordinary `RecordLog`; once it grows past
+`segment_size` it is sealed (moved read-only into `<path>.segments/`) and a
+fresh active segment is started. A single-file ledger is simply a
+segmented log with no sealed segments yet, so existing files need no
+migration.
+
+Positions handed out by the log are global: ``segment_id << 40 | offset``.
+They are monotonic across segments, so the hash index and the block store
+keep working unchanged.
+
+Sealed segments are read through `mmap` without parsing the whole file. When
+compression is enabled they are rewritten in independently-compressed
+64 KiB chunks with a chunk table at the end, so a record read only inflates
+the chunk(s) holding it. Per-segment metadata (record count, hash range,
+first/last timestamp) is kept in `manifest.json` and lets scans skip whole
+segments.
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .base import LedgerError
+from .log import FRAME_HEADER, MAGIC, MAX_FRAME_SIZE, RecordLog
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_BITS = 40
+SEGMENT_SPAN = 1 << SEGMENT_BITS
+OFFSET_MASK = SEGMENT_SPAN - 1
+
+COMPRESSED_MAGIC = b"ZRASEGZ1"
+CHUNK_SIZE = 64 * 1024
+_CHUNK_ENTRY = struct.Struct("<QQI")  # uncompressed start, compressed offset, compressed length
+_TRAILER = struct.Struct("<QI8s")  # uncompressed size, chunk count, magic
+MANIFEST = "manifest.json"
+
+# Given a record payload, return its (hash, timestamp) for segment metadata
+Describe = Callable[[bytes], Tuple[str, str]]
+
+
+def position(segment_id: int, offset: int) -> int:
+    return (segment_id << SEGMENT_BITS) | offset
+
+
+def split_position(pos: int) -> Tuple[int, int]:
+    return pos >> SEGMENT_BITS, pos & OFFSET_MASK
+
+
+def _iter_frames(read: Callable[[int, int], bytes], start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+    offset = start
+    while offset + FRAME_HEADER.size <= end:
+        length, crc = FRAME_HEADER.unpack(read(offset, FRAME_HEADER.size))
+        if length > MAX_FRAME_SIZE or offset + FRAME_HEADER.size + length > end:
+            return
+        payload = read(offset + FRAME_HEADER.size, length)
+        if zlib.crc32(payload) != crc:
+            return
+        yield offset, payload
+        offset += FRAME_HEADER.size + length
+
+
+class _MappedSegment:
+    """A sealed, uncompressed segment read straight from a memory map."""
+
+    compressed = False
+
+    def __init__(self, path: Path):
+        self.path = path
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._mm)
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self._mm[offset : offset + length]
+
+    def close(self) -> None:
+        # Readers may still hold `read` of a segment that was just replaced
+        # (compressed, or the log closed), so the mapping is left to be
+        # released with the last reference rather than closed under them.
+        pass
+
+
+class _CompressedSegment:
+    """A sealed segment stored as independently inflatable zlib chunks."""
+
+    compressed = True
+    CACHE_CHUNKS = 4
+
+    def __init__(self, path: Path):
+        self.path = path
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size, count, magic = _TRAILER.unpack_from(self._mm, len(self._mm) - _TRAILER.size)
+        if magic != COMPRESSED_MAGIC or self._mm[: len(COMPRESSED_MAGIC)] != COMPRESSED_MAGIC:
+            raise LedgerError(f"{path} is not a compressed ledger segment")
+        table_at = len(self._mm) - _TRAILER.size - count * _CHUNK_ENTRY.size
+        self._chunks = [_CHUNK_ENTRY.unpack_from(self._mm, table_at + i * _CHUNK_ENTRY.size) for i in range(count)]
+        self._starts = [c[0] for c in self._chunks]
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = size
+
+    def _chunk(self, i: int) -> bytes:
+        with self._lock:
+            data = self._cache.get(i)
+            if data is not None:
+                self._cache.move_to_end(i)
+                return data
+        _, c_off, c_len = self._chunks[i]
+        data = zlib.decompress(self._mm[c_off : c_off + c_len])
+        with self._lock:
+            self._cache[i] = data
+            while len(self._cache) > self.CACHE_CHUNKS:
+                self._cache.popitem(last=False)
+        return data
+
+    def read(self, offset: int, length: int) -> bytes:
+        parts = []
+        i = bisect.bisect_right(self._starts, offset) - 1
+        while length > 0 and 0 <= i < len(self._chunks):
+            data = self._chunk(i)
+            start = offset - self._starts[i]
+            part = data[start : start + length]
+            parts.append(part)
+            offset += len(part)
+            length -= len(part)
+            i += 1
+        return b"".join(parts)
+
+    def close(self) -> None:
+        pass  # see `_MappedSegment.close`
+
+
+def compress_segment(src: Path, dst: Path, chunk_size: int = CHUNK_SIZE) -> None:
+    """Write a chunk-compressed copy of sealed segment `src` to `dst` (atomically)."""
+    tmp = dst.with_name(dst.name + ".tmp")
+    table = []
+    with src.open("rb") as fin, tmp.open("wb") as fout:
+        fout.write(COMPRESSED_MAGIC)
+        u_pos = 0
+        while True:
+            data = fin.read(chunk_size)
+            if not data:
+                break
+            blob = zlib.compress(data, 6)
+            table.append((u_pos, fout.tell(), len(blob)))
+            fout.write(blob)
+            u_pos += len(data)
+        for entry in table:
+            fout.write(_CHUNK_ENTRY.pack(*entry))
+        fout.write(_TRAILER.pack(u_pos, len(table), COMPRESSED_MAGIC))
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp, dst)
+
+
+class SegmentedLog:
+    """
+    Drop-in replacement for `RecordLog` that rolls over into sealed segments.
+    Appends are serialized by the caller, as with `RecordLog`.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        fsync: bool = True,
+        segment_size: int = 64 * 1024 * 1024,
+        compress: bool = False,
+        describe: Optional[Describe] = None,
+    ):
+        self.path = Path(path)
+        self.dir = self.path.with_name(self.path.name + ".segments")
+        self.fsync = fsync
+        self.segment_size = segment_size
+        self.compress = compress
+        self.describe = describe
+        self._active = RecordLog(self.path, fsync=fsync)
+        self._active_id = 0
+        self._sealed: Dict[int, Any] = {}
+        self._meta: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        # Held while writing manifest.json; roll-over and the finishing threads all write it
+        self._manifest_lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+
+    # -- lifecycle ---------------------------------------------------------
+
+    @property
+    def is_open(self) -> bool:
+        return self._active.is_open
+
+    @property
+    def identity(self) -> int:
+        """Stable identifier of this log (the segment directory's inode)."""
+        return os.stat(self.dir).st_ino
+
+    @property
+    def size(self) -> int:
+        """Global position just past the last record."""
+        return position(self._active_id, self._active.size)
+
+    def exists(self) -> bool:
+        return self.path.exists() or self.dir.exists()
+
+    def open(self, recover: bool = True) -> None:
+        if self.is_open:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._load_manifest()
+        for seg_path in sorted(self.dir.glob("*.seg")) + sorted(self.dir.glob("*.segz")):
+            seg_id = int(seg_path.name.split(".")[0])
+            if seg_path.suffix == ".seg" and (self.dir / f"{seg_id:08d}.segz").exists():
+                # Compression finished but the uncompressed original was not removed yet
+                seg_path.unlink()
+                continue
+            self._sealed[seg_id] = self._open_sealed(seg_path)
+        self._active_id = max(self._sealed) + 1 if self._sealed else 0
+        self._active.open(recover=False)
+        if recover:
+            self.recover()
+        for seg_id in sorted(self._sealed):
+            if "records" not in self._meta.get(seg_id, {}) or (self.compress and not self._sealed[seg_id].compressed):
+                self._finish_in_background(seg_id)
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        with self._lock:
+            self._active.close()
+            for segment in self._sealed.values():
+                segment.close()
+            self._sealed = {}
+
+    @staticmethod
+    def _open_sealed(path: Path):
+        return _CompressedSegment(path) if path.suffix == ".segz" else _MappedSegment(path)
+
+    # -- reads -------------------------------------------------------------
+
+    def _reader(self, seg_id: int) -> Callable[[int, int], bytes]:
+        with self._lock:
+            if seg_id == self._active_id:
+                return self._active.read
+            segment = self._sealed.get(seg_id)
+        if segment is None:
+            raise LedgerError(f"No ledger segment {seg_id} in {self.dir}")
+        return segment.read
+
+    def _segment_end(self, seg_id: int) -> int:
+        return self._active.size if seg_id == self._active_id else self._sealed[seg_id].size
+
+    def read_at(self, pos: int) -> bytes:
+        seg_id, offset = split_position(pos)
+        with self._lock:
+            if seg_id == self._active_id:
+                # `_roll_over` closes the active file under this lock, so it stays open for the read
+                return self._read_frame(self._active.read, pos, offset)
+        return self._read_frame(self._reader(seg_id), pos, offset)
+
+    def _read_frame(self, read: Callable[[int, int], bytes], pos: int, offset: int) -> bytes:
+        header = read(offset, FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise LedgerError(f"No frame at position {pos} in {self.path}")
+        length, crc = FRAME_HEADER.unpack(header)
+        payload = read(offset + FRAME_HEADER.size, length)
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise LedgerError(f"Corrupt frame at position {pos} in {self.path}")
+        return payload
+
+    def is_boundary(self, pos: int) -> bool:
+        """Whether `pos` is the start of an intact record or the end of a segment."""
+        seg_id, offset = split_position(pos)
+        if seg_id != self._active_id and seg_id not in self._sealed:
+            return False
+        if offset == self._segment_end(seg_id):
+            return True
+        try:
+            self.read_at(pos)
+        except LedgerError:
+            return False
+        return True
+
+    def scan(
+        self,
+        start: Optional[int] = None,
+        segment_filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yield `(position, payload)` for every record from `start`. Sealed
+        segments for which `segment_filter(metadata)` is false are skipped
+        without being read; segments without metadata yet are always read.
+        """
+        first_id, first_offset = split_position(start) if start is not None else (0, len(MAGIC))
+        with self._lock:
+            seg_ids = sorted(self._sealed) + [self._active_id]
+        for seg_id in seg_ids:
+            if seg_id < first_id:
+                continue
+            offset = first_offset if seg_id == first_id else len(MAGIC)
+            with self._lock:
+                # Checked and opened together, so a roll-over cannot slip in
+                # between; the scan then holds its own descriptor of the file
+                frames = self._active.scan(offset) if seg_id == self._active_id else None
+            if frames is not None:
+                for local, payload in frames:
+                    yield position(seg_id, local), payload
+                continue
+            meta = self._meta.get(seg_id)
+            if segment_filter is not None and meta and "records" in meta and not segment_filter(meta):
+                continue
+            for local, payload in _iter_frames(self._reader(seg_id), offset, self._segment_end(seg_id)):
+                yield position(seg_id, local), payload
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """Metadata for every sealed segment, oldest first."""
+        with self._lock:
+            return [dict(self._meta.get(seg_id, {"id": seg_id})) for seg_id in sorted(self._sealed)]
+
+    # -- writes ------------------------------------------------------------
+
+    def recover(self, start: Optional[int] = None, visit: Optional[Callable[[int, bytes], Any]] = None) -> int:
+        """
+        Replay records from `start`, truncating a torn tail in the active
+        segment. Sealed segments are immutable and never truncated.
+        """
+        start_id, start_offset = split_position(start) if start is not None else (0, len(MAGIC))
+        for seg_id in sorted(self._sealed):
+            if seg_id < start_id:
+                continue
+            offset = start_offset if seg_id == start_id else len(MAGIC)
+            for local, payload in _iter_frames(self._reader(seg_id), offset, self._segment_end(seg_id)):
+                if visit is not None:
+                    visit(position(seg_id, local), payload)
+        active_visit = None
+        if visit is not None:
+            active_visit = lambda local, payload: visit(position(self._active_id, local), payload)  # noqa: E731
+        active_start = start_offset if start_id == self._active_id else None
+        self._active.recover(active_start, active_visit)
+        return self.size
+
+    def append(self, payloads: Sequence[bytes]) -> List[int]:
+        if not self._active.is_open:
+            self.open()
+        if self.segment_size and self._active.size >= self.segment_size:
+            self._roll_over()
+        base = position(self._active_id, 0)
+        return [base + offset for offset in self._active.append(payloads)]
+
+    def _roll_over(self) -> None:
+        seg_id = self._active_id
+        sealed_path = self.dir / f"{seg_id:08d}.seg"
+        # The open handle follows the rename, so lock-free readers of the old
+        # active segment keep working until the sealed segment is installed.
+        os.replace(self.path, sealed_path)
+        os.chmod(sealed_path, 0o444)
+        sealed = _MappedSegment(sealed_path)
+        active = RecordLog(self.path, fsync=self.fsync)
+        active.open(recover=False)
+        with self._lock:
+            old, self._active = self._active, active
+            self._sealed[seg_id] = sealed
+            self._meta[seg_id] = {"id": seg_id, "size": sealed.size}
+            self._active_id = seg_id + 1
+            old.close()
+        self._save_manifest()
+        self._finish_in_background(seg_id)
+
+    # -- sealed segment maintenance ---------------------------------------
+
+    def _finish_in_background(self, seg_id: int) -> None:
+        worker = threading.Thread(target=self._finish_segment, args=(seg_id,), name=f"ledger-seal-{seg_id}", daemon=True)
+        self._workers = [w for w in self._workers if w.is_alive()] + [worker]
+        worker.start()
+
+    def _finish_segment(self, seg_id: int) -> None:
+        """Compute metadata for a sealed segment and compress it if configured."""
+        try:
+            segment = self._sealed[seg_id]
+            meta = {"id": seg_id, "size": segment.size, "records": 0}
+            for _, payload in _iter_frames(segment.read, len(MAGIC), segment.size):
+                meta["records"] += 1
+                if self.describe is None:
+                    continue
+                h, ts = self.describe(payload)
+                meta["min_hash"] = min(meta.get("min_hash", h), h)
+                meta["max_hash"] = max(meta.get("max_hash", h), h)
+                meta.setdefault("first_timestamp", ts)
+                meta["last_timestamp"] = ts
+            if self.compress and not segment.compressed:
+                compressed_path = self.dir / f"{seg_id:08d}.segz"
+                compress_segment(segment.path, compressed_path)
+                with self._lock:
+                    self._sealed[seg_id] = _CompressedSegment(compressed_path)
+                segment.path.unlink()
+                segment.close()
+            meta["compressed"] = self._sealed[seg_id].compressed
+            with self._lock:
+                self._meta[seg_id] = meta
+            self._save_manifest()
+        except Exception:
+            logger.exception("Failed to finish sealing ledger segment %d in %s", seg_id, self.dir)
+
+    def _load_manifest(self) -> None:
+        try:
+            with (self.dir / MANIFEST).open("r", encoding="utf-8") as f:
+                self._meta = {m["id"]: m for m in json.load(f)["segments"]}
+        except (OSError, ValueError, KeyError):
+            self._meta = {}
+
+    def _save_manifest(self) -> None:
+        with self._manifest_lock:
+            with self._lock:
+                data = {"segments": [self._meta[i] for i in sorted(self._meta) if i in self._sealed]}
+            # Named per process, so another process on the same directory never shares it
+            tmp = self.dir / f"{MANIFEST}.{os.getpid()}.tmp"
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.dir / MANIFEST)
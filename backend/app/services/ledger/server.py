@@ -0,0 +1,240 @@
+"""
+Single-writer ledger service.
+
+Several uvicorn workers cannot share a `FileLedger`: each process would keep
+its own idea of the log's end and index, and their appends would overwrite
+one another. Instead one process owns the ledger and serves every worker
+over a Unix domain socket (see `protocol` for the wire format and `client`
+for the other end)::
+
+    python -m app.services.ledger.server [--socket PATH] [--path LEDGER]
+
+Lookups are answered on the event loop straight from the memory-mapped
+index. Appends, and the requests that take the ledger lock (proofs, which
+read the pending tail under it, and clear), run on a single writer thread; whatever arrives
+while a write is in flight, from any connection, goes into the next write,
+so concurrent submitters share one write and fsync as with
+`GroupCommitLedger`. Replies produced by one read from a connection, and
+the append replies of one write, go out in a single send per connection.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from . import protocol
+from .base import LedgerBackend, LedgerError
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 256 * 1024
+
+
+class LedgerServer:
+    """Serves `backend` on the Unix socket at `socket_path`."""
+
+    def __init__(self, backend: LedgerBackend, socket_path: Union[str, Path], max_batch: int = 256):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.backend = backend
+        self.socket_path = Path(socket_path)
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger-writer")
+        # (writer, request id, entries) waiting for the next write
+        self._appends: Deque[Tuple[asyncio.StreamWriter, int, list]] = deque()
+        self._flushing = False
+        # Proof and clear requests running on the writer thread
+        self._slow: "set[asyncio.Task]" = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"connections": 0, "requests": 0, "appended": 0, "batches": 0, "errors": 0}
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, **increments: int) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self) -> None:
+        if self.socket_path.exists():
+            # Left behind by a previous run; a live server would still be bound to it
+            self.socket_path.unlink()
+        self._server = await asyncio.start_unix_server(self._serve, path=str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        while self._flushing or self._appends or self._slow:
+            await asyncio.sleep(0.001)
+        self._executor.shutdown(wait=True)
+        self.backend.close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info("Ledger service listening on %s", self.socket_path)
+        await stop.wait()
+        await self.stop()
+
+    # -- connections -------------------------------------------------------
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._count(connections=1)
+        buf = bytearray()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    return
+                buf += data
+                replies, pos = [], 0
+                while len(buf) - pos >= protocol.HEADER.size:
+                    length, request_id, op = protocol.HEADER.unpack_from(buf, pos)
+                    if length > protocol.MAX_BODY:
+                        raise LedgerError(f"Ledger request of {length} bytes is too large")
+                    end = pos + protocol.HEADER.size + length
+                    if end > len(buf):
+                        break
+                    reply = self._dispatch(writer, request_id, op, bytes(buf[pos + protocol.HEADER.size : end]))
+                    if reply is not None:
+                        replies.append(reply)
+                    pos = end
+                del buf[:pos]
+                if replies:
+                    writer.write(b"".join(replies))
+                    await writer.drain()
+        except (ConnectionError, LedgerError) as e:
+            logger.warning("Dropping ledger client: %s", e)
+        finally:
+            writer.close()
+
+    def _dispatch(self, writer: asyncio.StreamWriter, request_id: int, op: int, body: bytes) -> Optional[bytes]:
+        """Reply to one request now, or return None when the reply comes later."""
+        self._count(requests=1)
+        try:
+            if op == protocol.OP_APPEND:
+                self._appends.append((writer, request_id, protocol.decode_append(body)))
+                if not self._flushing:
+                    self._flushing = True
+                    asyncio.get_running_loop().create_task(self._flush())
+                return None
+            if op == protocol.OP_FIND:
+                hashes = protocol.decode_find(body)
+                found = self.backend.find_many(hashes)
+                reply = protocol.encode_records([found.get(h) for h in hashes])
+            elif op == protocol.OP_VERSION:
+                reply = protocol.encode_version(self.backend.version())
+            elif op == protocol.OP_PROOF:
+                h = protocol.decode_proof(body)
+                self._off_loop(writer, request_id, lambda: protocol.encode_json(self.backend.inclusion_proof(h)))
+                return None
+            elif op == protocol.OP_CLEAR:
+                self._off_loop(writer, request_id, lambda: self.backend.clear() or b"")
+                return None
+            else:
+                raise LedgerError(f"Unknown ledger op {op}")
+        except Exception as e:
+            self._count(errors=1)
+            return protocol.frame(request_id, protocol.ERROR, str(e).encode("utf-8"))
+        return protocol.frame(request_id, protocol.OK, reply)
+
+    def _off_loop(self, writer: asyncio.StreamWriter, request_id: int, work) -> None:
+        """Run `work` (which returns the reply body) on the writer thread and reply when it is done."""
+        task = asyncio.get_running_loop().create_task(self._reply_later(writer, request_id, work))
+        self._slow.add(task)
+        task.add_done_callback(self._slow.discard)
+
+    async def _reply_later(self, writer: asyncio.StreamWriter, request_id: int, work) -> None:
+        try:
+            reply = protocol.frame(request_id, protocol.OK, await asyncio.get_running_loop().run_in_executor(self._executor, work))
+        except Exception as e:
+            self._count(errors=1)
+            reply = protocol.frame(request_id, protocol.ERROR, str(e).encode("utf-8"))
+        if not writer.is_closing():
+            writer.write(reply)
+
+    # -- appends -----------------------------------------------------------
+
+    async def _flush(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._appends:
+                batch, size = [], 0
+                while self._appends and (not batch or size + len(self._appends[0][2]) <= self.max_batch):
+                    request = self._appends.popleft()
+                    batch.append(request)
+                    size += len(request[2])
+                entries = [entry for _, _, request_entries in batch for entry in request_entries]
+                try:
+                    records = await loop.run_in_executor(self._executor, self.backend.append_many, entries)
+                    error = None
+                except Exception as e:
+                    records, error = None, str(e).encode("utf-8")
+                    self._count(errors=1)
+                self._count(appended=0 if error else len(entries), batches=1)
+
+                replies: Dict[asyncio.StreamWriter, List[bytes]] = defaultdict(list)
+                pos = 0
+                for writer, request_id, request_entries in batch:
+                    if error is not None:
+                        replies[writer].append(protocol.frame(request_id, protocol.ERROR, error))
+                    else:
+                        chunk = records[pos : pos + len(request_entries)]
+                        replies[writer].append(protocol.frame(request_id, protocol.OK, protocol.encode_records(chunk)))
+                    pos += len(request_entries)
+                for writer, frames in replies.items():
+                    if not writer.is_closing():
+                        writer.write(b"".join(frames))
+        finally:
+            self._flushing = False
+
+
+def main(argv=None) -> None:
+    from app import config
+    from app.services import ledger
+
+    parser = argparse.ArgumentParser(description="Serve the invoice ledger to app workers over a Unix socket")
+    parser.add_argument("--socket", default=config.LEDGER_SOCKET or ledger.DEFAULT_SOCKET)
+    parser.add_argument("--path", default=config.LEDGER_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    ledger.configure(
+        backend=config.LEDGER_BACKEND,
+        fsync=config.LEDGER_FSYNC,
+        max_batch=config.LEDGER_MAX_BATCH,
+        block_size=config.LEDGER_BLOCK_SIZE,
+        segment_size=config.LEDGER_SEGMENT_BYTES,
+        compress_segments=config.LEDGER_COMPRESS_SEGMENTS,
+        checkpoint_bytes=config.LEDGER_CHECKPOINT_BYTES,
+        checkpoint_keep=config.LEDGER_CHECKPOINT_KEEP,
+        record_format=config.LEDGER_RECORD_FORMAT,
+    )
+    server = LedgerServer(ledger.local_ledger(Path(args.path).absolute()), args.socket, max_batch=ledger.settings.max_batch)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
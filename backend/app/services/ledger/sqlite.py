@@ -0,0 +1,305 @@
+"""
+SQLite ledger backend.
+
+Records are rows of `ledger_records` in an SQLite database in WAL mode, with
+unique indexes on `hash` and `tx_ref`; Merkle blocks (the same ones the file
+ledger seals, see `merkle`) are rows of `ledger_blocks`. Any number of
+processes can open the same database: readers never block and are never
+blocked, and writers take turns through SQLite's own lock, so several app
+workers can share the ledger without the ledger service.
+
+An `append_many` call is a single transaction, so wrapped in
+`GroupCommitLedger` concurrent submissions share one commit.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .base import LedgerBackend, LedgerError, make_record
+from .merkle import GENESIS_HASH, block_hash, leaf_hash, make_proof, merkle_root
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+# Host parameters per `IN (...)` lookup; SQLite's default limit is 999 before 3.32
+LOOKUP_CHUNK = 500
+# Blocks whose leaf lists are kept around for proof generation
+LEAF_CACHE_SIZE = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_records (
+    seq INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    tx_ref TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ledger_records_hash ON ledger_records (hash);
+CREATE UNIQUE INDEX IF NOT EXISTS ledger_records_tx_ref ON ledger_records (tx_ref);
+CREATE TABLE IF NOT EXISTS ledger_blocks (
+    height INTEGER PRIMARY KEY,
+    prev_hash TEXT NOT NULL,
+    merkle_root TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sealed_at TEXT NOT NULL,
+    first_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    block_hash TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ledger_blocks_last_seq ON ledger_blocks (last_seq);
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_COLUMNS = "hash, metadata, tx_ref, timestamp"
+_BLOCK_COLUMNS = "height, prev_hash, merkle_root, count, sealed_at, first_seq, last_seq, block_hash"
+
+
+def _record(row: Tuple[str, str, str, str]) -> Dict[str, Any]:
+    return {"hash": row[0], "metadata": json.loads(row[1]), "tx_ref": row[2], "timestamp": row[3]}
+
+
+def _block(row: Tuple) -> Dict[str, Any]:
+    return dict(zip(_BLOCK_COLUMNS.split(", "), row))
+
+
+class SqliteLedger(LedgerBackend):
+    """
+    Ledger stored in the SQLite database at `path`.
+
+    Records are sealed into Merkle blocks of `block_size` records as in
+    `FileLedger`. A hash that is already on the ledger is not stored again:
+    appending it returns the existing record, which is also what `find`
+    returns for it.
+    """
+
+    def __init__(self, path: Union[str, Path], fsync: bool = True, block_size: int = 1024, busy_timeout: float = 30.0):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.path = Path(path)
+        self.fsync = fsync
+        self.block_size = block_size
+        self.busy_timeout = busy_timeout
+        # One connection per thread (and per process, after a fork)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._leaf_cache: "OrderedDict[Tuple[int, int], List[Tuple[int, bytes]]]" = OrderedDict()
+
+    # -- connections -------------------------------------------------------
+
+    def _check_file(self) -> None:
+        try:
+            with self.path.open("rb") as f:
+                head = f.read(len(SQLITE_MAGIC))
+        except FileNotFoundError:
+            return
+        if head and head != SQLITE_MAGIC:
+            raise LedgerError(f"{self.path} is not an SQLite ledger; point LEDGER_PATH at a new file")
+
+    def _connect(self) -> sqlite3.Connection:
+        self._check_file()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            conn = sqlite3.connect(str(self.path), timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL keeps the database consistent after a crash but
+            # may lose the last commits on power loss; FULL syncs every commit
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO ledger_meta (key, value) VALUES ('id', ?)", (random.getrandbits(62),))
+        except sqlite3.Error as e:
+            raise LedgerError(f"Could not open SQLite ledger {self.path}: {e}") from e
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "conn", None) is None or local.pid != os.getpid() or local.generation != self._generation:
+            conn = self._connect()
+            with self._lock:
+                self._connections.append(conn)
+            local.conn, local.pid, local.generation = conn, os.getpid(), self._generation
+        return local.conn
+
+    def _write(self, fn, *args):
+        """Run `fn(conn, *args)` in one write transaction."""
+        conn = self._conn()
+        # SQLite serializes writers across processes; the lock only saves
+        # threads of this process from polling its busy handler
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return result
+
+    # -- records -----------------------------------------------------------
+
+    def append_many(self, entries: Sequence[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        records = [make_record(h, metadata) for h, metadata in entries]
+        if not records:
+            return []
+        return self._write(self._insert, records)
+
+    def _insert(self, conn: sqlite3.Connection, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO ledger_records (hash, tx_ref, timestamp, metadata) VALUES (?, ?, ?, ?)",
+            [
+                (r["hash"], r["tx_ref"], r["timestamp"], json.dumps(r["metadata"], separators=(",", ":"), ensure_ascii=False))
+                for r in records
+            ],
+        )
+        if conn.total_changes - before < len(records):
+            # Some hashes were already on the ledger: hand back their first record
+            stored = self._select_many(conn, [r["hash"] for r in records])
+            records = [stored[r["hash"]] for r in records]
+        while self._pending_count(conn) >= self.block_size:
+            self._seal(conn, self.block_size)
+        return records
+
+    def _select_many(self, conn: sqlite3.Connection, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        hashes = list(set(hashes))
+        for lo in range(0, len(hashes), LOOKUP_CHUNK):
+            chunk = hashes[lo : lo + LOOKUP_CHUNK]
+            sql = f"SELECT {_COLUMNS} FROM ledger_records WHERE hash IN ({','.join('?' * len(chunk))})"
+            for row in conn.execute(sql, chunk):
+                found[row[0]] = _record(row)
+        return found
+
+    def find(self, h: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(f"SELECT {_COLUMNS} FROM ledger_records WHERE hash = ?", (h,)).fetchone()
+        return _record(row) if row is not None else None
+
+    def find_many(self, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        return self._select_many(self._conn(), hashes)
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for row in self._conn().execute(f"SELECT {_COLUMNS} FROM ledger_records ORDER BY seq"):
+            yield _record(row)
+
+    def version(self) -> Tuple[int, int]:
+        # Read from the database, so appends by other processes are seen too
+        return self._conn().execute(
+            "SELECT (SELECT value FROM ledger_meta WHERE key = 'id'), (SELECT coalesce(max(seq), 0) FROM ledger_records)"
+        ).fetchone()
+
+    # -- blocks ------------------------------------------------------------
+
+    def _head(self, conn: sqlite3.Connection) -> Tuple[int, int, str]:
+        """Next block height, last sealed seq and head block hash."""
+        row = conn.execute("SELECT height, last_seq, block_hash FROM ledger_blocks ORDER BY height DESC LIMIT 1").fetchone()
+        return (row[0] + 1, row[1], row[2]) if row is not None else (0, 0, GENESIS_HASH)
+
+    def _pending_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT count(*) FROM ledger_records WHERE seq > ?", (self._head(conn)[1],)).fetchone()[0]
+
+    def _seal(self, conn: sqlite3.Connection, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        height, sealed_upto, head = self._head(conn)
+        rows = conn.execute(
+            f"SELECT seq, {_COLUMNS} FROM ledger_records WHERE seq > ? ORDER BY seq LIMIT ?", (sealed_upto, limit or -1)
+        ).fetchall()
+        if not rows:
+            return None
+        leaves = [(row[0], leaf_hash(_record(row[1:]))) for row in rows]
+        block = {
+            "height": height,
+            "prev_hash": head,
+            "merkle_root": merkle_root([leaf for _, leaf in leaves]).hex(),
+            "count": len(rows),
+            "sealed_at": datetime.utcnow().isoformat() + "Z",
+            "first_seq": rows[0][0],
+            "last_seq": rows[-1][0],
+        }
+        block["block_hash"] = block_hash(block)
+        conn.execute(
+            f"INSERT INTO ledger_blocks ({_BLOCK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [block[k] for k in _BLOCK_COLUMNS.split(", ")],
+        )
+        return block
+
+    def seal(self) -> Optional[Dict[str, Any]]:
+        """Seal all pending records into a block now. Returns the block, if any."""
+        return self._write(self._seal)
+
+    def _leaves(self, conn: sqlite3.Connection, ledger_id: int, block: Dict[str, Any]) -> List[Tuple[int, bytes]]:
+        key = (ledger_id, block["height"])
+        with self._lock:
+            cached = self._leaf_cache.get(key)
+            if cached is not None:
+                self._leaf_cache.move_to_end(key)
+                return cached
+        rows = conn.execute(
+            f"SELECT seq, {_COLUMNS} FROM ledger_records WHERE seq BETWEEN ? AND ? ORDER BY seq",
+            (block["first_seq"], block["last_seq"]),
+        )
+        leaves = [(row[0], leaf_hash(_record(row[1:]))) for row in rows]
+        with self._lock:
+            self._leaf_cache[key] = leaves
+            while len(self._leaf_cache) > LEAF_CACHE_SIZE:
+                self._leaf_cache.popitem(last=False)
+        return leaves
+
+    def inclusion_proof(self, h: str) -> Optional[Dict[str, Any]]:
+        """
+        Merkle inclusion proof for the record with hash `h`, or None if the
+        hash is not in the ledger. A pending record gets a pending proof (see
+        `merkle.make_proof`); nothing is sealed here.
+        """
+        conn = self._conn()
+        # One read transaction, so the head block and the pending rows agree
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(f"SELECT seq, {_COLUMNS} FROM ledger_records WHERE hash = ?", (h,)).fetchone()
+            if row is None:
+                return None
+            seq, record = row[0], _record(row[1:])
+            found = conn.execute(
+                f"SELECT {_BLOCK_COLUMNS} FROM ledger_blocks WHERE last_seq >= ? ORDER BY last_seq LIMIT 1", (seq,)
+            ).fetchone()
+            if found is None:
+                height, sealed_upto, head = self._head(conn)
+                block = {"height": height, "prev_hash": head}
+                rows = conn.execute(f"SELECT seq, {_COLUMNS} FROM ledger_records WHERE seq > ? ORDER BY seq", (sealed_upto,))
+                leaves = [(row[0], leaf_hash(_record(row[1:]))) for row in rows]
+            else:
+                block = _block(found)
+                ledger_id = conn.execute("SELECT value FROM ledger_meta WHERE key = 'id'").fetchone()[0]
+                leaves = self._leaves(conn, ledger_id, block)
+        finally:
+            conn.execute("COMMIT")
+        return make_proof(record, [leaf for _, leaf in leaves], [s for s, _ in leaves].index(seq), block)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def clear(self) -> None:
+        def wipe(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM ledger_records")
+            conn.execute("DELETE FROM ledger_blocks")
+            # A new identity, so results cached against the old ledger are dropped
+            conn.execute("UPDATE ledger_meta SET value = ? WHERE key = 'id'", (random.getrandbits(62),))
+
+        self._write(wipe)
+        with self._lock:
+            self._leaf_cache.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+            self._leaf_cache.clear()
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,160 @@
+"""
+Group commit for ledger appends.
+
+Concurrent `append` calls are queued and flushed together: whichever caller
+finds no flush in progress becomes the leader, takes up to `max_batch`
+queued entries and writes them through a single `append_many` (one write
+plus one fsync for the file backend). Callers that arrive while a flush is
+running simply wait and are picked up by the next batch. No background
+thread is involved.
+
+When other submitters are already queued the leader lingers for up to
+`max_linger` seconds to let the batch fill, giving up early once arrivals
+stop; a lone submitter never waits.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .base import LedgerBackend
+
+Entry = Tuple[str, Dict[str, Any]]
+
+# The linger window is split into this many quiet-period checks
+LINGER_POLLS = 8
+
+
+class _Request:
+    __slots__ = ("entries", "records", "error", "done")
+
+    def __init__(self, entries: Sequence[Entry]):
+        self.entries = entries
+        self.records: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+
+
+class GroupCommitLedger(LedgerBackend):
+    """Wraps a backend so that concurrent appends share writes and fsyncs."""
+
+    def __init__(self, backend: LedgerBackend, max_batch: int = 256, max_linger: float = 0.002):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_linger = max_linger
+        self._cond = threading.Condition()
+        self._queue: Deque[_Request] = deque()
+        self._queued_entries = 0
+        self._flushing = False
+        self.batches = 0
+        self.batched_entries = 0
+
+    def append_many(self, entries: Sequence[Entry]) -> List[Dict[str, Any]]:
+        if not entries:
+            return []
+        request = _Request(list(entries))
+        with self._cond:
+            self._queue.append(request)
+            self._queued_entries += len(request.entries)
+            self._cond.notify_all()
+            while not request.done:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._lead()
+        if request.error is not None:
+            raise request.error
+        return request.records
+
+    def _lead(self) -> None:
+        """Flush one batch. Called with the condition held; returns with it held."""
+        self._flushing = True
+        try:
+            if len(self._queue) > 1 and self.max_linger > 0:
+                # Keep waiting while submissions are still arriving, but stop as
+                # soon as the queue goes quiet for a short interval.
+                deadline = time.monotonic() + self.max_linger
+                quiet = self.max_linger / LINGER_POLLS
+                while self._queued_entries < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    queued = self._queued_entries
+                    self._cond.wait(min(remaining, quiet))
+                    if self._queued_entries == queued:
+                        break
+
+            batch: List[_Request] = []
+            size = 0
+            while self._queue and (not batch or size + len(self._queue[0].entries) <= self.max_batch):
+                request = self._queue.popleft()
+                batch.append(request)
+                size += len(request.entries)
+            self._queued_entries -= size
+
+            self._cond.release()
+            try:
+                self._write(batch, size)
+            finally:
+                self._cond.acquire()
+                for request in batch:
+                    request.done = True
+        finally:
+            self._flushing = False
+            self._cond.notify_all()
+
+    def _write(self, batch: List[_Request], size: int) -> None:
+        entries = [entry for request in batch for entry in request.entries]
+        try:
+            records = self.backend.append_many(entries)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = e
+            else:
+                # One caller's bad entry must not fail the others that shared
+                # the write: retry each request alone, so only it sees the error
+                for request in batch:
+                    try:
+                        request.records = self.backend.append_many(request.entries)
+                    except Exception as retry_error:
+                        request.error = retry_error
+        except BaseException as e:
+            for request in batch:
+                request.error = e
+        else:
+            pos = 0
+            for request in batch:
+                request.records = records[pos : pos + len(request.entries)]
+                pos += len(request.entries)
+        self.batches += 1
+        self.batched_entries += size
+
+    def find(self, h: str) -> Optional[Dict[str, Any]]:
+        return self.backend.find(h)
+
+    def find_many(self, hashes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        return self.backend.find_many(hashes)
+
+    def version(self) -> Optional[Tuple[int, int]]:
+        return self.backend.version()
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        return self.backend.iter_records()
+
+    def inclusion_proof(self, h: str) -> Optional[Dict[str, Any]]:
+        return self.backend.inclusion_proof(h)
+
+    def clear(self) -> None:
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            self.backend.clear()
+
+    def close(self) -> None:
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            self.backend.close()
@@ -0,0 +1,390 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+* `Histogram`: fixed, roughly logarithmic buckets (no per-sample storage),
+  one series per label value, with p50/p95/p99 estimated from the buckets.
+* `Counter`: monotonically increasing totals per label value.
+* Gauges are collected on demand from callbacks (`register_collector`), so
+  values such as DB pool usage are read only when `/metrics` is scraped.
+
+Hot paths are timed per stage with `timed("stage")` (decorator or context
+manager) into the `zra_stage_seconds` histogram; SQL statements are timed
+by `instrument_engine` from SQLAlchemy cursor events; HTTP requests by
+`RequestMetricsMiddleware`. `configure(enabled=False)` turns stage timing
+into a pass-through.
+"""
+
+import bisect
+import functools
+import random
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds: 50 µs .. 10 s
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Upper bounds in bytes for response sizes
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)  # last slot: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Bucketed distribution of observations, per label value."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _HistogramSeries(len(self.buckets))
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """Estimate the `q` quantile by linear interpolation inside its bucket."""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None or not series.count:
+                return None
+            counts = list(series.counts)
+            total = series.count
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # beyond the last bound: report the bound
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """`{label value(s): {count, sum, p50, p95, p99}}` for every series."""
+        with self._lock:
+            keys = [(labels, series.count, series.sum) for labels, series in self._series.items()]
+        out = {}
+        for labels, count, total in keys:
+            entry = {"count": count, "sum": total}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = self.quantile(q, *labels)
+            out[",".join(labels)] = entry
+        return out
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s.counts), s.sum, s.count) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic total per label value."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_format_value(float(value))}")
+        return lines
+
+
+# A collector returns gauge samples: (metric name, help, {label: value}, value)
+GaugeSample = Tuple[str, str, Dict[str, str], float]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[GaugeSample]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help, labelnames, buckets)
+            return self._metrics[name]
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help, labelnames)
+            return self._metrics[name]
+
+    def register_collector(self, collector: Callable[[], Iterable[GaugeSample]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+
+        gauges: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue  # a broken collector must not take /metrics down
+            for name, help, labels, value in samples:
+                gauges.setdefault(name, (help, []))[1].append((labels, value))
+        for name, (help, samples) in gauges.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_format_value(float(value))}")
+
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                lines.extend(_quantile_lines(metric))
+        return "\n".join(lines) + "\n"
+
+
+def _quantile_lines(histogram: Histogram) -> List[str]:
+    name = f"{histogram.name}_quantile"
+    lines = [f"# HELP {name} Bucket-estimated quantiles of {histogram.name}", f"# TYPE {name} gauge"]
+    with histogram._lock:
+        keys = sorted(histogram._series)
+    for labels in keys:
+        for q in QUANTILES:
+            value = histogram.quantile(q, *labels)
+            if value is not None:
+                extra = f'quantile="{q}"'
+                lines.append(f"{name}{_labels(histogram.labelnames, labels, extra)} {_format_value(value)}")
+    return lines
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("zra_stage_seconds", "Time spent in instrumented code paths", ["stage"])
+STAGE_ERRORS = REGISTRY.counter("zra_stage_errors_total", "Instrumented calls that raised", ["stage"])
+DB_QUERY_SECONDS = REGISTRY.histogram("zra_db_query_seconds", "SQL statement execution time", ["engine", "operation"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "zra_http_request_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+RESPONSE_BYTES = REGISTRY.histogram(
+    "zra_http_response_bytes", "HTTP response body size by route", ["method", "route"], buckets=SIZE_BUCKETS
+)
+
+_enabled = True
+
+
+def configure(enabled: bool = True) -> None:
+    """Turn stage timing on or off (HTTP sampling is set on the middleware)."""
+    global _enabled
+    _enabled = enabled
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(1, self.stage)
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def timer(stage: str):
+    """Context manager timing its block into `zra_stage_seconds{stage=...}`."""
+    return _Timer(stage) if _enabled else _NOOP
+
+
+def timed(stage: str):
+    """Decorator form of `timer` for sync functions."""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                STAGE_ERRORS.inc(1, stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+        return wrapper
+
+    return decorate
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Time every statement run on `engine` (sync, or the `sync_engine` of an async one)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _enabled:
+            conn.info.setdefault("zra_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("zra_query_start")
+        if starts:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            DB_QUERY_SECONDS.observe(time.perf_counter() - starts.pop(), name, operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("zra_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+def pool_collector(name: str, engine_getter: Callable[[], Any]) -> Callable[[], Iterable[GaugeSample]]:
+    """Gauges for a SQLAlchemy QueuePool (size, checked out, overflow, idle)."""
+
+    def collect():
+        engine = engine_getter()
+        if engine is None:
+            return
+        pool = getattr(engine, "sync_engine", engine).pool
+        for stat, help in (
+            ("size", "Configured pool size"),
+            ("checkedout", "Connections currently in use"),
+            ("overflow", "Connections opened beyond the pool size"),
+            ("checkedin", "Idle connections in the pool"),
+        ):
+            method = getattr(pool, stat, None)
+            if method is not None:
+                yield f"zra_db_pool_{stat}", help, {"engine": name}, method()
+
+    return collect
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording latency and response size per route template
+    (`/invoices/{invoice_id}`, not the concrete path). A `sample_rate` below
+    1 records that fraction of requests; at 0 requests pass straight through.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.exclude = frozenset(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self.sample_rate <= 0
+            or (self.sample_rate < 1 and random.random() >= self.sample_rate)
+            or scope["path"] in self.exclude
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method, path, str(state["status"]))
+            RESPONSE_BYTES.observe(state["bytes"], method, path)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def register_collector(collector: Callable[[], Iterable[GaugeSample]]) -> None:
+    REGISTRY.register_collector(collector)
+
+
+def stage_summary() -> Dict[str, Dict[str, float]]:
+    """Per-stage count, total and p50/p95/p99 seconds, for `GET /stats`."""
+    return STAGE_SECONDS.summary()
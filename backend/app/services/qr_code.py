@@ -6,29 +6,47 @@ import qrcode
 import qrcode.image.svg
 from io import BytesIO
 import base64
+import hashlib
 import json
-from typing import Dict, Any
+import struct
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
 
+from app.services import metrics
+from app.services.cache import LRUCache
 
-def generate_qr_code(data, format: str = "png") -> str:
-    """
-    Generate a QR code from invoice data.
-    
-    Args:
-        data: Dictionary or string containing invoice data
-        format: Output format - 'png' or 'svg'
-    
-    Returns:
-        Base64 encoded QR code image
-    """
+# Rendered images keyed by (format, payload), bounded by count and total size
+_image_cache = LRUCache(max_entries=1024, max_bytes=16 * 1024 * 1024, sizeof=len)
+# Encoded QR symbols keyed by payload; PNG and SVG renders share one encode
+_matrix_cache = LRUCache(max_entries=1024)
+
+
+def configure_cache(max_entries: int, max_bytes: Optional[int], matrix_entries: Optional[int] = None) -> None:
+    """Resize the image and matrix caches (0 entries disables caching)."""
+    _image_cache.resize(max_entries, max_bytes)
+    _matrix_cache.resize(max_entries if matrix_entries is None else matrix_entries)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {"images": _image_cache.stats(), "matrices": _matrix_cache.stats()}
+
+
+def clear_cache() -> None:
+    _image_cache.clear()
+    _matrix_cache.clear()
+
+
+def _payload(data) -> str:
     # Handle both dict and string inputs
     if isinstance(data, dict):
-        qr_data = json.dumps(data, sort_keys=True)
+        return json.dumps(data, sort_keys=True)
     elif isinstance(data, str):
-        qr_data = data
-    else:
-        raise ValueError("Data must be a dictionary or string")
-    
+        return data
+    raise ValueError("Data must be a dictionary or string")
+
+
+def _encode(qr_data: str) -> qrcode.QRCode:
+    """Build the QR symbol (module matrix) for a payload."""
     # Create QR code instance
     qr = qrcode.QRCode(
         version=1,
@@ -41,22 +59,115 @@ def generate_qr_code(data, format: str = "png") -> str:
     # Add data
     qr.add_data(qr_data)
     qr.make(fit=True)
-    
+    return qr
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def render_png(qr: qrcode.QRCode) -> bytes:
+    """
+    Rasterize a QR symbol straight to a 1-bit grayscale PNG.
+
+    Pixel-identical to `qr.make_image(fill_color="black", back_color="white")`
+    saved through PIL, without drawing every module as a rectangle: each
+    distinct module row is packed into one scanline (a filter byte followed
+    by 1 bit per pixel, white = 1) and repeated `box_size` times, and the
+    whole image is deflated once.
+    """
+    box, border = qr.box_size, qr.border
+    size = (qr.modules_count + 2 * border) * box
+    pad = "0" * (-size % 8)
+    light, dark = "1" * box, "0" * box
+
+    def scanlines(bits: str) -> bytes:
+        line = b"\x00" + int(bits + pad, 2).to_bytes((size + len(pad)) // 8, "big")
+        return line * box
+
+    quiet = scanlines(light * (size // box))
+    edge = light * border
+    rows: List[bytes] = [quiet] * border
+    seen: Dict[tuple, bytes] = {}
+    for modules in qr.modules:
+        key = tuple(modules)
+        lines = seen.get(key)
+        if lines is None:
+            lines = seen[key] = scanlines(edge + "".join(dark if m else light for m in modules) + edge)
+        rows.append(lines)
+    rows.extend([quiet] * border)
+
+    header = struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)  # 1-bit grayscale
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+# Bump when rendering changes, so image ETags change with it
+RENDER_VERSION = "2"
+
+
+@metrics.timed("qr_render")
+def _render(qr: qrcode.QRCode, format: str) -> bytes:
     if format == "svg":
         # Generate SVG
         factory = qrcode.image.svg.SvgPathImage
         img = qr.make_image(image_factory=factory)
         buffer = BytesIO()
         img.save(buffer)
-        svg_data = buffer.getvalue().decode('utf-8')
-        return f"data:image/svg+xml;base64,{base64.b64encode(svg_data.encode()).decode()}"
-    else:
-        # Generate PNG (default)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        return f"data:image/png;base64,{img_str}"
+        return buffer.getvalue()
+    # Generate PNG (default)
+    return render_png(qr)
+
+
+def render_qr_image(data, format: str = "png") -> Tuple[bytes, str]:
+    """
+    Render a QR code to raw image bytes.
+    
+    Renders are cached by payload and format, so repeated calls for the same
+    invoice return the stored image.
+    
+    Returns:
+        (image bytes, media type)
+    """
+    qr_data = _payload(data)
+    format = "svg" if format == "svg" else "png"
+
+    def render() -> bytes:
+        qr = _matrix_cache.get_or_create(qr_data, lambda: _encode(qr_data))
+        return _render(qr, format)
+
+    return _image_cache.get_or_create((format, qr_data), render), MEDIA_TYPES[format]
+
+
+def qr_etag(data, format: str = "png") -> str:
+    """Strong ETag for `render_qr_image(data, format)`, computed without rendering."""
+    format = "svg" if format == "svg" else "png"
+    digest = hashlib.sha256(f"{RENDER_VERSION}:{format}:{_payload(data)}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+@metrics.timed("generate_qr_code")
+def generate_qr_code(data, format: str = "png") -> str:
+    """
+    Generate a QR code from invoice data.
+    
+    Args:
+        data: Dictionary or string containing invoice data
+        format: Output format - 'png' or 'svg'
+    
+    Returns:
+        Base64 encoded QR code image
+    """
+    image, media_type = render_qr_image(data, format)
+    return f"data:{media_type};base64,{base64.b64encode(image).decode()}"
 
 
 def parse_qr_data(qr_string: str) -> Dict[str, Any]:
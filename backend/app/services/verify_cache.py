@@ -0,0 +1,193 @@
+"""
+Cache of invoice verification outcomes, keyed by invoice id.
+
+Verifying an invoice means loading it, looking its hash up on the ledger and
+comparing transaction references; the answer only changes when the invoice
+(cancellation, anchoring) or the ledger changes. An entry records the
+invoice as served, whether its hash is on the ledger, whether the tx_ref
+matches, and the ledger version it was computed at:
+
+* `crud.cancel_invoice` and the anchoring worker call `invalidate` for the
+  invoices they change. That leaves a tombstone with the time, and `store`
+  refuses to overwrite a tombstone newer than the moment the caller
+  started loading the invoice, so a verify that read the invoice before
+  the change cannot cache the old outcome after it;
+* a ledger change is detected at lookup time, against the version the
+  caller read for the request: a verified entry stays good while the
+  ledger is the same ledger (records are never removed), any other entry
+  only while the ledger has not grown since;
+* `blockchain.clear_ledger` drops everything.
+
+The store is an in-process `LRUCache` by default, or a `SQLiteCache` shared
+by all worker processes (`VERIFY_CACHE_BACKEND=shared`) so that one worker's
+invalidation is seen by the others. Calls to a shared store may wait on
+another process's write, so async callers make them from a worker thread
+(see `VerificationCache.shared`).
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from uuid import UUID
+
+from app import schemas
+from app.services.cache import LRUCache, SQLiteCache
+
+Backend = Union[LRUCache, SQLiteCache]
+
+
+def make_entry(invoice: Any, record: Optional[Dict[str, Any]], version=None) -> Dict[str, Any]:
+    """
+    Verification outcome of `invoice` given its ledger `record` (or None).
+    `version` is the ledger version read before the record was looked up.
+    """
+    return {
+        "invoice": schemas.InvoiceRead.model_validate(invoice).model_dump(mode="json"),
+        "hash": invoice.blockchain_hash,
+        "on_ledger": record is not None,
+        "tx_ref_ok": record is not None and record.get("tx_ref") == invoice.blockchain_tx_ref,
+        "ledger": list(version) if version is not None else None,
+    }
+
+
+class VerificationCache:
+    """Verification outcomes by invoice id, with hit and latency accounting."""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        # Whether calls can block on other processes (and so belong off the event loop)
+        self.shared = isinstance(backend, SQLiteCache)
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0, "hit_seconds": 0.0, "miss_seconds": 0.0}
+
+    def lookup(self, invoice_id: UUID, current=None) -> Optional[Dict[str, Any]]:
+        """
+        The cached entry for `invoice_id`, or None when absent or stale
+        against `current`, the ledger version now (None: unknown, so stale).
+        """
+        entry = self.backend.get(str(invoice_id))
+        if entry is None or "invalidated" in entry:
+            return None
+        stored = entry["ledger"]
+        if current is None or stored is None:
+            fresh = False
+        elif entry["on_ledger"] and entry["tx_ref_ok"]:
+            fresh = stored[0] == current[0]
+        else:
+            fresh = tuple(stored) == tuple(current)
+        if not fresh:
+            self.backend.pop(str(invoice_id))
+            self._count(stale=1)
+            return None
+        return entry
+
+    def lookup_many(self, invoice_ids: Sequence[UUID], current=None) -> Dict[UUID, Dict[str, Any]]:
+        """`lookup` for each of `invoice_ids`; absent and stale ones are left out."""
+        entries = {}
+        for invoice_id in invoice_ids:
+            entry = self.lookup(invoice_id, current)
+            if entry is not None:
+                entries[invoice_id] = entry
+        return entries
+
+    def store(
+        self, invoice: Any, record: Optional[Dict[str, Any]], version=None, since: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Build the entry for `invoice` with `make_entry` and cache it, unless
+        the invoice was invalidated at or after `since` (the `time.time()`
+        taken before it was loaded; None: after any invalidation).
+        """
+        entry = make_entry(invoice, record, version)
+        if version is not None:
+            def changed(current: Dict[str, Any]) -> bool:
+                return "invalidated" in current and (since is None or current["invalidated"] >= since)
+
+            self.backend.put_unless(str(invoice.id), entry, changed)
+        return entry
+
+    def store_many(
+        self, outcomes: Sequence[Tuple[Any, Optional[Dict[str, Any]]]], version=None, since: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """`store` for each `(invoice, record)`; returns the entries in order."""
+        return [self.store(invoice, record, version, since) for invoice, record in outcomes]
+
+    def invalidate(self, *invoice_ids: UUID) -> None:
+        tombstone = {"invalidated": time.time()}
+        for invoice_id in invoice_ids:
+            self.backend.put(str(invoice_id), tombstone)
+        self._count(invalidations=len(invoice_ids))
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def record(self, hit: bool, seconds: float, items: int = 1) -> None:
+        """Account `items` lookups that took `seconds` in total."""
+        if hit:
+            self._count(hits=items, hit_seconds=seconds)
+        else:
+            self._count(misses=items, miss_seconds=seconds)
+
+    def _count(self, **increments) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        hits, misses = stats["hits"], stats["misses"]
+        hit_ms = stats.pop("hit_seconds") * 1000 / hits if hits else 0.0
+        miss_ms = stats.pop("miss_seconds") * 1000 / misses if misses else 0.0
+        stats["hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+        stats["avg_hit_ms"] = round(hit_ms, 3)
+        stats["avg_miss_ms"] = round(miss_ms, 3)
+        # Time the hits would have cost had they been computed
+        stats["saved_ms"] = round(hits * max(miss_ms - hit_ms, 0.0), 1) if misses else 0.0
+        stats["backend"] = self.backend.stats()
+        return stats
+
+
+def make_backend(kind: str, max_entries: int, path: str, ttl: float) -> Optional[Backend]:
+    """`memory` (in-process LRU), `shared` (SQLite file) or `off`."""
+    if kind == "memory":
+        return LRUCache(max_entries=max_entries)
+    if kind == "shared":
+        return SQLiteCache(path, ttl=ttl, max_entries=max_entries)
+    if kind == "off":
+        return None
+    raise ValueError(f"Unknown verification cache backend: {kind!r}")
+
+
+_cache: Optional[VerificationCache] = None
+
+
+def configure(cache: Optional[VerificationCache]) -> None:
+    """Install the process-wide cache used by the module-level helpers."""
+    global _cache
+    _cache = cache
+
+
+def get() -> Optional[VerificationCache]:
+    return _cache
+
+
+def invalidate(*invoice_ids: UUID) -> None:
+    if _cache is not None:
+        _cache.invalidate(*invoice_ids)
+
+
+async def invalidate_async(*invoice_ids: UUID) -> None:
+    """`invalidate` for async callers; a shared store is written from a worker thread."""
+    if _cache is None:
+        return
+    if _cache.shared:
+        await asyncio.to_thread(_cache.invalidate, *invoice_ids)
+    else:
+        _cache.invalidate(*invoice_ids)
+
+
+def clear() -> None:
+    if _cache is not None:
+        _cache.clear()
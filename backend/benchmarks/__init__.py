@@ -0,0 +1 @@
+# Performance benchmarks for the invoice service (run from the `backend` folder)
@@ -0,0 +1,84 @@
+"""
+Benchmark suite runner.
+
+    python -m benchmarks run                         # micro + load, report to stdout
+    python -m benchmarks run --quick --out base.json
+    python -m benchmarks run --suite load --database-url postgresql://... --out pg.json
+    python -m benchmarks compare base.json new.json --threshold 0.1
+
+`run` writes a JSON report (see `harness.new_report`); `compare` prints the
+change in every result and exits with status 1 if any got worse by more than
+the threshold. The single-topic scripts (`python -m benchmarks.bench_*`)
+are separate and print tables only.
+"""
+
+import argparse
+import contextlib
+import sys
+
+from . import harness
+
+SUITES = ("micro", "load")
+
+
+def _run(args) -> int:
+    harness.bootstrap()
+    report = harness.new_report({
+        "suites": args.suite, "quick": args.quick, "fsync": args.fsync,
+        "database": "postgres" if args.database_url else "sqlite",
+        "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed,
+    })
+    # The app prints its settings on import; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        from . import load, micro
+
+        if "micro" in args.suite:
+            print("running micro suite...")
+            report["results"].update(micro.run(quick=args.quick, fsync=args.fsync))
+        if "load" in args.suite:
+            print("running load suite...")
+            report["results"].update(load.run(
+                quick=args.quick, database_url=args.database_url, requests=args.requests,
+                concurrency=args.concurrency, seed=args.seed,
+            ))
+    harness.write_report(report, args.out)
+    return 0
+
+
+def _compare(args) -> int:
+    base, new = harness.load_report(args.base), harness.load_report(args.new)
+    lines, regressions = harness.compare(base, new, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run or compare benchmark reports")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run suites and write a JSON report")
+    run.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    run.add_argument("--quick", action="store_true", help="smaller ledgers and fewer requests")
+    run.add_argument("--out", default="-", help="report path (default stdout)")
+    run.add_argument("--fsync", action="store_true", help="fsync ledger appends in the micro suite")
+    run.add_argument("--database-url", help="Postgres URL for the load suite (default: SQLite stand-in)")
+    run.add_argument("--requests", type=int, help="requests in the load mix (default 10000, 1000 with --quick)")
+    run.add_argument("--concurrency", type=int, default=32)
+    run.add_argument("--seed", type=int, default=1)
+    run.set_defaults(func=_run)
+
+    compare = commands.add_parser("compare", help="diff two reports")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown as a fraction (default 0.1)")
+    compare.set_defaults(func=_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
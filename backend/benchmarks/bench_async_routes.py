@@ -0,0 +1,140 @@
+"""
+Concurrent GET /invoices/{id} and GET /invoices throughput: sync handlers on
+the threadpool vs the async-session routes.
+
+    python -m benchmarks.bench_async_routes
+    python -m benchmarks.bench_async_routes --concurrency 200 --requests 5000
+
+"sync" mounts the old-style `def` handlers (a `SessionLocal` session per
+request, run on Starlette's threadpool, so at most ~40 in flight); "async"
+drives the real app's routes on an `AsyncSession`. Requests go through
+httpx's in-process ASGI transport, so no sockets are involved.
+
+The numbers come from the SQLite stand-in over aiosqlite, which itself runs
+every query on a helper thread; against Postgres with asyncpg the async path
+avoids threads entirely and the gap at high concurrency is larger.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI, HTTPException  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import crud, schemas  # noqa: E402
+from app.auth import get_current_user_id  # noqa: E402
+from app.database import get_async_db, get_db  # noqa: E402
+from app.main import app as async_app  # noqa: E402
+from app.models import models  # noqa: E402
+from benchmarks.sqlite_compat import sqlite_async_sessionmaker, sqlite_engine, sqlite_sessionmaker  # noqa: E402
+
+from .bench_invoice_pages import USER, _fill  # noqa: E402
+
+
+def _sync_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/invoices/{invoice_id}", response_model=schemas.InvoiceRead)
+    def read_invoice(invoice_id: uuid.UUID, db=Depends(get_db)):
+        invoice = crud.get_invoice(db, invoice_id)
+        if invoice is None:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+        return invoice
+
+    @app.get("/invoices")
+    def list_invoices(limit: int = 100, db=Depends(get_db)):
+        return crud.list_user_invoices(db, USER, limit=limit)[0]
+
+    return app
+
+
+async def _drive(app: FastAPI, paths, concurrency: int):
+    latencies = []
+    queue = iter(paths)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker():
+            for path in queue:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        session_factory = sqlite_sessionmaker(url)
+        _fill(session_factory, args.rows)
+        with session_factory() as db:
+            ids = db.execute(select(models.Invoice.id).where(models.Invoice.user_id == USER).limit(1000)).scalars().all()
+
+        # A `get_db` session keeps its connection until the dependency's exit
+        # runs, which needs a threadpool thread of its own; with fewer
+        # connections than concurrent requests every thread ends up waiting on
+        # the pool and the sync app deadlocks. Give it one per request.
+        sync_engine = sqlite_engine(url, pool_size=args.concurrency, max_overflow=10)
+        sync_session_factory = sessionmaker(bind=sync_engine, autoflush=False)
+        async_session_factory = sqlite_async_sessionmaker(url, pool_size=20, max_overflow=20)
+
+        def get_test_db():
+            with sync_session_factory() as db:
+                yield db
+
+        async def get_test_async_db():
+            async with async_session_factory() as db:
+                yield db
+
+        sync_app = _sync_app()
+        for app in (sync_app, async_app):
+            app.dependency_overrides[get_db] = get_test_db
+            app.dependency_overrides[get_async_db] = get_test_async_db
+            app.dependency_overrides[get_current_user_id] = lambda: USER
+
+        workloads = {
+            "get by id": [f"/invoices/{ids[n % len(ids)]}" for n in range(args.requests)],
+            "list 20": ["/invoices?limit=20"] * args.requests,
+        }
+
+        async def run():
+            # One event loop throughout: pooled aiosqlite connections belong to it
+            print(f"{args.requests} requests, concurrency {args.concurrency}")
+            print(f"{'workload':>10} {'handler':>6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+            for name, paths in workloads.items():
+                for label, app in (("sync", sync_app), ("async", async_app)):
+                    await _drive(app, paths[:50], 10)  # warm pools and caches
+                    rate, p50, p99 = await _drive(app, paths, args.concurrency)
+                    print(f"{name:>10} {label:>6} {rate:>9.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f}")
+            await async_session_factory.kw["bind"].dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
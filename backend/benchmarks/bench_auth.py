@@ -0,0 +1,73 @@
+"""
+Per-request JWT authentication overhead, with and without the verified-token cache.
+
+    python -m benchmarks.bench_auth
+    python -m benchmarks.bench_auth --requests 20000 --tokens 100
+
+Signs ES256 tokens with a throwaway key, boots the JWKS cache from a local
+file (no network), then calls `verify_jwt_token` the way the auth dependency
+does. "uncached" clears the token cache before every call.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import jwt  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+
+from app import auth  # noqa: E402
+from app.services.jwks import JWKSCache  # noqa: E402
+
+
+def _setup(tmp: str, tokens: int):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid="bench", alg="ES256", use="sig")
+    path = os.path.join(tmp, "jwks.json")
+    with open(path, "w") as f:
+        json.dump({"keys": [jwk]}, f)
+    auth.jwks_cache = JWKSCache(local_path=path)
+    exp = int(time.time()) + 3600
+    return [
+        jwt.encode({"sub": f"user-{n}", "aud": "authenticated", "exp": exp}, private_key,
+                   algorithm="ES256", headers={"kid": "bench"})
+        for n in range(tokens)
+    ]
+
+
+def _run(tokens, requests: int, cached: bool) -> float:
+    auth.token_cache.clear()
+    start = time.perf_counter()
+    for i in range(requests):
+        if not cached:
+            auth.token_cache.clear()
+        auth.verify_jwt_token(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / requests
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--tokens", type=int, default=50, help="distinct clients (tokens) in rotation")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tokens = _setup(tmp, args.tokens)
+        uncached = _run(tokens, args.requests, cached=False)
+        cached = _run(tokens, args.requests, cached=True)
+
+    print(f"{'mode':>9} {'us/request':>11}")
+    print(f"{'uncached':>9} {uncached * 1e6:>11.1f}")
+    print(f"{'cached':>9} {cached * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
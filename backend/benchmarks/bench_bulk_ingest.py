@@ -0,0 +1,86 @@
+"""
+Invoice ingestion throughput: single-invoice path vs bulk path.
+
+    python -m benchmarks.bench_bulk_ingest
+    python -m benchmarks.bench_bulk_ingest --invoices 5000 --batch 1000 --no-fsync
+
+Runs against the local SQLite stand-in schema. "ingest" times the request
+work (validation, duplicate check, insert, outbox); "anchored" also includes
+draining the outbox onto the ledger.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+from app import crud, schemas  # noqa: E402
+from app.services import anchoring, blockchain, ledger  # noqa: E402
+from benchmarks.sqlite_compat import sqlite_sessionmaker  # noqa: E402
+
+
+def _invoices(n: int, seed: int):
+    return [
+        schemas.InvoiceCreate(
+            supplier_tpin=f"{1000000000 + seed:010d}", buyer_tpin=f"{2000000000 + i % 997:010d}", vat=16.0, amount=100.0 + i
+        )
+        for i in range(n)
+    ]
+
+
+def _drain(session_factory) -> None:
+    worker = anchoring.AnchorWorker(session_factory, batch_size=500)
+    while True:
+        with session_factory() as db:
+            if not worker.run_once(db):
+                return
+
+
+def _single(session_factory, invoices) -> float:
+    start = time.perf_counter()
+    with session_factory() as db:
+        for invoice in invoices:
+            crud.create_invoice(db, invoice, user_id="bench")
+    return time.perf_counter() - start
+
+
+def _bulk(session_factory, invoices, batch: int) -> float:
+    start = time.perf_counter()
+    with session_factory() as db:
+        for i in range(0, len(invoices), batch):
+            crud.create_invoices_bulk(db, invoices[i:i + batch], user_id="bench")
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args(argv)
+
+    print(f"{'path':>8} {'ingest/s':>10} {'anchored/s':>11}")
+    for seed, name in enumerate(("single", "bulk")):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger.configure(path=str(Path(tmp) / "ledger.json"), fsync=not args.no_fsync)
+            session_factory = sqlite_sessionmaker(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            invoices = _invoices(args.invoices, seed)
+            if name == "single":
+                ingest = _single(session_factory, invoices)
+            else:
+                ingest = _bulk(session_factory, invoices, args.batch)
+            start = time.perf_counter()
+            _drain(session_factory)
+            total = ingest + time.perf_counter() - start
+            blockchain.clear_ledger()
+        print(f"{name:>8} {args.invoices / ingest:>10.0f} {args.invoices / total:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Deep-page latency of GET /invoices: OFFSET paging vs keyset (cursor) paging.
+
+    python -m benchmarks.bench_invoice_pages
+    python -m benchmarks.bench_invoice_pages --rows 300000 --page 2000 --limit 100
+
+Fills the SQLite stand-in schema with one large account (plus other users'
+rows interleaved), then times fetching page `--page`: "offset" is the old
+OFFSET query (formerly `crud.get_user_invoices`) plus `InvoiceRead`
+serialization, "keyset" is
+`crud.list_user_invoices` from the cursor of the previous page, and
+"keyset+fields" also projects three columns.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import crud, schemas  # noqa: E402
+from app.models import models  # noqa: E402
+from benchmarks.sqlite_compat import sqlite_sessionmaker  # noqa: E402
+
+USER = "bench-user"
+
+
+def _fill(session_factory, rows: int) -> None:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with session_factory() as db:
+        for chunk in range(0, rows, 10_000):
+            batch = []
+            for n in range(chunk, min(rows, chunk + 10_000)):
+                batch.append({
+                    "id": uuid.uuid4(),
+                    "invoice_number": f"INV-ZRA-{n:08d}",
+                    "user_id": USER if n % 4 else f"other-{n % 97}",
+                    "supplier_tpin": "1234567890",
+                    "buyer_tpin": f"{n % 10_000_000_000:010d}",
+                    "vat": 16.0,
+                    "amount": float(n),
+                    "timestamp": start + timedelta(seconds=n // 3),  # ties on purpose
+                    "status": models.InvoiceStatus.PENDING,
+                })
+            db.execute(insert(models.Invoice), batch)
+        db.commit()
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        session_factory = sqlite_sessionmaker(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        _fill(session_factory, args.rows)
+        skip = (args.page - 1) * args.limit
+
+        with session_factory() as db:
+            # Cursor of the previous page: the row just before the requested page
+            before = crud.list_user_invoices(db, USER, limit=1, skip=skip - 1, fields=["id"])[1] if skip else None
+
+            def offset():
+                query = db.query(models.Invoice).filter(models.Invoice.user_id == USER)
+                rows = query.offset(skip).limit(args.limit).all()
+                return [schemas.InvoiceRead.model_validate(row).model_dump() for row in rows]
+
+            def keyset():
+                return crud.list_user_invoices(db, USER, limit=args.limit, cursor=before)
+
+            def keyset_fields():
+                return crud.list_user_invoices(db, USER, limit=args.limit, cursor=before, fields=["id", "amount", "status"])
+
+            print(f"page {args.page} of {args.limit} rows ({args.rows} invoices)")
+            print(f"{'method':>14} {'median ms':>10}")
+            for name, fn in (("offset", offset), ("keyset", keyset), ("keyset+fields", keyset_fields)):
+                fn()
+                print(f"{name:>14} {_time(fn, args.repeat) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
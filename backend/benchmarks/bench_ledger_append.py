@@ -0,0 +1,76 @@
+"""
+Ledger append throughput under concurrent writers.
+
+    python -m benchmarks.bench_ledger_append
+    python -m benchmarks.bench_ledger_append --writers 1,8,64,256 --seconds 3 --no-fsync
+
+Each writer thread calls `append` in a loop for a fixed time. "direct" writes
+every append on its own (one write + fsync each); "group" goes through the
+group-commit wrapper used by `submit_to_chain`.
+"""
+
+import argparse
+import hashlib
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.services.ledger import FileLedger, GroupCommitLedger
+
+
+def _run(ledger, writers: int, seconds: float) -> int:
+    counts = [0] * writers
+    stop = time.monotonic() + seconds
+    start = threading.Barrier(writers)
+
+    def writer(n: int) -> None:
+        start.wait()
+        i = 0
+        while time.monotonic() < stop:
+            h = hashlib.sha256(f"{n}:{i}".encode()).hexdigest()
+            ledger.append(h, {"writer": n})
+            i += 1
+        counts[n] = i
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", default="1,8,64,256")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-linger-ms", type=float, default=2.0)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args(argv)
+
+    print(f"{'writers':>8} {'direct/s':>10} {'group/s':>10} {'avg batch':>10}")
+    for writers in [int(w) for w in args.writers.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            direct = FileLedger(Path(tmp) / "direct.log", fsync=not args.no_fsync)
+            direct_total = _run(direct, writers, args.seconds)
+            direct.close()
+
+            group = GroupCommitLedger(
+                FileLedger(Path(tmp) / "group.log", fsync=not args.no_fsync),
+                max_batch=args.max_batch,
+                max_linger=args.max_linger_ms / 1000.0,
+            )
+            group_total = _run(group, writers, args.seconds)
+            avg_batch = group.batched_entries / max(group.batches, 1)
+            group.close()
+
+        print(
+            f"{writers:>8} {direct_total / args.seconds:>10.0f} "
+            f"{group_total / args.seconds:>10.0f} {avg_batch:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
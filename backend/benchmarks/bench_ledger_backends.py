@@ -0,0 +1,152 @@
+"""
+File ledger vs SQLite ledger on the same workload.
+
+    python -m benchmarks.bench_ledger_backends
+    python -m benchmarks.bench_ledger_backends --records 1000000 --fsync --dir /var/tmp
+
+For each backend a ledger of `--records` records is built with batched
+appends (`append_many` of 10k), then it reports:
+
+* bulk: records/s while building,
+* append: single appends/s from `--threads` threads through
+  `GroupCommitLedger`, as the app issues them,
+* hit/miss: `find` latency for random existing and absent hashes,
+* batch: one `find_many` of 1000 existing hashes,
+* bytes/rec: on-disk size per record, index and blocks included.
+
+Finally `--procs` separate processes verify random hashes against the
+SQLite database at once; the file ledger can only be shared that way
+through the ledger service (see `bench_ledger_service`).
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.services.ledger import FileLedger, GroupCommitLedger, SqliteLedger
+
+CHUNK = 10_000
+
+
+def _hash(i: int) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _open(backend: str, path: Path, fsync: bool):
+    if backend == "file":
+        return FileLedger(path, fsync=fsync, segment_size=64 * 1024 * 1024)
+    return SqliteLedger(path, fsync=fsync)
+
+
+def _disk_bytes(tmp: Path) -> int:
+    return sum(p.stat().st_size for p in tmp.rglob("*") if p.is_file())
+
+
+def _appends(ledger, threads: int, seconds: float) -> float:
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def run(t: int) -> None:
+        n = 0
+        while time.perf_counter() < deadline:
+            ledger.append(_hash(-(t * 10_000_000 + n) - 1), {"invoice_id": f"{t}-{n}"})
+            n += 1
+        counts[t] = n
+
+    workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / seconds
+
+
+def _latency(ledger, hashes, expect_hit: bool):
+    samples = []
+    for h in hashes:
+        t0 = time.perf_counter()
+        found = ledger.find(h)
+        samples.append(time.perf_counter() - t0)
+        assert (found is not None) == expect_hit
+    samples.sort()
+    return statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99) - 1] * 1e6
+
+
+def _reader(path: str, records: int, seconds: float, seed: int, results) -> None:
+    db = SqliteLedger(path, fsync=False)
+    rng = random.Random(seed)
+    db.find(_hash(0))  # connect before the clock starts
+    n, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        assert db.find(_hash(rng.randrange(records))) is not None
+        n += 1
+    results.put(n)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--procs", default="1,2,4")
+    parser.add_argument("--fsync", action="store_true", help="fsync every commit (LEDGER_FSYNC=true)")
+    parser.add_argument("--dir", default=None, help="directory for the ledger files (default: a temp dir)")
+    args = parser.parse_args(argv)
+    rng = random.Random(42)
+
+    print(f"{args.records} records, fsync {'on' if args.fsync else 'off'}")
+    print(
+        f"{'backend':>8} {'bulk/s':>9} {'append/s':>9} {'hit p50 us':>11} {'hit p99 us':>11} "
+        f"{'miss p50 us':>12} {'batch ms':>9} {'bytes/rec':>10}"
+    )
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for backend in ("file", "sqlite"):
+            root = Path(tmp) / backend
+            root.mkdir()
+            path = root / ("ledger.log" if backend == "file" else "ledger.db")
+            ledger = _open(backend, path, args.fsync)
+            start = time.perf_counter()
+            for lo in range(0, args.records, CHUNK):
+                ledger.append_many([(_hash(i), {"invoice_id": str(i)}) for i in range(lo, min(lo + CHUNK, args.records))])
+            bulk = args.records / (time.perf_counter() - start)
+            size = _disk_bytes(root) / args.records
+
+            hits = [_hash(rng.randrange(args.records)) for _ in range(args.lookups)]
+            misses = [_hash(args.records + 1_000_000 + i) for i in range(args.lookups)]
+            hit50, hit99 = _latency(ledger, hits, True)
+            miss50, _ = _latency(ledger, misses, False)
+            t0 = time.perf_counter()
+            assert len(ledger.find_many(hits[:1000])) == len(set(hits[:1000]))
+            batch = (time.perf_counter() - t0) * 1e3
+
+            grouped = GroupCommitLedger(ledger)
+            append = _appends(grouped, args.threads, args.seconds)
+            grouped.close()
+            print(
+                f"{backend:>8} {bulk:>9.0f} {append:>9.0f} {hit50:>11.1f} {hit99:>11.1f} "
+                f"{miss50:>12.1f} {batch:>9.2f} {size:>10.1f}"
+            )
+
+        path = str(Path(tmp) / "sqlite" / "ledger.db")
+        ctx = multiprocessing.get_context("spawn")
+        print(f"\n{'procs':>8} {'sqlite verify/s':>16}")
+        for procs in (int(p) for p in args.procs.split(",")):
+            results = ctx.Queue()
+            workers = [ctx.Process(target=_reader, args=(path, args.records, args.seconds, p, results)) for p in range(procs)]
+            for w in workers:
+                w.start()
+            total = sum(results.get() for _ in workers)
+            for w in workers:
+                w.join()
+            print(f"{procs:>8} {total / args.seconds:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Ledger lookup latency as the ledger grows.
+
+    python -m benchmarks.bench_ledger_lookup
+    python -m benchmarks.bench_ledger_lookup --sizes 1000,10000,100000,1000000,10000000
+
+One ledger is grown to each size in turn and `verify_hash` is timed for
+random existing hashes (hits) and absent hashes (misses). With the hash
+index the per-lookup cost should stay flat as the ledger grows.
+"""
+
+import argparse
+import hashlib
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.ledger import FileLedger
+
+CHUNK = 10_000
+
+
+def _hash(i: int) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _grow(ledger: FileLedger, start: int, stop: int) -> None:
+    for lo in range(start, stop, CHUNK):
+        hi = min(lo + CHUNK, stop)
+        ledger.append_many([(_hash(i), {"invoice_id": str(i)}) for i in range(lo, hi)])
+
+
+def _time_lookups(ledger: FileLedger, hashes, expect_hit: bool):
+    samples = []
+    for h in hashes:
+        t0 = time.perf_counter()
+        found = ledger.find(h)
+        samples.append(time.perf_counter() - t0)
+        assert (found is not None) == expect_hit
+    samples.sort()
+    return statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99) - 1] * 1e6
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--dir", default=None, help="directory for the ledger files (default: a temp dir)")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        ledger = FileLedger(Path(tmp) / "ledger.log", fsync=False)
+        rng = random.Random(42)
+        current = 0
+        print(f"{'records':>10} {'hit p50 us':>11} {'hit p99 us':>11} {'miss p50 us':>12} {'miss p99 us':>12}")
+        for size in sizes:
+            _grow(ledger, current, size)
+            current = size
+            hits = [_hash(rng.randrange(size)) for _ in range(args.lookups)]
+            misses = [_hash(-1 - i) for i in range(args.lookups)]
+            hit_p50, hit_p99 = _time_lookups(ledger, hits, True)
+            miss_p50, miss_p99 = _time_lookups(ledger, misses, False)
+            print(f"{size:>10} {hit_p50:>11.1f} {hit_p99:>11.1f} {miss_p50:>12.1f} {miss_p99:>12.1f}")
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Aggregate verify and append throughput through the ledger service with 1 to
+16 worker processes.
+
+    python -m benchmarks.bench_ledger_service
+    python -m benchmarks.bench_ledger_service --workers 1,4,16 --threads 8 --seconds 5 --fsync
+
+The service runs as its own process (`python -m app.services.ledger.server`)
+on a temporary ledger prefilled with `--records` records. Each worker is a
+separate process with one `LedgerClient` shared by `--threads` threads, like
+a uvicorn worker serving concurrent requests; verifies look up random
+existing hashes, appends write new ones. After the append runs every
+appended hash is looked up again, so lost records would fail the run. An
+in-process `GroupCommitLedger` with the same thread count is shown for
+reference; it is what a single worker used before and cannot be shared
+between processes.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .harness import bootstrap
+
+CHUNK = 10_000
+
+
+def _hash(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _load(backend, op: str, seconds: float, threads: int, records: int, tag: str) -> int:
+    import random
+
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def run(t: int) -> None:
+        rng = random.Random(f"{tag}-{t}")
+        n = 0
+        while time.perf_counter() < deadline:
+            if op == "verify":
+                assert backend.find(_hash(str(rng.randrange(records)))) is not None
+            else:
+                backend.append(_hash(f"{tag}-{t}-{n}"), {"invoice_id": tag})
+            n += 1
+        counts[t] = n
+
+    workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return counts
+
+
+def _worker(socket_path: str, op: str, seconds: float, threads: int, records: int, tag: str, results) -> None:
+    from app.services.ledger import LedgerClient
+
+    client = LedgerClient(socket_path)
+    client.version()  # connect before the clock starts
+    results.put((tag, _load(client, op, seconds, threads, records, tag)))
+    client.close()
+
+
+def _run_workers(socket_path: str, op: str, workers: int, args, round_id: int) -> float:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(socket_path, op, args.seconds, args.threads, args.records, f"r{round_id}w{w}", results))
+        for w in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    counts = dict(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    if op == "append":
+        _check_appends(socket_path, counts)
+    return sum(sum(c) for c in counts.values()) / args.seconds
+
+
+def _check_appends(socket_path: str, counts) -> None:
+    from app.services.ledger import LedgerClient
+
+    client = LedgerClient(socket_path)
+    hashes = [_hash(f"{tag}-{t}-{n}") for tag, per_thread in counts.items() for t, c in enumerate(per_thread) for n in range(c)]
+    for lo in range(0, len(hashes), CHUNK):
+        chunk = hashes[lo : lo + CHUNK]
+        assert len(client.find_many(chunk)) == len(chunk), "appended records are missing"
+    client.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8,16")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker process")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--records", type=int, default=100_000, help="records in the ledger before the runs")
+    parser.add_argument("--fsync", action="store_true", help="fsync every write (LEDGER_FSYNC=true)")
+    args = parser.parse_args(argv)
+    bootstrap()
+
+    from app.services.ledger import FileLedger, GroupCommitLedger, LedgerClient
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, socket_path = Path(tmp) / "ledger.log", str(Path(tmp) / "ledger.sock")
+        seed = FileLedger(path, fsync=False)
+        for lo in range(0, args.records, CHUNK):
+            seed.append_many([(_hash(str(i)), {"invoice_id": str(i)}) for i in range(lo, min(lo + CHUNK, args.records))])
+        seed.close()
+
+        print(f"{args.records} records, {args.threads} threads per worker, fsync {'on' if args.fsync else 'off'}")
+        print(f"{'workers':>16} {'verify/s':>10} {'append/s':>10}")
+        local = GroupCommitLedger(FileLedger(path, fsync=args.fsync))
+        verify = sum(_load(local, "verify", args.seconds, args.threads, args.records, "local")) / args.seconds
+        append = sum(_load(local, "append", args.seconds, args.threads, args.records, "local")) / args.seconds
+        local.close()
+        print(f"{'1 (in-process)':>16} {verify:>10.0f} {append:>10.0f}")
+
+        env = dict(os.environ, LEDGER_FSYNC="true" if args.fsync else "false")
+        service = subprocess.Popen(
+            [sys.executable, "-m", "app.services.ledger.server", "--socket", socket_path, "--path", str(path)],
+            env=env, stderr=subprocess.DEVNULL,
+        )
+        try:
+            LedgerClient(socket_path, connect_timeout=30).version()  # wait until it listens
+            for round_id, workers in enumerate(int(w) for w in args.workers.split(",")):
+                verify = _run_workers(socket_path, "verify", workers, args, round_id)
+                append = _run_workers(socket_path, "append", workers, args, round_id)
+                print(f"{workers:>16} {verify:>10.0f} {append:>10.0f}")
+        finally:
+            service.terminate()
+            service.wait()
+
+
+if __name__ == "__main__":
+    main()
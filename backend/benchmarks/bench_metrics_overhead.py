@@ -0,0 +1,79 @@
+"""
+Cost of the metrics instrumentation: a timed stage (`hash_invoice`) with
+stage timing on and off, and a trivial route behind the request middleware
+at sample rates 1, 0.1 and 0 (and without the middleware at all).
+
+    python -m benchmarks.bench_metrics_overhead
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.services import blockchain, metrics  # noqa: E402
+
+INVOICE = {"supplier_tpin": "1234567890", "buyer_tpin": "0987654321", "vat": 16.0, "amount": 1000.0}
+
+
+def _per_call(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def _app(sample_rate):
+    app = FastAPI()
+    if sample_rate is not None:
+        app.add_middleware(metrics.RequestMetricsMiddleware, sample_rate=sample_rate)
+
+    @app.get("/ping/{n}")
+    async def ping(n: int):
+        return {"n": n}
+
+    return app
+
+
+async def _requests(app, n: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):
+            await client.get(f"/ping/{i}")
+        start = time.perf_counter()
+        for i in range(n):
+            await client.get(f"/ping/{i}")
+        return (time.perf_counter() - start) / n
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    raw = blockchain.hash_invoice.__wrapped__
+    print(f"{'hash_invoice':<28} {'µs/call':>9}")
+    print(f"{'  uninstrumented':<28} {_per_call(lambda: raw(INVOICE), args.calls) * 1e6:>9.2f}")
+    for enabled in (True, False):
+        metrics.configure(enabled=enabled)
+        label = f"  timed, metrics {'on' if enabled else 'off'}"
+        print(f"{label:<28} {_per_call(lambda: blockchain.hash_invoice(INVOICE), args.calls) * 1e6:>9.2f}")
+    metrics.configure(enabled=True)
+
+    print(f"{'GET /ping/{n}':<28} {'µs/req':>9}")
+    for label, rate in (("  no middleware", None), ("  sample rate 1", 1.0), ("  sample rate 0.1", 0.1), ("  sample rate 0", 0.0)):
+        print(f"{label:<28} {asyncio.run(_requests(_app(rate), args.requests)) * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
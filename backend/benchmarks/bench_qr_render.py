@@ -0,0 +1,56 @@
+"""
+QR PNG rendering: PIL drawing + encode vs the direct 1-bit rasterizer.
+
+    python -m benchmarks.bench_qr_render
+    python -m benchmarks.bench_qr_render --renders 2000
+
+Both renderers start from the same encoded QR symbol (the matrix cache makes
+encoding a one-off), so this measures rasterizing and PNG encoding only.
+Peak memory is the tracemalloc high-water mark of a single render. It sees
+zlib's deflate state (about 256 KiB at the default settings) but not
+Pillow's internal image buffers, so the PIL figure is a lower bound.
+"""
+
+import argparse
+import time
+import tracemalloc
+import uuid
+from io import BytesIO
+
+from app.services import qr_code
+
+
+def _pil(qr) -> bytes:
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _peak(render, qr) -> int:
+    tracemalloc.start()
+    render(qr)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--renders", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    payload = qr_code.create_invoice_qr_data(invoice_id=str(uuid.uuid4()))
+    qr = qr_code._encode(qr_code._payload(payload))
+
+    print(f"{'renderer':>10} {'renders/s':>10} {'py peak KiB':>12} {'bytes':>6}")
+    for name, render in (("pil", _pil), ("direct", qr_code.render_png)):
+        render(qr)
+        start = time.perf_counter()
+        for _ in range(args.renders):
+            png = render(qr)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {args.renders / elapsed:>10.0f} {_peak(render, qr) / 1024:>12.1f} {len(png):>6}")
+
+
+if __name__ == "__main__":
+    main()
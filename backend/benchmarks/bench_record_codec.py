@@ -0,0 +1,91 @@
+"""
+Size and decode speed of ledger records in each encoding.
+
+    python -m benchmarks.bench_record_codec
+    python -m benchmarks.bench_record_codec --records 1000000
+
+Records look like the app's (`make_record` with an invoice id as metadata).
+For each encoding it reports the stored bytes per record (payload plus the
+8-byte frame header), encode and decode throughput, and a full scan of a
+ledger written in that encoding (`iter_records`). The legacy pretty-printed
+JSON array is shown for reference; it is not a frame payload. Finally a
+JSON ledger is converted to binary with `convert_ledger`.
+"""
+
+import argparse
+import hashlib
+import json
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from app.services.ledger import FileLedger, convert_ledger, make_record
+from app.services.ledger.codec import decode_record, encode_record
+from app.services.ledger.log import FRAME_HEADER
+
+CHUNK = 10_000
+
+
+def _rate(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def _scan(path: Path, size: int) -> float:
+    ledger = FileLedger(path, fsync=False, segment_size=64 * 1024 * 1024)
+    start = time.perf_counter()
+    count = sum(1 for _ in ledger.iter_records())
+    elapsed = time.perf_counter() - start
+    ledger.close()
+    assert count == size
+    return size / elapsed
+
+
+def _log_bytes(path: Path) -> int:
+    return path.stat().st_size + sum(p.stat().st_size for p in path.with_name(path.name + ".segments").glob("*.seg"))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--dir", default=None, help="directory for the ledger files (default: a temp dir)")
+    args = parser.parse_args(argv)
+
+    records = [make_record(hashlib.sha256(str(i).encode()).hexdigest(), {"invoice_id": str(uuid.uuid4())}) for i in range(args.records)]
+    legacy = [json.dumps(r, indent=2).encode("utf-8") for r in records]
+
+    print(f"{args.records} records")
+    print(f"{'encoding':>16} {'bytes/rec':>10} {'encode/s':>10} {'decode/s':>10} {'scan/s':>10}")
+    legacy_bytes = len(json.dumps(records, indent=2).encode("utf-8")) / args.records
+    legacy_decode = _rate(json.loads, legacy)
+    print(f"{'legacy indent=2':>16} {legacy_bytes:>10.1f} {'':>10} {legacy_decode:>10.0f} {'':>10}")
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for record_format in ("json", "binary"):
+            payloads = [encode_record(r, record_format) for r in records]
+            assert [decode_record(p) for p in payloads[:1000]] == records[:1000]
+            size = sum(len(p) for p in payloads) / args.records + FRAME_HEADER.size
+            encode = _rate(lambda r: encode_record(r, record_format), records)
+            decode = _rate(decode_record, payloads)
+
+            path = Path(tmp) / f"{record_format}.log"
+            ledger = FileLedger(path, fsync=False, segment_size=64 * 1024 * 1024, record_format=record_format)
+            for lo in range(0, args.records, CHUNK):
+                ledger.append_many([(r["hash"], r["metadata"]) for r in records[lo : lo + CHUNK]])
+            ledger.close()
+            scan = _scan(path, args.records)
+            print(f"{record_format:>16} {size:>10.1f} {encode:>10.0f} {decode:>10.0f} {scan:>10.0f}")
+
+        path = Path(tmp) / "json.log"
+        before = _log_bytes(path)
+        start = time.perf_counter()
+        convert_ledger(path, "binary", backup=False)
+        elapsed = time.perf_counter() - start
+        print(f"convert json -> binary: {elapsed:.2f} s, log {before / 2**20:.1f} MiB -> {_log_bytes(path) / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Verification throughput: N sequential POST /invoices/verify calls vs one
+POST /invoices/verify-batch with N items.
+
+    python -m benchmarks.bench_verify_batch
+    python -m benchmarks.bench_verify_batch --invoices 50000 --batch 1000
+
+Fills the SQLite stand-in with anchored invoices (their hashes written to a
+temporary ledger), then verifies a random sample of `--batch` of them both
+ways through httpx's in-process ASGI transport.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import get_async_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import models  # noqa: E402
+from app.services import blockchain, ledger  # noqa: E402
+from benchmarks.sqlite_compat import sqlite_async_sessionmaker, sqlite_sessionmaker  # noqa: E402
+
+
+def _fill(session_factory, count: int) -> list:
+    entries, rows = [], []
+    for n in range(count):
+        invoice_id = uuid.uuid4()
+        h = blockchain.hash_invoice({"invoice_id": str(invoice_id), "n": n})
+        entries.append((h, {"invoice_id": str(invoice_id)}))
+        rows.append({
+            "id": invoice_id,
+            "invoice_number": f"INV-ZRA-{n:08d}",
+            "user_id": "bench-user",
+            "supplier_tpin": "1234567890",
+            "buyer_tpin": "0987654321",
+            "vat": 16.0,
+            "amount": float(n),
+            "timestamp": datetime.now(timezone.utc),
+            "status": models.InvoiceStatus.PENDING,
+            "blockchain_hash": h,
+        })
+    for start in range(0, count, 10_000):
+        records = blockchain.submit_batch_to_chain(entries[start:start + 10_000])
+        for row, record in zip(rows[start:start + 10_000], records):
+            row["blockchain_tx_ref"] = record["tx_ref"]
+    with session_factory() as db:
+        for start in range(0, count, 10_000):
+            db.execute(insert(models.Invoice), rows[start:start + 10_000])
+        db.commit()
+    return [str(row["id"]) for row in rows]
+
+
+async def _run(ids, batch: int, repeat: int, async_session_factory) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def sequential(sample):
+            for invoice_id in sample:
+                resp = await client.post("/invoices/verify", json={"invoice_id": invoice_id})
+                assert resp.json()["valid"], resp.text
+
+        async def batched(sample):
+            resp = await client.post("/invoices/verify-batch", json={"items": [{"invoice_id": i} for i in sample]})
+            assert resp.json()["valid"] == len(sample), resp.text
+
+        print(f"{batch} verifications per round, {repeat} rounds")
+        print(f"{'method':>11} {'round ms':>9} {'verifs/s':>10}")
+        for name, fn in (("sequential", sequential), ("batch", batched)):
+            await fn(random.sample(ids, batch))  # warm up
+            elapsed = 0.0
+            for _ in range(repeat):
+                sample = random.sample(ids, batch)
+                start = time.perf_counter()
+                await fn(sample)
+                elapsed += time.perf_counter() - start
+            per_round = elapsed / repeat
+            print(f"{name:>11} {per_round * 1000:>9.1f} {batch / per_round:>10.0f}")
+    # aiosqlite connections run on their own threads; close them on this loop
+    await async_session_factory.kw["bind"].dispose()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger.configure(path=str(Path(tmp) / "ledger.log"), fsync=False)
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        ids = _fill(sqlite_sessionmaker(url), args.invoices)
+        async_session_factory = sqlite_async_sessionmaker(url)
+
+        async def get_bench_db():
+            async with async_session_factory() as db:
+                yield db
+
+        app.dependency_overrides[get_async_db] = get_bench_db
+        try:
+            asyncio.run(_run(ids, args.batch, args.repeat, async_session_factory))
+        finally:
+            app.dependency_overrides.clear()
+            blockchain.clear_ledger()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+POST /invoices/verify latency with the verification cache off, in memory and
+shared (SQLite file), and the hit rate and time saved it reports.
+
+    python -m benchmarks.bench_verify_cache
+    python -m benchmarks.bench_verify_cache --requests 20000 --hot 500
+
+Requests pick invoices from a hot set of `--hot` ids (scanners re-verify the
+same receipts), drawn from `--invoices` anchored invoices on the SQLite
+stand-in; the `verify_cache` section of GET /stats is printed for each run.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+# app.config refuses to import without these; nothing here talks to Supabase
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import httpx  # noqa: E402
+
+from app.auth import require_ops_token  # noqa: E402
+from app.database import get_async_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import blockchain, ledger, verify_cache  # noqa: E402
+from benchmarks.sqlite_compat import sqlite_async_sessionmaker, sqlite_sessionmaker  # noqa: E402
+
+from .bench_verify_batch import _fill  # noqa: E402
+
+
+async def _run(ids, args, async_session_factory, backends) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{args.requests} verifications over {args.hot} hot invoices")
+        print(f"{'cache':>7} {'p50 ms':>8} {'mean ms':>8} {'hit rate':>9} {'saved ms':>9}")
+        for name, backend in backends:
+            verify_cache.configure(verify_cache.VerificationCache(backend) if backend is not None else None)
+            hot = random.sample(ids, args.hot)
+            latencies = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                resp = await client.post("/invoices/verify", json={"invoice_id": random.choice(hot)})
+                latencies.append(time.perf_counter() - start)
+                assert resp.json()["valid"], resp.text
+            stats = (await client.get("/stats")).json()["verify_cache"] or {}
+            print(
+                f"{name:>7} {statistics.median(latencies) * 1000:>8.3f} {statistics.mean(latencies) * 1000:>8.3f} "
+                f"{stats.get('hit_rate', 0.0):>9.1%} {stats.get('saved_ms', 0.0):>9.0f}"
+            )
+    await async_session_factory.kw["bind"].dispose()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--hot", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger.configure(path=str(Path(tmp) / "ledger.log"), fsync=False)
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        ids = _fill(sqlite_sessionmaker(url), args.invoices)
+        async_session_factory = sqlite_async_sessionmaker(url)
+
+        async def get_bench_db():
+            async with async_session_factory() as db:
+                yield db
+
+        backends = [
+            ("off", None),
+            ("memory", verify_cache.make_backend("memory", 100_000, "", 0)),
+            ("shared", verify_cache.make_backend("shared", 100_000, str(Path(tmp) / "verify-cache.db"), 3600)),
+        ]
+        app.dependency_overrides[get_async_db] = get_bench_db
+        # GET /stats is read in-process for the report
+        app.dependency_overrides[require_ops_token] = lambda: None
+        try:
+            asyncio.run(_run(ids, args, async_session_factory, backends))
+        finally:
+            app.dependency_overrides.clear()
+            blockchain.clear_ledger()
+
+
+if __name__ == "__main__":
+    main()
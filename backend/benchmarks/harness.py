@@ -0,0 +1,191 @@
+"""
+Shared pieces of the benchmark suite: environment bootstrap, timing, the
+stub JWKS used instead of Supabase, and the JSON report.
+
+A report is a dict of named results. Every result has a primary `value`,
+its `unit` and which direction is `better`, plus any extra statistics;
+`compare` diffs two reports on the primary values.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPORT_SCHEMA = 1
+
+
+def bootstrap() -> None:
+    """Environment app.config insists on; nothing in the suite talks to Supabase."""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-bench.db')}")
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+
+
+# -- timing -------------------------------------------------------------------
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of `samples` (sorted or not)."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def time_call(fn: Callable[[], Any], number: int, repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """
+    Time `fn` as `repeat` rounds of `number` calls. Returns per-call
+    microseconds: the median round as `value`, plus the best and worst round.
+    `setup`, if given, runs before every call and is not timed.
+    """
+    fn()  # warm up caches and lazy imports
+    rounds = []
+    for _ in range(repeat):
+        elapsed = 0.0
+        if setup is None:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - start
+        else:
+            for _ in range(number):
+                setup()
+                start = time.perf_counter()
+                fn()
+                elapsed += time.perf_counter() - start
+        rounds.append(elapsed / number * 1e6)
+    return {
+        "value": statistics.median(rounds),
+        "unit": "us",
+        "better": "lower",
+        "min": min(rounds),
+        "max": max(rounds),
+        "calls": number * repeat,
+    }
+
+
+def latency_result(samples: List[float], errors: int = 0) -> Dict[str, Any]:
+    """Summary of request latencies (seconds) in milliseconds; `value` is p50."""
+    ms = [s * 1000 for s in samples]
+    return {
+        "value": percentile(ms, 0.50),
+        "unit": "ms",
+        "better": "lower",
+        "p95": percentile(ms, 0.95),
+        "p99": percentile(ms, 0.99),
+        "mean": statistics.mean(ms),
+        "count": len(ms),
+        "errors": errors,
+    }
+
+
+# -- stub JWKS -----------------------------------------------------------------
+
+
+class StubJWKS:
+    """
+    An ES256 key pair whose public half is written as a local JWKS file and
+    installed as the service's signing-key cache, so real bearer tokens go
+    through the real auth dependency without Supabase.
+    """
+
+    KID = "bench"
+
+    def __init__(self, directory: str):
+        import jwt
+        from cryptography.hazmat.primitives.asymmetric import ec
+
+        self._jwt = jwt
+        self.private_key = ec.generate_private_key(ec.SECP256R1())
+        jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update(kid=self.KID, alg="ES256", use="sig")
+        self.path = os.path.join(directory, "jwks.json")
+        with open(self.path, "w") as f:
+            json.dump({"keys": [jwk]}, f)
+
+    def install(self) -> None:
+        from app import auth
+        from app.services.jwks import JWKSCache
+
+        auth.jwks_cache = JWKSCache(local_path=self.path)
+        auth.token_cache.clear()
+
+    def token(self, sub: str, ttl: int = 3600) -> str:
+        claims = {"sub": sub, "aud": "authenticated", "exp": int(time.time()) + ttl}
+        return self._jwt.encode(claims, self.private_key, algorithm="ES256", headers={"kid": self.KID})
+
+
+# -- reports -------------------------------------------------------------------
+
+
+def _git_revision() -> Dict[str, Any]:
+    root = Path(__file__).resolve().parents[1]
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--", "."], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def new_report(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "schema": REPORT_SCHEMA,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": {},
+    }
+
+
+def write_report(report: Dict[str, Any], path: Optional[str]) -> None:
+    # Sorted keys and fixed indentation so two reports diff line by line
+    text = json.dumps(report, indent=2, sort_keys=True, default=str) + "\n"
+    if path in (None, "-"):
+        sys.stdout.write(text)
+    else:
+        Path(path).write_text(text)
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    report = json.loads(Path(path).read_text())
+    if report.get("schema") != REPORT_SCHEMA:
+        raise ValueError(f"{path}: unsupported report schema {report.get('schema')!r}")
+    return report
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    Diff the primary values of two reports. Returns (table lines, names of
+    results that got worse by more than `threshold`, a fraction).
+    """
+    lines = [f"{'result':<40} {'base':>12} {'new':>12} {'change':>8}"]
+    regressions = []
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old, cur = base["results"].get(name), new["results"].get(name)
+        if old is None or cur is None:
+            lines.append(f"{name:<40} {'-' if old is None else _fmt(old):>12} {'-' if cur is None else _fmt(cur):>12}")
+            continue
+        change = (cur["value"] - old["value"]) / old["value"] if old["value"] else 0.0
+        worse = change > threshold if cur.get("better", "lower") == "lower" else change < -threshold
+        if worse:
+            regressions.append(name)
+        lines.append(f"{name:<40} {_fmt(old):>12} {_fmt(cur):>12} {change:>+8.1%}{'  REGRESSION' if worse else ''}")
+    return lines, regressions
+
+
+def _fmt(result: Dict[str, Any]) -> str:
+    return f"{result['value']:.3g} {result['unit']}"
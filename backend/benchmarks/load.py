@@ -0,0 +1,208 @@
+"""
+End-to-end load generator: a seeded mix of POST /invoices, GET /invoices,
+POST /invoices/verify and POST /invoices/verify-qr against the real app.
+
+Requests go through httpx's in-process ASGI transport with real bearer tokens
+signed by a stub JWKS, so routing, auth, validation, the database, the
+anchoring worker, the ledger and the caches are all on the measured path;
+only sockets are not. The database is a fresh SQLite stand-in, or the
+Postgres named by `database_url` (tables are created if missing and rows are
+left behind, tagged with a per-run supplier TPIN and user ids).
+
+Run through the suite runner (`python -m benchmarks run --suite load`).
+"""
+
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .harness import StubJWKS, latency_result
+
+# Share of each operation in the mixed phase
+MIX = {"create": 0.2, "list": 0.2, "verify": 0.4, "verify_qr": 0.2}
+USERS = 8
+
+
+def _session_factories(tmp: Path, database_url: Optional[str], concurrency: int):
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.database import Base, async_database_url
+    from benchmarks.sqlite_compat import create_sqlite_schema, sqlite_async_sessionmaker, sqlite_engine
+
+    # `get_db` sessions hold their connection until the dependency exits on a
+    # threadpool thread; a pool smaller than the concurrency deadlocks
+    if database_url is None:
+        url = f"sqlite:///{tmp / 'load.db'}"
+        engine = sqlite_engine(url, pool_size=concurrency, max_overflow=10)
+        create_sqlite_schema(engine)
+        async_factory = sqlite_async_sessionmaker(url, pool_size=concurrency, max_overflow=10)
+    else:
+        engine = create_engine(database_url, pool_size=concurrency, max_overflow=10, pool_pre_ping=True)
+        Base.metadata.create_all(bind=engine)
+        url, connect_args = async_database_url(database_url)
+        async_factory = async_sessionmaker(
+            create_async_engine(url, connect_args=connect_args, pool_size=concurrency, max_overflow=10),
+            expire_on_commit=False, autoflush=False,
+        )
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine), async_factory
+
+
+class _Driver:
+    """Issues the requests and keeps per-operation latencies."""
+
+    def __init__(self, client, tokens: List[str], supplier_tpin: str):
+        self.client = client
+        self.tokens = tokens
+        self.supplier_tpin = supplier_tpin
+        self.created: List[Dict[str, Any]] = []
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._amount = 0
+
+    async def _call(self, op: str, method: str, path: str, user: int, **kwargs) -> Optional[Dict[str, Any]]:
+        headers = {"Authorization": f"Bearer {self.tokens[user]}"}
+        start = time.perf_counter()
+        response = await self.client.request(method, path, headers=headers, **kwargs)
+        self.latencies[op].append(time.perf_counter() - start)
+        body = response.json() if response.status_code < 500 else None
+        if response.status_code >= 400 or (isinstance(body, dict) and body.get("valid") is False):
+            self.errors[op] += 1
+            return None
+        return body
+
+    async def create(self, rng: random.Random) -> None:
+        self._amount += 1
+        payload = {"supplier_tpin": self.supplier_tpin, "buyer_tpin": "0987654321", "vat": 16.0, "amount": float(self._amount)}
+        invoice = await self._call("create", "POST", "/invoices", rng.randrange(len(self.tokens)), json=payload)
+        if invoice is not None:
+            self.created.append(invoice)
+
+    async def list(self, rng: random.Random) -> None:
+        await self._call("list", "GET", "/invoices", rng.randrange(len(self.tokens)), params={"limit": 20})
+
+    async def verify(self, rng: random.Random, targets: List[Dict[str, Any]]) -> None:
+        invoice = rng.choice(targets)
+        await self._call("verify", "POST", "/invoices/verify", 0, json={"invoice_id": invoice["id"]})
+
+    async def verify_qr(self, rng: random.Random, targets: List[Dict[str, Any]]) -> None:
+        invoice = rng.choice(targets)
+        qr_data = json.dumps({"type": "zra_invoice", "invoice_id": invoice["id"], "blockchain_hash": invoice["blockchain_hash"]})
+        await self._call("verify_qr", "POST", "/invoices/verify-qr", 0, json={"qr_data": qr_data})
+
+
+async def _gather(jobs, concurrency: int) -> float:
+    jobs = iter(jobs)
+
+    async def worker():
+        for job in jobs:
+            await job()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def _drive(app, worker, session_factory, async_factory, tokens, supplier_tpin, seed_count, requests, concurrency, seed):
+    import httpx
+
+    rng = random.Random(seed)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        driver = _Driver(client, tokens, supplier_tpin)
+
+        # Seed phase: invoices to verify, anchored before the measured mix
+        await _gather((lambda: driver.create(rng) for _ in range(seed_count)), concurrency)
+        with session_factory() as db:
+            while worker.run_once(db):
+                pass
+        targets = list(driver.created)
+        driver.latencies.clear()
+        driver.errors.clear()
+
+        ops = rng.choices(list(MIX), weights=list(MIX.values()), k=requests)
+        calls = {
+            "create": lambda: driver.create(rng),
+            "list": lambda: driver.list(rng),
+            "verify": lambda: driver.verify(rng, targets),
+            "verify_qr": lambda: driver.verify_qr(rng, targets),
+        }
+        worker.start()
+        try:
+            elapsed = await _gather((calls[op] for op in ops), concurrency)
+        finally:
+            worker.stop()
+    # aiosqlite connections run on their own threads; close them on this loop
+    await async_factory.kw["bind"].dispose()
+    return driver, elapsed
+
+
+def run(
+    quick: bool = False,
+    database_url: Optional[str] = None,
+    requests: Optional[int] = None,
+    concurrency: int = 32,
+    seed: int = 1,
+) -> Dict[str, Dict[str, Any]]:
+    from app.database import get_async_db, get_db, get_session_factory
+    from app.main import app
+    from app.services import anchoring, blockchain, dedup, ledger
+
+    requests = requests or (1000 if quick else 10_000)
+    seed_count = max(100, requests // 10)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ledger.configure(path=str(tmp / "ledger.log"), fsync=False)
+        session_factory, async_factory = _session_factories(tmp, database_url, concurrency)
+
+        stub = StubJWKS(str(tmp))
+        stub.install()
+        run_id = f"{time.time_ns() % 10**10:010d}"
+        tokens = [stub.token(f"load-{run_id}-{n}") for n in range(USERS)]
+
+        def get_load_db():
+            with session_factory() as db:
+                yield db
+
+        async def get_load_async_db():
+            async with async_factory() as db:
+                yield db
+
+        duplicate_filter = dedup.DuplicateFilter(capacity=requests + seed_count)
+        duplicate_filter.warm(session_factory)
+        worker = anchoring.AnchorWorker(session_factory, workers=1, poll_interval=0.05)
+
+        app.dependency_overrides[get_db] = get_load_db
+        app.dependency_overrides[get_async_db] = get_load_async_db
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
+        dedup.configure(duplicate_filter)
+        anchoring.configure(worker)
+        try:
+            driver, elapsed = asyncio.run(_drive(
+                app, worker, session_factory, async_factory, tokens, run_id, seed_count, requests, concurrency, seed
+            ))
+        finally:
+            app.dependency_overrides.clear()
+            anchoring.configure(None)
+            dedup.configure(None)
+            blockchain.clear_ledger()
+            session_factory.kw["bind"].dispose()
+
+    results = {f"load.{op}": latency_result(samples, driver.errors[op]) for op, samples in sorted(driver.latencies.items())}
+    results["load.throughput"] = {
+        "value": requests / elapsed,
+        "unit": "req/s",
+        "better": "higher",
+        "requests": requests,
+        "seconds": elapsed,
+        "concurrency": concurrency,
+        "errors": sum(driver.errors.values()),
+    }
+    return results
@@ -0,0 +1,93 @@
+"""
+Microbenchmarks of the service's hot functions, in-process and without a
+database:
+
+* `hash_invoice`
+* ledger submit and verify (hit and miss) at several ledger sizes, through
+  `blockchain.submit_to_chain` / `verify_hash` like the service
+* QR render, PNG and SVG, with the render cache cleared before every call
+* TPIN validation
+* JWT verification with the stub JWKS, uncached and via the token cache
+
+Run through the suite runner (`python -m benchmarks run --suite micro`).
+"""
+
+import hashlib
+import random
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+from .harness import StubJWKS, time_call
+
+LEDGER_SIZES = (1_000, 10_000, 100_000)
+QUICK_LEDGER_SIZES = (1_000, 10_000)
+# Hashes of counters from here up are never appended
+MISS_BASE = 1 << 40
+
+
+def _hash(n: int) -> str:
+    return hashlib.sha256(n.to_bytes(8, "little")).hexdigest()
+
+
+def _ledger(results: Dict[str, Any], tmp: Path, sizes: Sequence[int], fsync: bool, repeat: int) -> None:
+    from app.services import blockchain, ledger
+
+    ledger.configure(fsync=fsync)
+    for size in sizes:
+        path = tmp / f"ledger-{size}.log"
+        for start in range(0, size, 10_000):
+            blockchain.submit_batch_to_chain(
+                [(_hash(n), {"invoice_id": str(n)}) for n in range(start, min(size, start + 10_000))], path=path
+            )
+        rng = random.Random(size)
+        counter = iter(range(size, size * 10))
+
+        results[f"micro.ledger_submit@{size}"] = time_call(
+            lambda: blockchain.submit_to_chain(_hash(next(counter)), {"invoice_id": "bench"}, path=path),
+            number=50 if fsync else 500, repeat=repeat,
+        )
+        results[f"micro.ledger_verify@{size}"] = time_call(
+            lambda: blockchain.verify_hash(_hash(rng.randrange(size)), path=path), number=2000, repeat=repeat
+        )
+        results[f"micro.ledger_verify_miss@{size}"] = time_call(
+            lambda: blockchain.verify_hash(_hash(MISS_BASE + rng.randrange(size)), path=path),
+            number=2000, repeat=repeat,
+        )
+        blockchain.clear_ledger(path)
+
+
+def run(quick: bool = False, fsync: bool = False) -> Dict[str, Dict[str, Any]]:
+    from app import auth
+    from app.services import blockchain, qr_code, validation
+
+    repeat = 3 if quick else 7
+    results: Dict[str, Dict[str, Any]] = {}
+
+    invoice = {
+        "invoice_id": "6f1f5b2e-8c1e-4b5a-9d55-3c1c2f0e7a10", "supplier_tpin": "1234567890",
+        "buyer_tpin": "0987654321", "amount": 1000.0, "vat": 16.0, "timestamp": "2024-01-01T00:00:00+00:00",
+    }
+    results["micro.hash_invoice"] = time_call(lambda: blockchain.hash_invoice(invoice), number=20_000, repeat=repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _ledger(results, Path(tmp), QUICK_LEDGER_SIZES if quick else LEDGER_SIZES, fsync, repeat)
+
+        payload = qr_code.create_invoice_qr_data(invoice_id=invoice["invoice_id"])
+        for fmt in ("png", "svg"):
+            results[f"micro.qr_render_{fmt}"] = time_call(
+                lambda: qr_code.render_qr_image(payload, fmt), number=50, repeat=repeat, setup=qr_code.clear_cache
+            )
+            results[f"micro.qr_render_{fmt}_cached"] = time_call(
+                lambda: qr_code.render_qr_image(payload, fmt), number=20_000, repeat=repeat
+            )
+
+        results["micro.tpin_valid"] = time_call(lambda: validation.is_valid_tpin("1234567890"), number=50_000, repeat=repeat)
+        results["micro.tpin_invalid"] = time_call(lambda: validation.is_valid_tpin("12345x7890"), number=50_000, repeat=repeat)
+
+        stub = StubJWKS(tmp)
+        stub.install()
+        token = stub.token("bench-user")
+        results["micro.jwt_verify"] = time_call(lambda: auth._verify_signature(token), number=500, repeat=repeat)
+        results["micro.jwt_verify_cached"] = time_call(lambda: auth.verify_jwt_token(token), number=50_000, repeat=repeat)
+    return results
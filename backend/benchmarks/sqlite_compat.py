@@ -0,0 +1,88 @@
+"""
+Local SQLite stand-in for the Supabase Postgres schema.
+
+The production schema relies on Postgres features (a sequence-backed
+`invoice_number` default), so `Base.metadata.create_all` cannot build it on
+SQLite. Tests and benchmarks use this module to get an equivalent schema in
+a local file instead of needing a live database; the service never does, so
+it is not part of `app`. `_INVOICES_DDL` has to follow the migrations.
+"""
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import models  # noqa: F401  (registers every table on Base.metadata)
+
+# Same columns as the `invoices` migration, with SQLite-friendly defaults (the
+# timestamp text matches SQLAlchemy's microsecond format so keyset comparisons work)
+_INVOICES_DDL = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    invoice_number VARCHAR(30) NOT NULL UNIQUE DEFAULT ('INV-ZRA-' || upper(hex(randomblob(5)))),
+    user_id VARCHAR NOT NULL,
+    supplier_tpin VARCHAR NOT NULL,
+    buyer_tpin VARCHAR NOT NULL,
+    vat FLOAT NOT NULL,
+    amount FLOAT NOT NULL,
+    timestamp DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f000', 'now')),
+    status VARCHAR(9) NOT NULL,
+    fingerprint VARCHAR(64) UNIQUE,
+    blockchain_hash VARCHAR(64),
+    blockchain_tx_ref VARCHAR(32),
+    blockchain_timestamp DATETIME
+)
+"""
+_INVOICES_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_invoices_user_id ON invoices (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_supplier_tpin ON invoices (supplier_tpin)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_buyer_tpin ON invoices (buyer_tpin)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_blockchain_hash ON invoices (blockchain_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_blockchain_tx_ref ON invoices (blockchain_tx_ref)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_user_timestamp_id ON invoices (user_id, timestamp DESC, id DESC)",
+]
+
+
+def create_sqlite_schema(engine: Engine) -> None:
+    """Create every application table on a SQLite `engine`."""
+    with engine.begin() as conn:
+        conn.execute(text(_INVOICES_DDL))
+        for ddl in _INVOICES_INDEXES:
+            conn.execute(text(ddl))
+    others = [t for name, t in Base.metadata.tables.items() if name != "invoices"]
+    Base.metadata.create_all(engine, tables=others)
+
+
+def sqlite_engine(url: str, **engine_kwargs) -> Engine:
+    """A SQLite engine with WAL and foreign keys enabled, as the app expects."""
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **engine_kwargs)
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return engine
+
+
+def sqlite_sessionmaker(url: str) -> sessionmaker:
+    engine = sqlite_engine(url)
+    create_sqlite_schema(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def sqlite_async_sessionmaker(url: str, **engine_kwargs) -> async_sessionmaker:
+    """Async (aiosqlite) sessions on a database built by `sqlite_sessionmaker`."""
+    engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1), **engine_kwargs)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
@@ -1,10 +1,32 @@
 """Simple runner to start the FastAPI app with uvicorn on Render."""
 import os
+import subprocess
+import sys
 import uvicorn
 
 if __name__ == "__main__":
     # Render dynamically assigns a port
     port = int(os.environ.get("PORT", 8000))
-    
-    # Bind to 0.0.0.0 so it's accessible externally
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+    # Worker processes cannot share the ledger files; one service process
+    # owns them and the workers reach it over a Unix socket. SQLite and
+    # Postgres ledgers can be opened by every worker directly.
+    ledger_service = None
+    file_backend = os.environ.get("LEDGER_BACKEND", "file").lower() == "file"
+    if workers > 1 and file_backend and not os.environ.get("LEDGER_SOCKET"):
+        os.environ["LEDGER_SOCKET"] = f"/tmp/zra-ledger-{os.getpid()}.sock"
+        ledger_service = subprocess.Popen([sys.executable, "-m", "app.services.ledger.server"])
+
+    # Each worker would otherwise cache verify outcomes that a cancel handled
+    # by another worker never invalidates
+    if workers > 1:
+        os.environ.setdefault("VERIFY_CACHE_BACKEND", "shared")
+
+    try:
+        # Bind to 0.0.0.0 so it's accessible externally
+        uvicorn.run("app.main:app", host="0.0.0.0", port=port, workers=workers)
+    finally:
+        if ledger_service is not None:
+            ledger_service.terminate()
+            ledger_service.wait()
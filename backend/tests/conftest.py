@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# app.config refuses to import without these; unit tests never talk to Supabase,
+# and tests that need a database build their own SQLite stand-in.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'zra-unit-tests.db')}")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import pytest
+
+from app import crud, schemas
+from app.models import models
+from app.services import anchoring, blockchain, ledger
+from benchmarks.sqlite_compat import sqlite_sessionmaker
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+	ledger.configure(path=str(tmp_path / "ledger.json"))
+	yield sqlite_sessionmaker(f"sqlite:///{tmp_path / 'app.db'}")
+	blockchain.clear_ledger()
+	ledger.configure(path="ledger.json")
+
+
+def _create(db, n):
+	return crud.create_invoice(
+		db,
+		schemas.InvoiceCreate(supplier_tpin="1234567890", buyer_tpin="0987654321", vat=16.0, amount=100.0 + n),
+		user_id="user-1",
+	)
+
+
+def test_create_invoice_queues_anchor_in_same_commit(session_factory):
+	with session_factory() as db:
+		inv = _create(db, 1)
+		assert inv.blockchain_tx_ref is None
+		outbox = db.query(models.AnchorOutbox).one()
+		assert outbox.invoice_id == inv.id and outbox.blockchain_hash == inv.blockchain_hash
+
+
+def test_worker_anchors_pending_invoices_in_one_batch(session_factory):
+	with session_factory() as db:
+		ids = [_create(db, n).id for n in range(5)]
+
+	worker = anchoring.AnchorWorker(session_factory, batch_size=10)
+	with session_factory() as db:
+		assert worker.run_once(db) == 5
+	assert worker.stats()["batches"] == 1
+
+	with session_factory() as db:
+		assert db.query(models.AnchorOutbox).count() == 0
+		for inv in db.query(models.Invoice).filter(models.Invoice.id.in_(ids)):
+			record = blockchain.verify_hash(inv.blockchain_hash)
+			assert record["tx_ref"] == inv.blockchain_tx_ref
+			assert record["metadata"]["invoice_id"] == str(inv.id)
+
+
+def test_records_left_by_an_earlier_attempt_are_reused_after_one_probe(session_factory, monkeypatch):
+	with session_factory() as db:
+		first = _create(db, 0)
+		first_id, first_hash = first.id, first.blockchain_hash
+		for n in (1, 2):
+			_create(db, n)
+	# an earlier attempt reached the ledger for the first invoice, then its commit failed
+	earlier = blockchain.submit_to_chain(first_hash, {"invoice_id": str(first_id)})
+
+	probes = []
+	verify_hashes = blockchain.verify_hashes
+
+	def counted(hashes, path=None):
+		probes.append(list(hashes))
+		return verify_hashes(hashes, path)
+
+	monkeypatch.setattr(blockchain, "verify_hashes", counted)
+	monkeypatch.setattr(blockchain, "verify_hash", None)
+	with session_factory() as db:
+		assert anchoring.AnchorWorker(session_factory).run_once(db) == 3
+	assert len(probes) == 1 and len(probes[0]) == 3
+	with session_factory() as db:
+		assert db.get(models.Invoice, first_id).blockchain_tx_ref == earlier["tx_ref"]
+
+
+def test_failed_anchoring_is_retried_then_marked_failed(session_factory, monkeypatch):
+	with session_factory() as db:
+		_create(db, 1)
+
+	def broken(entries, path=None):
+		raise OSError("disk full")
+
+	monkeypatch.setattr(blockchain, "submit_batch_to_chain", broken)
+	worker = anchoring.AnchorWorker(session_factory, max_attempts=2, backoff_base=0)
+	for _ in range(2):
+		with session_factory() as db:
+			worker.run_once(db)
+
+	with session_factory() as db:
+		row = db.query(models.AnchorOutbox).one()
+		assert row.status == models.AnchorStatus.FAILED
+		assert row.attempts == 2 and "disk full" in row.last_error
+	assert worker.stats() == {"anchored": 0, "batches": 0, "retries": 1, "failed": 1}
+
+
+def test_bulk_create_reports_per_item_results(session_factory):
+	def item(supplier, amount):
+		return schemas.InvoiceCreate(supplier_tpin=supplier, buyer_tpin="0987654321", vat=16.0, amount=amount)
+
+	with session_factory() as db:
+		_create(db, 0)  # amount 100.0 already exists
+		results = crud.create_invoices_bulk(
+			db,
+			[item("1234567890", 1.0), item("bad", 2.0), item("1234567890", 100.0), item("1234567890", 1.0), item("1234567890", 3.0)],
+			user_id="user-1",
+		)
+
+	assert [error for _, error in results] == [
+		None, "Invalid TPIN format (expected 10 digits)", "Duplicate invoice", "Duplicate invoice", None,
+	]
+	created = [inv for inv, _ in results if inv is not None]
+	assert [inv.amount for inv in created] == [1.0, 3.0]
+	assert all(inv.invoice_number and inv.timestamp for inv in created)
+
+	worker = anchoring.AnchorWorker(session_factory, batch_size=10)
+	with session_factory() as db:
+		assert worker.run_once(db) == 3  # the single-path invoice plus the two bulk ones
+	assert worker.stats()["batches"] == 1
@@ -0,0 +1,266 @@
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import blockchain, ledger, qr_code
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+	import app.main  # noqa: F401  (configures the ledger on import, so point it at tmp_path after)
+	from benchmarks.sqlite_compat import sqlite_sessionmaker
+
+	ledger.configure(path=str(tmp_path / "ledger.json"))
+	yield sqlite_sessionmaker(f"sqlite:///{tmp_path / 'app.db'}")
+	blockchain.clear_ledger()
+	ledger.configure(path="ledger.json")
+
+
+@pytest.fixture
+def client(session_factory):
+	# Talks to the SQLite stand-in instead of Supabase; the lifespan (background
+	# workers) is not started because the client is not used as a context manager.
+	from app.auth import get_current_user_id
+	from app.database import get_async_db, get_db, get_session_factory
+	from benchmarks.sqlite_compat import sqlite_async_sessionmaker
+	from app.main import app
+
+	def get_test_db():
+		db = session_factory()
+		try:
+			yield db
+		finally:
+			db.close()
+
+	async_session_factory = sqlite_async_sessionmaker(str(session_factory.kw["bind"].url))
+
+	async def get_test_async_db():
+		async with async_session_factory() as db:
+			yield db
+
+	app.dependency_overrides[get_db] = get_test_db
+	app.dependency_overrides[get_async_db] = get_test_async_db
+	app.dependency_overrides[get_session_factory] = lambda: session_factory
+	app.dependency_overrides[get_current_user_id] = lambda: "user-1"
+	yield TestClient(app)
+	app.dependency_overrides.clear()
+
+
+def _create(client, amount=100.0, **params):
+	payload = {"supplier_tpin": "1234567890", "buyer_tpin": "0987654321", "vat": 16.0, "amount": amount}
+	resp = client.post("/invoices", json=payload, params=params)
+	assert resp.status_code == 201
+	return resp.json()
+
+
+def test_create_invoice_qr_is_opt_in(client):
+	assert _create(client, 1.0)["qr_code"] is None
+	assert _create(client, 2.0, include_qr="true")["qr_code"].startswith("data:image/png;base64,")
+
+
+def test_invoice_qr_endpoint_serves_cacheable_images(client):
+	invoice = _create(client)
+
+	resp = client.get(f"/invoices/{invoice['id']}/qr")
+	assert resp.status_code == 200
+	assert resp.headers["content-type"] == "image/png"
+	assert resp.content.startswith(b"\x89PNG")
+	assert "immutable" in resp.headers["cache-control"]
+	etag = resp.headers["etag"]
+
+	cached = client.get(f"/invoices/{invoice['id']}/qr", headers={"If-None-Match": etag})
+	assert cached.status_code == 304 and cached.content == b""
+
+	svg = client.get(f"/invoices/{invoice['id']}/qr", params={"format": "svg"})
+	assert svg.headers["content-type"] == "image/svg+xml"
+	assert svg.headers["etag"] != etag
+
+	assert client.get(f"/invoices/{invoice['id']}/qr", params={"format": "gif"}).status_code == 400
+	missing = "00000000-0000-4000-8000-000000000000"
+	assert client.get(f"/invoices/{missing}/qr").status_code == 404
+	# a missing invoice is a 404 even when the client sends the ETag its id would have
+	missing_etag = qr_code.qr_etag(qr_code.create_invoice_qr_data(invoice_id=missing), "png")
+	assert client.get(f"/invoices/{missing}/qr", headers={"If-None-Match": missing_etag}).status_code == 404
+
+
+def _bulk(client, count, start=0):
+	items = [
+		{"supplier_tpin": "1234567890", "buyer_tpin": "0987654321", "vat": 16.0, "amount": float(n)}
+		for n in range(start, start + count)
+	]
+	resp = client.post("/invoices/bulk", json=items)
+	assert resp.json()["created"] == count
+
+
+def test_bulk_ndjson_is_read_as_a_stream_within_limits(client, monkeypatch):
+	import app.main as main
+
+	line = b'{"supplier_tpin": "1234567890", "buyer_tpin": "0987654321", "vat": 16.0, "amount": %d}\n'
+	body = b"".join(line % n for n in range(3)) + b'{"amount": "x"}'
+	# lines split across chunks, and a last line without a newline
+	chunks = [body[i : i + 7] for i in range(0, len(body), 7)]
+	headers = {"Content-Type": "application/x-ndjson"}
+	resp = client.post("/invoices/bulk", content=iter(chunks), headers=headers)
+	assert (resp.json()["created"], resp.json()["failed"]) == (3, 1)
+
+	monkeypatch.setattr(main, "BULK_MAX_ITEMS", 2)
+	assert client.post("/invoices/bulk", content=body, headers=headers).status_code == 413
+	monkeypatch.setattr(main, "BULK_MAX_ITEMS", 10)
+	monkeypatch.setattr(main, "BULK_MAX_BYTES", 64)
+	assert client.post("/invoices/bulk", content=iter(chunks), headers=headers).status_code == 413
+	assert client.post("/invoices/bulk", content=b"[" + b"1," * 40 + b"1]").status_code == 413
+
+
+def test_list_invoices_walks_pages_with_a_cursor(client, session_factory):
+	from sqlalchemy import text
+
+	# Rows from one bulk insert share a timestamp, so the id tiebreak matters
+	_bulk(client, 15)
+	_bulk(client, 10, start=100)
+	with session_factory() as db:
+		# The column allows NULL; such rows come first and must still page
+		db.execute(text("UPDATE invoices SET timestamp = NULL WHERE amount < 12"))
+		db.commit()
+
+	seen, cursor, pages = [], None, 0
+	while True:
+		params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+		resp = client.get("/invoices", params=params)
+		assert resp.status_code == 200
+		page = resp.json()
+		seen.extend(page["items"])
+		pages += 1
+		cursor = page["next_cursor"]
+		assert resp.headers.get("x-next-cursor") == cursor
+		if not cursor:
+			break
+
+	assert pages == 3 and len(seen) == 25
+	assert len({inv["id"] for inv in seen}) == 25
+	# the first page ends inside the NULL rows, so the second one starts from a NULL cursor
+	assert {inv["amount"] for inv in seen[:12]} == set(map(float, range(12)))
+	assert [inv["id"] for inv in seen[:12]] == sorted((inv["id"] for inv in seen[:12]), reverse=True)
+	keys = [(inv["timestamp"], inv["id"]) for inv in seen[12:]]
+	assert keys == sorted(keys, reverse=True)
+
+
+def test_list_invoices_projects_fields_and_rejects_bad_input(client):
+	_bulk(client, 3)
+	resp = client.get("/invoices", params={"fields": "id, amount"})
+	assert resp.status_code == 200
+	assert all(set(inv) == {"id", "amount"} for inv in resp.json()["items"])
+
+	assert client.get("/invoices", params={"fields": "id,password"}).status_code == 400
+	assert client.get("/invoices", params={"cursor": "garbage"}).status_code == 400
+	assert client.get("/invoices", params={"limit": 1001}).status_code == 422
+
+
+def test_list_invoices_legacy_skip_still_works(client):
+	_bulk(client, 5)
+	everything = client.get("/invoices").json()["items"]
+	assert client.get("/invoices", params={"skip": 2, "limit": 2}).json()["items"] == everything[2:4]
+
+
+def test_export_streams_ndjson_and_csv_with_filters(client, monkeypatch):
+	import csv
+	import io
+	import json
+
+	from app import main
+
+	monkeypatch.setattr(main, "EXPORT_CHUNK_ROWS", 2)  # exercise several chunks
+	_bulk(client, 5)
+	cancelled = client.get("/invoices", params={"limit": 1}).json()["items"][0]
+	client.patch(f"/invoices/{cancelled['id']}")
+
+	resp = client.get("/invoices/export")
+	assert resp.headers["content-type"] == "application/x-ndjson"
+	rows = [json.loads(line) for line in resp.text.splitlines()]
+	assert len(rows) == 5 and rows[0]["supplier_tpin"] == "1234567890"
+
+	resp = client.get("/invoices/export", params={"format": "csv", "status": "PENDING"})
+	assert resp.headers["content-type"].startswith("text/csv")
+	table = list(csv.DictReader(io.StringIO(resp.text)))
+	assert len(table) == 4 and cancelled["id"] not in {row["id"] for row in table}
+
+	resp = client.get("/invoices/export", params={"until": "2000-01-01T00:00:00"})
+	assert resp.text == ""
+	assert client.get("/invoices/export", params={"format": "xml"}).status_code == 400
+
+
+def test_verify_batch_reports_each_item_in_order(client, session_factory):
+	import json
+
+	from app.services import anchoring
+
+	anchored = _create(client, 1.0)
+	with session_factory() as db:
+		anchoring.AnchorWorker(session_factory).run_once(db)
+	pending = _create(client, 2.0)  # not on the ledger yet
+	anchored_hash = client.get(f"/invoices/{anchored['id']}").json()["blockchain_hash"]
+	qr = {"type": "zra_invoice", "invoice_id": anchored["id"], "blockchain_hash": anchored_hash}
+
+	items = [
+		{"invoice_id": anchored["id"]},
+		{"qr_data": json.dumps(qr)},
+		{"qr_data": json.dumps({**qr, "blockchain_hash": "0" * 64})},
+		{"invoice_id": pending["id"]},
+		{"invoice_id": "00000000-0000-4000-8000-000000000000"},
+		{"invoice_id": "not-a-uuid"},
+		{"qr_data": "{"},
+		{"invoice_id": anchored["id"]},
+	]
+	resp = client.post("/invoices/verify-batch", json={"items": items})
+	assert resp.status_code == 200
+	body = resp.json()
+	assert [r["index"] for r in body["results"]] == list(range(len(items)))
+	assert [r["valid"] for r in body["results"]] == [True, True, False, False, False, False, False, True]
+	assert [r["error"] for r in body["results"][2:7]] == [
+		"Hash mismatch",
+		"Invoice hash not found in blockchain ledger",
+		"Invoice not found",
+		"Invalid invoice ID format",
+		"Invalid QR code format",
+	]
+	assert body["results"][0]["invoice"]["id"] == anchored["id"]
+	assert (body["valid"], body["invalid"]) == (3, 5)
+
+	assert client.post("/invoices/verify-batch", json={"items": [{}]}).status_code == 422
+
+
+def test_verification_is_cached_until_cancel_or_anchoring(client, session_factory):
+	from app.services import anchoring, verify_cache
+
+	cache = verify_cache.get()
+	invoice = _create(client)
+
+	def verify():
+		return client.post("/invoices/verify", json={"invoice_id": invoice["id"]}).json()
+
+	assert verify()["error"] == "Invoice hash not found in blockchain ledger"
+	with session_factory() as db:
+		anchoring.AnchorWorker(session_factory).run_once(db)
+	assert verify()["valid"]
+
+	hits = cache.stats()["hits"]
+	assert verify()["invoice"]["status"] == "PENDING"
+	assert cache.stats()["hits"] == hits + 1
+
+	client.patch(f"/invoices/{invoice['id']}")
+	assert verify()["invoice"]["status"] == "CANCELLED"
+
+
+def test_stats_and_metrics_need_the_ops_token(client, monkeypatch):
+	from app import auth
+
+	monkeypatch.setattr(auth, "OPS_TOKEN", "")
+	assert client.get("/stats").status_code == 404
+	assert client.get("/metrics").status_code == 404
+
+	monkeypatch.setattr(auth, "OPS_TOKEN", "s3cret")
+	assert client.get("/stats").status_code == 401
+	assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+	ops = {"Authorization": "Bearer s3cret"}
+	assert "stages" in client.get("/stats", headers=ops).json()
+	assert client.get("/metrics", headers=ops).text.startswith("#")
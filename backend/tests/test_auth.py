@@ -0,0 +1,103 @@
+import hashlib
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+
+from app import auth
+from app.services.jwks import JWKSCache
+
+
+def _keypair(kid):
+	private_key = ec.generate_private_key(ec.SECP256R1())
+	jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+	jwk.update(kid=kid, alg="ES256", use="sig")
+	return private_key, jwk
+
+
+def _token(private_key, kid, **claims):
+	payload = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 3600, **claims}
+	return jwt.encode(payload, private_key, algorithm="ES256", headers={"kid": kid})
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+	auth.token_cache.clear()
+	yield
+	auth.token_cache.clear()
+
+
+@pytest.fixture
+def keys(tmp_path):
+	first, second = _keypair("key-1"), _keypair("key-2")
+	path = tmp_path / "jwks.json"
+	path.write_text(json.dumps({"keys": [first[1]]}))
+	return path, first, second
+
+
+def test_verify_with_local_jwks_file(keys, monkeypatch):
+	path, (private_key, _), _ = keys
+	monkeypatch.setattr(auth, "jwks_cache", JWKSCache(local_path=path))
+
+	assert auth.verify_jwt_token(_token(private_key, "key-1"))["sub"] == "user-1"
+	with pytest.raises(HTTPException) as exc:
+		auth.verify_jwt_token(_token(private_key, "key-1", aud="other"))
+	assert exc.value.status_code == 401
+	with pytest.raises(HTTPException) as exc:
+		auth.verify_jwt_token("not-a-jwt")
+	assert exc.value.status_code == 401
+	assert auth.jwks_cache.stats()["hits"] == 2
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval(keys):
+	path, (_, jwk1), (private_key2, jwk2) = keys
+	cache = JWKSCache("https://jwks.invalid/jwks.json", local_path=path, min_refetch_interval=60)
+	fetches = []
+
+	def fetch():
+		fetches.append(1)
+		return {"keys": [jwk1, jwk2]}, 300.0
+
+	cache._fetch = fetch
+	assert cache.get_signing_key("key-2") is not None  # rotated key: fetched on demand
+	with pytest.raises(jwt.PyJWKClientError):
+		cache.get_signing_key("key-3")  # within the interval: no second fetch
+	assert len(fetches) == 1
+	stats = cache.stats()
+	assert stats["fetches"] == 1 and stats["refetches_rate_limited"] == 1 and stats["keys"] == 2
+
+
+def test_failed_refresh_keeps_serving_cached_keys(keys):
+	path, (_, jwk1), _ = keys
+	cache = JWKSCache("https://jwks.invalid/jwks.json", local_path=path)
+
+	def fetch():
+		raise OSError("connection reset")
+
+	cache._fetch = fetch
+	assert cache.refresh() is False
+	assert cache.get_signing_key("key-1") is not None
+	assert cache.stats()["fetch_errors"] == 1
+
+
+def test_verified_tokens_are_cached_until_exp(keys, monkeypatch):
+	path, (private_key, _), _ = keys
+	monkeypatch.setattr(auth, "jwks_cache", JWKSCache(local_path=path))
+	token = _token(private_key, "key-1", exp=int(time.time()) + 60)
+
+	first = auth.verify_jwt_token(token)
+	assert auth.verify_jwt_token(token) is first
+	assert auth.jwks_cache.stats()["hits"] == 1  # the repeat skipped verification
+
+	expires_at, _ = auth.token_cache.get(hashlib.sha256(token.encode()).digest())
+	assert expires_at <= first["exp"]
+
+	# Once the token's exp has passed the cached entry is not used
+	verified = []
+	monkeypatch.setattr(auth.time, "time", lambda: first["exp"] + 1)
+	monkeypatch.setattr(auth, "_verify_signature", lambda t: verified.append(t) or first)
+	auth.verify_jwt_token(token)
+	assert verified == [token]
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from app import crud, schemas
+from app.services import blockchain, dedup, ledger
+from app.services.bloom import BloomFilter, ScalableBloomFilter
+from benchmarks.sqlite_compat import sqlite_sessionmaker
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+	ledger.configure(path=str(tmp_path / "ledger.json"))
+	yield sqlite_sessionmaker(f"sqlite:///{tmp_path / 'app.db'}")
+	dedup.configure(None)
+	blockchain.clear_ledger()
+	ledger.configure(path="ledger.json")
+
+
+def _invoice(amount):
+	return schemas.InvoiceCreate(supplier_tpin="1234567890", buyer_tpin="0987654321", vat=16.0, amount=amount)
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+	bloom = BloomFilter(10_000, 0.01)
+	for n in range(10_000):
+		bloom.add(f"in-{n}")
+	assert all(f"in-{n}" in bloom for n in range(10_000))
+	false_positives = sum(f"out-{n}" in bloom for n in range(10_000))
+	assert false_positives < 300
+	assert bloom.false_positive_rate() == pytest.approx(0.01, rel=0.3)
+
+
+def test_scalable_bloom_filter_grows_past_its_capacity():
+	bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01)
+	for n in range(1_000):
+		bloom.add(f"in-{n}")
+	assert len(bloom) == 1_000 and bloom.stats()["stages"] > 1
+	assert all(f"in-{n}" in bloom for n in range(1_000))
+	assert bloom.false_positive_rate() < 0.02
+
+
+def test_fingerprint_normalizes_fields():
+	assert dedup.fingerprint("1234567890 ", "0987654321", 100, 16) == dedup.fingerprint("1234567890", "0987654321", 100.0, 16.0)
+	assert dedup.fingerprint("1234567890", "0987654321", 100.0, 16.0) != dedup.fingerprint("1234567890", "0987654321", 100.5, 16.0)
+
+
+def test_warm_filter_skips_probe_for_new_invoices(session_factory):
+	with session_factory() as db:
+		crud.create_invoice(db, _invoice(1.0), user_id="user-1")
+
+	duplicate_filter = dedup.DuplicateFilter(capacity=1_000)
+	assert duplicate_filter.warm(session_factory) == 1
+	dedup.configure(duplicate_filter)
+
+	with session_factory() as db:
+		crud.create_invoice(db, _invoice(2.0), user_id="user-1")
+		with pytest.raises(ValueError, match="Duplicate invoice"):
+			crud.create_invoice(db, _invoice(1.0), user_id="user-1")
+		with pytest.raises(ValueError, match="Duplicate invoice"):
+			crud.create_invoice(db, _invoice(2.0), user_id="user-1")
+
+	stats = duplicate_filter.stats()
+	assert stats["probes_skipped"] == 1 and stats["duplicates"] == 2 and stats["items"] == 2
+
+
+def test_unique_fingerprint_catches_duplicates_the_filter_missed(session_factory):
+	# A filter warmed before another process inserted the invoice says "never seen"
+	duplicate_filter = dedup.DuplicateFilter(capacity=1_000)
+	duplicate_filter.warm(session_factory)
+	with session_factory() as db:
+		crud.create_invoice(db, _invoice(1.0), user_id="user-1")
+	dedup.configure(duplicate_filter)
+
+	with session_factory() as db:
+		with pytest.raises(ValueError, match="Duplicate invoice"):
+			crud.create_invoice(db, _invoice(1.0), user_id="user-1")
+		results = crud.create_invoices_bulk(db, [_invoice(1.0), _invoice(3.0)], user_id="user-1")
+	assert [error for _, error in results] == ["Duplicate invoice", None]
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+import services.blockchain as bc
+from app.services.ledger import FileLedger, migrate_json_ledger
+from app.services.ledger.log import MAGIC, RecordLog
+
+
+def test_append_does_not_rewrite_existing_records(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.json"
+	bc.submit_to_chain("a" * 64, {"n": 1}, path=ledger_file)
+	size_after_one = ledger_file.stat().st_size
+	bc.submit_to_chain("b" * 64, {"n": 2}, path=ledger_file)
+
+	with ledger_file.open("rb") as f:
+		head = f.read(size_after_one)
+	assert head.startswith(MAGIC)
+	# the first record's bytes are untouched by the second append
+	assert ledger_file.stat().st_size > size_after_one
+	assert bc.verify_hash("a" * 64, path=ledger_file)["metadata"] == {"n": 1}
+	bc.clear_ledger(ledger_file)
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.log"
+	ledger = FileLedger(ledger_file)
+	ledger.append("c" * 64, {})
+	ledger.append("d" * 64, {})
+	ledger.close()
+	good_size = ledger_file.stat().st_size
+
+	# simulate a crash halfway through writing a third frame
+	with ledger_file.open("ab") as f:
+		f.write(b"\x40\x00\x00\x00\x12\x34")
+
+	ledger = FileLedger(ledger_file)
+	assert [r["hash"] for r in ledger] == ["c" * 64, "d" * 64]
+	assert ledger_file.stat().st_size == good_size
+
+	ledger.append("e" * 64, {})
+	assert ledger.find("e" * 64) is not None
+	ledger.close()
+
+
+def test_corrupt_frame_is_not_returned(tmp_path: Path):
+	log = RecordLog(tmp_path / "ledger.log")
+	log.open()
+	first, second = log.append([b"first", b"second"])
+	assert log.read_at(second) == b"second"
+	log.close()
+
+	data = bytearray((tmp_path / "ledger.log").read_bytes())
+	data[-1] ^= 0xFF
+	(tmp_path / "ledger.log").write_bytes(bytes(data))
+
+	log = RecordLog(tmp_path / "ledger.log")
+	log.open()
+	assert [p for _, p in log.scan()] == [b"first"]
+	assert log.size == second
+	log.close()
+
+
+def test_migrate_legacy_json_ledger(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.json"
+	records = [
+		{"hash": "1" * 64, "metadata": {"invoice_id": "x"}, "tx_ref": "t1", "timestamp": "2025-10-25T11:28:48.107148Z"},
+		{"hash": "2" * 64, "metadata": {}, "tx_ref": "t2", "timestamp": "2025-10-25T13:20:51.901865Z"},
+	]
+	ledger_file.write_text(json.dumps(records, indent=2), encoding="utf-8")
+
+	assert migrate_json_ledger(ledger_file) == 2
+	assert (tmp_path / "ledger.json.bak").exists()
+	assert list(FileLedger(ledger_file)) == records
+
+
+def test_legacy_ledger_is_migrated_on_first_use(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.json"
+	record = {"hash": "3" * 64, "metadata": {}, "tx_ref": "t3", "timestamp": "2025-10-25T21:20:51.926814Z"}
+	ledger_file.write_text(json.dumps([record], indent=2), encoding="utf-8")
+
+	assert bc.verify_hash("3" * 64, path=ledger_file) == record
+	bc.clear_ledger(ledger_file)
+
+
+def test_index_survives_reopen_and_growth(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.log"
+	ledger = FileLedger(ledger_file, fsync=False)
+	hashes = [bc.hash_invoice({"n": i}) for i in range(3000)]
+	ledger.append_many([(h, {"n": i}) for i, h in enumerate(hashes)])
+	ledger.close()
+
+	ledger = FileLedger(ledger_file)
+	assert ledger.find(hashes[0])["metadata"] == {"n": 0}
+	assert ledger.find(hashes[-1])["metadata"] == {"n": 2999}
+	assert ledger.find("f" * 64) is None
+	ledger.close()
+
+
+def test_lookups_racing_index_growth_retry_on_the_new_table(tmp_path: Path):
+	from app.services.ledger.index import HashIndex, index_key
+
+	index = HashIndex.create(tmp_path / "ledger.log.idx", log_id=1)
+	keys = [index_key(bc.hash_invoice({"n": i})) for i in range(2000)]
+	index.add(keys[0], 8)
+	first_table = index._table
+	stop, errors = threading.Event(), []
+
+	def look_up():
+		while not stop.is_set():
+			try:
+				assert index.lookup(keys[0]) == 8
+			except Exception as e:
+				errors.append(e)
+				return
+
+	reader = threading.Thread(target=look_up)
+	reader.start()
+	for i, key in enumerate(keys[1:], 1):
+		index.add(key, 8 + i)
+	stop.set()
+	reader.join()
+	assert not errors
+	# the outgrown mappings are unmapped, not left for the garbage collector
+	assert first_table.mm.closed and index.capacity > first_table.capacity
+	index.close()
+
+
+def test_missing_or_stale_index_is_rebuilt(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.log"
+	ledger = FileLedger(ledger_file)
+	ledger.append("a" * 64, {"n": 1})
+	ledger.close()
+	stale_index = ledger.index_path.read_bytes()
+
+	ledger = FileLedger(ledger_file)
+	ledger.append("b" * 64, {"n": 2})
+	ledger.close()
+
+	# an index that only covers the first record is caught up from the log tail
+	ledger.index_path.write_bytes(stale_index)
+	ledger = FileLedger(ledger_file)
+	assert ledger.find("b" * 64)["metadata"] == {"n": 2}
+	ledger.close()
+
+	ledger.index_path.unlink()
+	ledger = FileLedger(ledger_file)
+	assert ledger.find("a" * 64)["metadata"] == {"n": 1}
+	assert ledger.index_path.exists()
+	ledger.close()
+
+
+def test_first_record_wins_for_duplicate_hash(tmp_path: Path):
+	ledger = FileLedger(tmp_path / "ledger.log")
+	first = ledger.append("d" * 64, {"n": 1})
+	ledger.append("d" * 64, {"n": 2})
+	assert ledger.find("d" * 64)["tx_ref"] == first["tx_ref"]
+	ledger.close()
+
+
+def test_concurrent_submissions_are_batched_and_not_lost(tmp_path: Path):
+	import threading
+	from app.services.ledger import GroupCommitLedger
+
+	backend = FileLedger(tmp_path / "ledger.log")
+	ledger = GroupCommitLedger(backend, max_batch=16, max_linger=0.005)
+	results = {}
+
+	def submit(i):
+		results[i] = ledger.append(bc.hash_invoice({"n": i}), {"n": i})
+
+	threads = [threading.Thread(target=submit, args=(i,)) for i in range(64)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+
+	assert len({r["tx_ref"] for r in results.values()}) == 64
+	assert all(r["metadata"] == {"n": i} for i, r in results.items())
+	assert sum(1 for _ in ledger) == 64
+	assert ledger.batches < 64
+	ledger.close()
+
+
+def test_a_bad_entry_in_a_shared_write_fails_only_its_submitter(tmp_path: Path):
+	from app.services.ledger import GroupCommitLedger, LedgerError
+	from app.services.ledger.writer import _Request
+
+	class Picky(FileLedger):
+		def append_many(self, entries):
+			if any(h == "bad" for h, _ in entries):
+				raise LedgerError("bad entry")
+			return super().append_many(entries)
+
+	ledger = GroupCommitLedger(Picky(tmp_path / "ledger.log", fsync=False))
+	# three submitters whose requests were coalesced into one write
+	batch = [_Request([("a" * 64, {})]), _Request([("bad", {})]), _Request([("b" * 64, {"n": 1})])]
+	ledger._write(batch, 3)
+	assert [request.error is None for request in batch] == [True, False, True]
+	assert str(batch[1].error) == "bad entry"
+	assert ledger.find("b" * 64) == batch[2].records[0]
+	ledger.close()
+
+
+def test_find_many_returns_present_hashes(tmp_path: Path):
+	ledger = FileLedger(tmp_path / "ledger.log")
+	records = ledger.append_many([(hashlib.sha256(bytes([n])).hexdigest(), {"n": n}) for n in range(20)])
+	wanted = [records[7]["hash"], "f" * 64, records[2]["hash"], records[7]["hash"]]
+	found = ledger.find_many(wanted)
+	assert found == {records[7]["hash"]: records[7], records[2]["hash"]: records[2]}
+	ledger.close()
+
+
+def _distrust_index(index_path: Path) -> None:
+	# What a crash followed by a reboot leaves: an unclean index from another boot
+	from app.services.ledger.index import _HEADER
+
+	header = bytearray(index_path.read_bytes()[:_HEADER.size])
+	fields = list(_HEADER.unpack(bytes(header)))
+	fields[5], fields[6] = 0, b"\xff" * 16
+	with index_path.open("r+b") as f:
+		f.write(_HEADER.pack(*fields))
+
+
+def test_untrusted_index_is_restored_from_checkpoint(tmp_path: Path, caplog):
+	ledger_file = tmp_path / "ledger.log"
+	ledger = FileLedger(ledger_file, fsync=False, block_size=16, checkpoint_bytes=4096)
+	hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(500)]
+	for i, h in enumerate(hashes):
+		ledger.append(h, {"n": i})
+	meta = ledger.checkpoint()
+	ledger.append_many([(h, {"n": i}) for i, h in enumerate(["c" * 64, "d" * 64])])
+	ledger.close()
+	assert meta["count"] == 500
+	assert len(list(ledger._checkpoints.entries())) == 2
+
+	_distrust_index(ledger.index_path)
+	with caplog.at_level("INFO", logger="app.services.ledger.file"):
+		ledger = FileLedger(ledger_file, fsync=False, block_size=16)
+		assert ledger.find(hashes[0])["metadata"] == {"n": 0}
+	assert "Restored ledger index" in caplog.text
+	assert ledger.find("d" * 64)["metadata"] == {"n": 1}  # replayed from the tail
+	assert ledger.find("e" * 64) is None
+	ledger.close()
+
+	# a checkpoint from a different chain history is not used
+	ledger = FileLedger(ledger_file, fsync=False, block_size=16)
+	ledger.clear()
+	ledger = FileLedger(ledger_file, fsync=False, block_size=16)
+	ledger.append("a" * 64, {"n": 0})
+	ledger.checkpoint()
+	ledger.close()
+	for meta_path in ledger._checkpoints.dir.glob("*.json"):
+		meta = json.loads(meta_path.read_text())
+		meta["blocks"]["head_hash"] = "f" * 64
+		meta_path.write_text(json.dumps(meta))
+	_distrust_index(ledger.index_path)
+	caplog.clear()
+	with caplog.at_level("INFO", logger="app.services.ledger.file"):
+		ledger = FileLedger(ledger_file, fsync=False, block_size=16)
+		assert ledger.find("a" * 64)["metadata"] == {"n": 0}
+	assert "Rebuilding ledger index" in caplog.text
+	ledger.close()
+
+
+def test_checkpoint_copy_leaves_out_appends_made_after_capture(tmp_path: Path):
+	from app.services.ledger.index import HashIndex, index_key
+
+	ledger = FileLedger(tmp_path / "ledger.log", fsync=False)
+	hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(800)]
+	ledger.append_many([(h, {"n": i}) for i, h in enumerate(hashes[:100])])
+	with ledger._lock:
+		pending = ledger._capture_checkpoint()
+	# the copy runs outside the append lock, so appends may land first
+	ledger.append_many([(h, {"n": i}) for i, h in enumerate(hashes[100:150])])
+	meta = ledger._checkpoints.finish(*pending)
+	assert meta["count"] == 100
+
+	copy = tmp_path / "copy.idx"
+	copy.write_bytes((ledger._checkpoints.dir / f"{meta['position']:020d}.idx").read_bytes())
+	index = HashIndex.load(copy, meta["log_id"])
+	assert (index.count, index.indexed_upto) == (100, meta["position"])
+	assert all(index.lookup(index_key(h)) is not None for h in hashes[:100])
+	assert all(index.lookup(index_key(h)) is None for h in hashes[100:150])
+	index.close()
+
+	# a copy taken across a growth of the index is dropped
+	with ledger._lock:
+		pending = ledger._capture_checkpoint()
+	ledger.append_many([(h, {"n": i}) for i, h in enumerate(hashes[150:])])
+	assert ledger._checkpoints.finish(*pending) is None
+	assert [m["position"] for m, _ in ledger._checkpoints.entries()] == [meta["position"]]
+	ledger.close()
+
+
+def test_binary_records_round_trip_and_fall_back_to_json():
+	import pytest
+	from app.services.ledger import LedgerError, make_record
+	from app.services.ledger.codec import decode_record, encode_record
+
+	record = make_record(hashlib.sha256(b"x").hexdigest(), {"invoice_id": "abc", "amount": 1.5})
+	payload = encode_record(record, "binary")
+	assert payload[0] == 1 and len(payload) < len(encode_record(record, "json"))
+	assert decode_record(payload) == record
+
+	# whatever the binary layout cannot reproduce exactly is kept as JSON
+	legacy = {"hash": "A" * 64, "metadata": {}, "tx_ref": "t1", "timestamp": "2025-10-25T11:28:48Z"}
+	assert encode_record(legacy, "binary").startswith(b"{")
+	assert decode_record(encode_record(legacy, "binary")) == legacy
+
+	corrupt = bytearray(payload)
+	corrupt[40] ^= 0xFF
+	with pytest.raises(LedgerError):
+		decode_record(bytes(corrupt))
+
+
+def test_convert_ledger_keeps_records_and_proofs(tmp_path: Path):
+	from app.services.ledger import convert_ledger, verify_inclusion_proof
+
+	ledger_file = tmp_path / "ledger.log"
+	ledger = FileLedger(ledger_file, fsync=False, block_size=16, segment_size=8192, record_format="json")
+	hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(300)]
+	for lo in range(0, 300, 25):
+		ledger.append_many([(h, {"n": lo + i}) for i, h in enumerate(hashes[lo : lo + 25])])
+	ledger.seal()
+	records = list(ledger.iter_records())
+	proofs = [ledger.inclusion_proof(h) for h in (hashes[0], hashes[150], hashes[-1])]
+	json_size = sum(p.stat().st_size for p in [ledger_file, *ledger_file.with_name("ledger.log.segments").glob("*.seg")])
+	assert len(ledger.segments()) > 1
+	ledger.close()
+
+	assert convert_ledger(ledger_file, "binary") == 300
+	assert (tmp_path / "ledger.log.bak").exists()
+
+	ledger = FileLedger(ledger_file, fsync=False, block_size=16, segment_size=8192)
+	assert list(ledger.iter_records()) == records
+	for proof in proofs:
+		assert ledger.inclusion_proof(proof["record"]["hash"]) == proof
+		assert verify_inclusion_proof(proof)
+	binary_size = sum(p.stat().st_size for p in [ledger_file, *ledger_file.with_name("ledger.log.segments").glob("*.seg")])
+	assert binary_size < json_size
+	ledger.append("e" * 64, {"n": 300})
+	assert ledger.find("e" * 64)["metadata"] == {"n": 300}
+	ledger.close()
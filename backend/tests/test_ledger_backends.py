@@ -0,0 +1,82 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from app.services.ledger import FileLedger, SqliteLedger, verify_inclusion_proof
+from app.services.ledger.postgres import PostgresLedger
+from benchmarks.sqlite_compat import create_sqlite_schema, sqlite_engine
+
+# Behaviour every ledger backend shares, so LEDGER_BACKEND can be swapped.
+# The Postgres ledger runs its table layout and queries on the SQLite
+# stand-in here; its Postgres-only paths (COPY, SELECT ... FOR UPDATE) need
+# a server.
+
+
+def _hash(n: int) -> str:
+	return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+@pytest.fixture(params=["file", "sqlite", "postgres"])
+def open_ledger(request, tmp_path: Path):
+	"""Opens the backend under test, on the same store every time it is called."""
+	if request.param == "file":
+		yield lambda: FileLedger(tmp_path / "ledger.log", fsync=False, block_size=4)
+		return
+	if request.param == "sqlite":
+		yield lambda: SqliteLedger(tmp_path / "ledger.db", fsync=False, block_size=4)
+		return
+	engine = sqlite_engine(f"sqlite:///{tmp_path / 'app.db'}")
+	create_sqlite_schema(engine)
+	yield lambda: PostgresLedger(engine, block_size=4, version_ttl=0)
+	engine.dispose()
+
+
+def test_records_are_found_and_duplicates_keep_the_first(open_ledger):
+	db = open_ledger()
+	records = db.append_many([(_hash(n), {"n": n}) for n in range(10)])
+	assert db.find(_hash(3)) == records[3]
+	assert db.find("f" * 64) is None
+	assert db.find_many([_hash(1), "f" * 64, _hash(7)]) == {_hash(1): records[1], _hash(7): records[7]}
+
+	# the unique hash index keeps one record per hash; appending it again returns that one
+	again = db.append(_hash(3), {"n": "again"})
+	assert again == records[3]
+	assert [r["hash"] for r in db] == [_hash(n) for n in range(10)]
+	db.close()
+
+
+def test_a_hash_is_stored_once_and_later_appends_get_the_first_record(open_ledger):
+	db = open_ledger()
+	first = db.append(_hash(1), {"n": 1})
+	version = db.version()
+	assert db.append(_hash(1), {"n": 2}) == first
+	# nothing was written, so results cached against the version stay valid
+	assert db.version() == version
+
+	records = db.append_many([(_hash(2), {"n": 2}), (_hash(1), {"n": 3}), (_hash(2), {"n": 4})])
+	assert records[1] == first and records[2] == records[0]
+	assert [r["hash"] for r in db] == [_hash(1), _hash(2)]
+	db.close()
+
+
+def test_proofs_verify_and_survive_reopen(open_ledger):
+	db = open_ledger()
+	db.append_many([(_hash(n), {"n": n}) for n in range(10)])
+	pending = db.inclusion_proof(_hash(9))
+	sealed = db.inclusion_proof(_hash(5))
+	assert verify_inclusion_proof(pending) and verify_inclusion_proof(sealed)
+	assert (pending["status"], sealed["status"]) == ("pending", "sealed")
+	assert pending["block"]["prev_hash"] == sealed["block"]["block_hash"]
+	# proving a pending record does not seal it
+	assert db.inclusion_proof(_hash(9)) == pending
+	db.close()
+
+	db = open_ledger()
+	assert db.inclusion_proof(_hash(5)) == sealed
+	assert db.inclusion_proof("f" * 64) is None
+	version = db.version()
+	db.clear()
+	assert db.find(_hash(5)) is None and db.inclusion_proof(_hash(5)) is None
+	assert db.version()[0] != version[0]
+	db.close()
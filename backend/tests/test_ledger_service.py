@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+
+import pytest
+
+from app.services import blockchain, ledger
+from app.services.ledger import FileLedger, LedgerClient, LedgerError
+from app.services.ledger.server import LedgerServer
+
+
+@pytest.fixture
+def service(tmp_path: Path):
+	# The service on its own event loop thread, as it would run in its own process
+	loop = asyncio.new_event_loop()
+	server = LedgerServer(FileLedger(tmp_path / "ledger.log", fsync=False, block_size=4), tmp_path / "ledger.sock")
+	loop.run_until_complete(server.start())
+	thread = threading.Thread(target=loop.run_forever, daemon=True)
+	thread.start()
+	yield server
+	asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+	loop.call_soon_threadsafe(loop.stop)
+	thread.join()
+	loop.close()
+
+
+def _hash(n: int) -> str:
+	return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+def test_workers_share_one_ledger_through_the_service(service):
+	# one client per simulated worker process, several threads each
+	clients = [LedgerClient(service.socket_path) for _ in range(4)]
+	errors = []
+
+	def submit(client, worker, thread):
+		try:
+			for i in range(50):
+				n = (worker * 10 + thread) * 1000 + i
+				record = client.append(_hash(n), {"n": n})
+				assert record["hash"] == _hash(n) and record["tx_ref"]
+		except Exception as e:  # pragma: no cover - reported below
+			errors.append(e)
+
+	threads = [threading.Thread(target=submit, args=(c, w, t)) for w, c in enumerate(clients) for t in range(4)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	assert errors == []
+
+	client = clients[0]
+	stored = [(w * 10 + t) * 1000 + i for w in range(4) for t in range(4) for i in range(50)]
+	found = client.find_many([_hash(n) for n in stored] + ["f" * 64])
+	assert len(found) == 800 and all(found[_hash(n)]["metadata"] == {"n": n} for n in stored)
+	assert clients[1].find(_hash(stored[0]))["metadata"] == {"n": stored[0]}
+	assert client.find("f" * 64) is None
+	assert client.version() == service.backend.version()
+	assert service.stats()["appended"] == 800
+
+	proof = client.inclusion_proof(_hash(stored[0]))
+	assert ledger.verify_inclusion_proof(proof)
+	for c in clients:
+		c.close()
+
+
+def test_blockchain_helpers_use_the_service_when_configured(service, tmp_path: Path):
+	ledger.configure(socket=str(service.socket_path))
+	try:
+		record = blockchain.submit_to_chain(_hash(1), {"invoice_id": "x"}, path=tmp_path / "unused.log")
+		assert blockchain.verify_hash(_hash(1), path=tmp_path / "unused.log")["tx_ref"] == record["tx_ref"]
+		assert service.backend.find(_hash(1))["tx_ref"] == record["tx_ref"]
+		blockchain.clear_ledger(tmp_path / "unused.log")
+		assert service.backend.find(_hash(1)) is None
+	finally:
+		ledger.configure(socket="")
+	assert not (tmp_path / "unused.log").exists()
+
+
+def test_client_reports_an_unavailable_service(tmp_path: Path):
+	client = LedgerClient(tmp_path / "missing.sock", connect_timeout=0.1)
+	with pytest.raises(LedgerError):
+		client.find(_hash(1))
+
+
+def test_lookups_are_answered_while_a_proof_waits_for_the_ledger(service):
+	client = LedgerClient(service.socket_path)
+	client.append(_hash(1), {"n": 1})
+	proofs = []
+	with service.backend._lock:  # as while the writer fsyncs or rolls over
+		waiting = threading.Thread(target=lambda: proofs.append(client.inclusion_proof(_hash(1))))
+		waiting.start()
+		assert client.find(_hash(1))["metadata"] == {"n": 1}
+		assert not proofs
+	waiting.join()
+	assert ledger.verify_inclusion_proof(proofs[0])
+	client.close()
@@ -0,0 +1,56 @@
+import hashlib
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from app.services import blockchain, ledger
+from app.services.ledger import LedgerError, SqliteLedger, verify_inclusion_proof
+
+
+def _hash(n: int) -> str:
+	return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+def _append_from_process(path: str, worker: int) -> None:
+	db = SqliteLedger(path, fsync=False, block_size=4)
+	for i in range(25):
+		db.append(_hash(worker * 1000 + i), {"worker": worker})
+	db.close()
+
+
+def test_processes_share_one_database(tmp_path: Path):
+	path = str(tmp_path / "ledger.db")
+	reader = SqliteLedger(path, fsync=False, block_size=4)
+	before = reader.version()
+	ctx = multiprocessing.get_context("spawn")
+	procs = [ctx.Process(target=_append_from_process, args=(path, w)) for w in range(3)]
+	for p in procs:
+		p.start()
+	for p in procs:
+		p.join()
+	assert all(p.exitcode == 0 for p in procs)
+
+	# appends made by other processes are visible, and the version moved
+	assert len(reader.find_many([_hash(w * 1000 + i) for w in range(3) for i in range(25)])) == 75
+	assert reader.version() != before
+	proof = reader.inclusion_proof(_hash(2024))
+	assert verify_inclusion_proof(proof)
+	reader.close()
+
+
+def test_backend_is_selected_by_settings(tmp_path: Path):
+	path = tmp_path / "ledger.db"
+	ledger.configure(backend="sqlite")
+	try:
+		record = blockchain.submit_to_chain("a" * 64, {"invoice_id": "x"}, path=path)
+		assert blockchain.verify_hash("a" * 64, path=path) == record
+		assert path.read_bytes().startswith(b"SQLite format 3")
+		blockchain.clear_ledger(path)
+
+		legacy = tmp_path / "ledger.json"
+		legacy.write_text("[]", encoding="utf-8")
+		with pytest.raises(LedgerError):
+			SqliteLedger(legacy).find("a" * 64)
+	finally:
+		ledger.configure(backend="file")
@@ -0,0 +1,68 @@
+import copy
+from pathlib import Path
+
+import services.blockchain as bc
+from app.services import ledger
+from app.services.ledger import FileLedger
+from app.services.ledger.merkle import leaf_hash, merkle_path, merkle_root, root_from_path
+
+
+def test_merkle_path_reaches_root_for_every_leaf():
+	for n in (1, 2, 3, 5, 8, 13):
+		leaves = [leaf_hash({"n": i}) for i in range(n)]
+		root = merkle_root(leaves)
+		for i, leaf in enumerate(leaves):
+			path = merkle_path(leaves, i)
+			assert len(path) <= max(n - 1, 0).bit_length()
+			assert root_from_path(leaf, path) == root
+
+
+def test_blocks_are_sealed_and_chained(tmp_path: Path):
+	ledger = FileLedger(tmp_path / "ledger.log", block_size=4)
+	hashes = [bc.hash_invoice({"n": i}) for i in range(10)]
+	ledger.append_many([(h, {"n": i}) for i, h in enumerate(hashes)])
+	ledger.close()
+
+	ledger = FileLedger(tmp_path / "ledger.log", block_size=4)
+	first = ledger.inclusion_proof(hashes[0])["block"]
+	second = ledger.inclusion_proof(hashes[5])["block"]
+	assert (first["height"], first["count"]) == (0, 4)
+	assert second["prev_hash"] == first["block_hash"]
+
+	# the last two records are pending; proving one does not seal them
+	tail = ledger.inclusion_proof(hashes[9])
+	assert (tail["status"], tail["block"]["count"]) == ("pending", 2)
+	assert tail["block"]["prev_hash"] == second["block_hash"]
+	assert bc.verify_inclusion_proof(tail)
+	assert ledger.inclusion_proof(hashes[9]) == tail
+	ledger.close()
+
+
+def test_proof_verifies_offline_and_detects_tampering(tmp_path: Path):
+	ledger_file = tmp_path / "ledger.json"
+	hashes = [bc.hash_invoice({"n": i}) for i in range(7)]
+	for i, h in enumerate(hashes):
+		bc.submit_to_chain(h, {"invoice_id": str(i)}, path=ledger_file)
+
+	pending = bc.get_inclusion_proof(hashes[3], path=ledger_file)
+	assert pending["status"] == "pending" and bc.verify_inclusion_proof(pending)
+	forged = copy.deepcopy(pending)
+	forged["record"]["metadata"]["invoice_id"] = "999"
+	assert not bc.verify_inclusion_proof(forged)
+
+	ledger.open_ledger(ledger_file).backend.seal()
+	proof = bc.get_inclusion_proof(hashes[3], path=ledger_file)
+	assert proof["record"]["hash"] == hashes[3]
+	assert proof["status"] == "sealed" and bc.verify_inclusion_proof(proof)
+
+	forged = copy.deepcopy(proof)
+	forged["record"]["metadata"]["invoice_id"] = "999"
+	assert not bc.verify_inclusion_proof(forged)
+
+	forged = copy.deepcopy(proof)
+	forged["block"]["prev_hash"] = "1" * 64
+	assert not bc.verify_inclusion_proof(forged)
+
+	assert bc.get_inclusion_proof("e" * 64, path=ledger_file) is None
+	bc.clear_ledger(ledger_file)
+	assert not ledger_file.with_name("ledger.json.blocks").exists()
@@ -0,0 +1,65 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import metrics
+
+
+def test_histogram_quantiles_and_exposition():
+	hist = metrics.Histogram("t_seconds", "test", ["stage"], buckets=(0.001, 0.01, 0.1))
+	for _ in range(90):
+		hist.observe(0.0005, "a")
+	for _ in range(10):
+		hist.observe(0.05, "a")
+
+	assert hist.quantile(0.5, "a") <= 0.001
+	assert 0.01 < hist.quantile(0.95, "a") <= 0.1
+	assert hist.quantile(0.5, "b") is None
+
+	lines = hist.collect()
+	assert "# TYPE t_seconds histogram" in lines
+	assert 't_seconds_bucket{stage="a",le="0.001"} 90' in lines
+	assert 't_seconds_bucket{stage="a",le="+Inf"} 100' in lines
+	assert 't_seconds_count{stage="a"} 100' in lines
+
+
+def test_timed_records_calls_and_errors():
+	@metrics.timed("test_stage")
+	def work(fail=False):
+		if fail:
+			raise ValueError("boom")
+		return 1
+
+	before = metrics.stage_summary().get("test_stage", {}).get("count", 0)
+	assert work() == 1
+	with pytest.raises(ValueError):
+		work(fail=True)
+	assert metrics.stage_summary()["test_stage"]["count"] == before + 2
+	assert metrics.STAGE_ERRORS.value("test_stage") >= 1
+
+	metrics.configure(enabled=False)
+	try:
+		work()
+	finally:
+		metrics.configure(enabled=True)
+	assert metrics.stage_summary()["test_stage"]["count"] == before + 2
+
+
+@pytest.mark.parametrize("rate, recorded", [(1.0, 1), (0.0, 0)])
+def test_middleware_records_route_templates(rate, recorded):
+	app = FastAPI()
+	app.add_middleware(metrics.RequestMetricsMiddleware, sample_rate=rate)
+
+	route = f"/rate-{rate}/items/{{item_id}}"  # metrics are process-wide; keep series apart
+
+	@app.get(route)
+	def item(item_id: int):
+		return {"id": item_id, "pad": "x" * 100}
+
+	before = metrics.REQUEST_SECONDS.summary().get(f"GET,{route},200", {}).get("count", 0)
+	TestClient(app).get(f"/rate-{rate}/items/7")
+
+	summary = metrics.REQUEST_SECONDS.summary().get(f"GET,{route},200", {})
+	assert summary.get("count", 0) - before == recorded
+	if recorded:
+		assert metrics.RESPONSE_BYTES.summary()[f"GET,{route}"]["sum"] > 100
@@ -0,0 +1,68 @@
+import pytest
+
+from app.services import qr_code
+from app.services.cache import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+	qr_code.clear_cache()
+	qr_code.configure_cache(1024, 16 * 1024 * 1024)
+	yield
+	qr_code.clear_cache()
+
+
+def test_lru_cache_evicts_by_count_and_bytes():
+	cache = LRUCache(max_entries=3, max_bytes=10, sizeof=len)
+	for key in "abc":
+		cache.put(key, "xx")
+	cache.get("a")
+	cache.put("d", "xx")
+	assert "b" not in cache and "a" in cache
+
+	cache.put("e", "x" * 8)
+	assert cache.stats()["bytes"] <= 10 and "e" in cache
+	cache.put("huge", "x" * 11)
+	assert "huge" not in cache
+
+
+def test_generate_qr_code_is_cached_per_payload_and_format():
+	before = qr_code.cache_stats()
+	data = qr_code.create_invoice_qr_data(invoice_id="4f6c1c1e-0000-4000-8000-000000000001")
+	png = qr_code.generate_qr_code(data)
+	assert png.startswith("data:image/png;base64,")
+	image, media_type = qr_code.render_qr_image(dict(reversed(list(data.items()))))
+	assert media_type == "image/png" and qr_code.render_qr_image(data)[0] is image
+
+	svg = qr_code.generate_qr_code(data, format="svg")
+	assert svg.startswith("data:image/svg+xml;base64,")
+
+	after = qr_code.cache_stats()
+
+	def delta(cache, counter):
+		return after[cache][counter] - before[cache][counter]
+
+	assert delta("images", "hits") == 2 and delta("images", "misses") == 2
+	# The SVG render reused the PNG's encoded matrix
+	assert delta("matrices", "hits") == 1 and delta("matrices", "misses") == 1
+
+
+def test_disabled_cache_still_renders():
+	qr_code.configure_cache(0, None)
+	assert qr_code.generate_qr_code("hello").startswith("data:image/png;base64,")
+	assert qr_code.cache_stats()["images"]["entries"] == 0
+
+
+@pytest.mark.parametrize("payload", ["hello", "x" * 300, '{"invoice_id": "4f6c1c1e", "type": "zra_invoice"}'])
+def test_render_png_is_pixel_identical_to_pil(payload):
+	from io import BytesIO
+	from PIL import Image
+
+	qr = qr_code._encode(payload)
+	reference = BytesIO()
+	qr.make_image(fill_color="black", back_color="white").save(reference, format="PNG")
+
+	expected = Image.open(BytesIO(reference.getvalue()))
+	actual = Image.open(BytesIO(qr_code.render_png(qr)))
+	assert (actual.mode, actual.size) == (expected.mode, expected.size)
+	assert actual.tobytes() == expected.tobytes()
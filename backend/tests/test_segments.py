@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import services.blockchain as bc
+from app.services.ledger import FileLedger
+from app.services.ledger.segments import SegmentedLog, split_position
+
+
+def _fill(ledger, n):
+	hashes = [bc.hash_invoice({"n": i}) for i in range(n)]
+	for i, h in enumerate(hashes):
+		ledger.append(h, {"n": i})
+	return hashes
+
+
+def test_log_rolls_over_into_sealed_segments(tmp_path: Path):
+	ledger = FileLedger(tmp_path / "ledger.log", segment_size=2048, block_size=8)
+	hashes = _fill(ledger, 60)
+	ledger.close()
+
+	ledger = FileLedger(tmp_path / "ledger.log", segment_size=2048, block_size=8)
+	segments = ledger.segments()
+	assert len(segments) >= 2
+	assert sum(s["records"] for s in segments) < 60
+	assert all(s["min_hash"] <= s["max_hash"] for s in segments)
+	assert all(s["first_timestamp"] <= s["last_timestamp"] for s in segments)
+
+	for i in (0, 17, 59):
+		assert ledger.find(hashes[i])["metadata"] == {"n": i}
+	assert [r["metadata"]["n"] for r in ledger] == list(range(60))
+	assert bc.verify_inclusion_proof(ledger.inclusion_proof(hashes[5]))
+	ledger.clear()
+	assert not (tmp_path / "ledger.log.segments").exists()
+
+
+def test_sealed_segments_can_be_compressed(tmp_path: Path):
+	ledger = FileLedger(tmp_path / "ledger.log", segment_size=4096, compress_segments=True)
+	hashes = _fill(ledger, 100)
+	ledger.close()
+
+	seg_dir = tmp_path / "ledger.log.segments"
+	assert list(seg_dir.glob("*.segz")) and not list(seg_dir.glob("*.seg"))
+
+	ledger = FileLedger(tmp_path / "ledger.log", segment_size=4096, compress_segments=True)
+	assert all(s["compressed"] for s in ledger.segments())
+	assert ledger.find(hashes[1])["metadata"] == {"n": 1}
+	assert ledger.find(hashes[99])["metadata"] == {"n": 99}
+	assert sum(1 for _ in ledger) == 100
+	ledger.close()
+
+
+def test_time_range_scan_skips_segments(tmp_path: Path):
+	ledger = FileLedger(tmp_path / "ledger.log", segment_size=2048)
+	_fill(ledger, 40)
+	ledger.close()
+
+	ledger = FileLedger(tmp_path / "ledger.log", segment_size=2048)
+	newest = ledger.segments()[-1]
+	since = newest["last_timestamp"]
+	records = list(ledger.iter_records(since=since))
+	assert records and all(r["timestamp"] >= since for r in records)
+	ledger.close()
+
+
+def test_positions_are_monotonic_across_segments(tmp_path: Path):
+	log = SegmentedLog(tmp_path / "ledger.log", segment_size=64)
+	log.open()
+	positions = [log.append([b"x" * 40])[0] for _ in range(5)]
+	assert positions == sorted(positions)
+	assert len({split_position(p)[0] for p in positions}) > 1
+	assert [log.read_at(p) for p in positions] == [b"x" * 40] * 5
+	log.close()
+
+
+def test_readers_survive_roll_over_and_compression(tmp_path: Path):
+	log = SegmentedLog(tmp_path / "ledger.log", segment_size=32, compress=True)
+	log.open()
+	first = log.append([b"a" * 40])[0]
+	second = log.append([b"b" * 40])[0]  # rolls segment 0 over
+	assert split_position(second)[0] == 1
+	sealed_read = log._reader(0)
+	for worker in log._workers:
+		worker.join()
+
+	# a reader that took the mapped segment before it was compressed still reads it
+	assert sealed_read(first + 8, 40) == b"a" * 40
+	assert log.read_at(first) == b"a" * 40
+	assert sorted(p.name for p in (tmp_path / "ledger.log.segments").iterdir()) == ["00000000.segz", "manifest.json"]
+	log.close()
+
+
+def test_scans_keep_reading_the_active_segment_across_roll_over(tmp_path: Path, monkeypatch):
+	import app.services.ledger.segments as segments
+
+	log = SegmentedLog(tmp_path / "ledger.log", segment_size=64)
+	log.open()
+	log.append([b"a" * 20, b"b" * 20, b"c" * 20])
+	started = log.scan()
+	assert next(started)[1] == b"a" * 20
+
+	# a scan that starts after the active file was renamed away, before its successor exists
+	during = []
+	mapped = segments._MappedSegment
+
+	def map_and_scan(path):
+		during.extend(payload for _, payload in log.scan())
+		return mapped(path)
+
+	monkeypatch.setattr(segments, "_MappedSegment", map_and_scan)
+	log.append([b"d" * 20])
+	assert during == [b"a" * 20, b"b" * 20, b"c" * 20]
+	assert [payload for _, payload in started] == [b"b" * 20, b"c" * 20]
+	assert [payload for _, payload in log.scan()] == [b"a" * 20, b"b" * 20, b"c" * 20, b"d" * 20]
+	for worker in log._workers:
+		worker.join()
+	log.close()
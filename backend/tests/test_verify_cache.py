@@ -0,0 +1,74 @@
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.models import InvoiceStatus
+from app.services import blockchain, ledger
+from app.services.cache import LRUCache, SQLiteCache
+from app.services.verify_cache import VerificationCache
+
+
+@pytest.fixture
+def ledger_path(tmp_path: Path):
+	ledger.configure(path=str(tmp_path / "ledger.json"))
+	yield tmp_path / "ledger.json"
+	blockchain.clear_ledger()
+	ledger.configure(path="ledger.json")
+
+
+def _invoice(h, tx_ref=None):
+	return SimpleNamespace(
+		id=uuid.uuid4(), user_id="user-1", invoice_number="INV-1", supplier_tpin="1234567890",
+		buyer_tpin="0987654321", vat=16.0, amount=100.0, timestamp=datetime.now(timezone.utc), status=InvoiceStatus.PENDING,
+		blockchain_hash=h, blockchain_tx_ref=tx_ref, blockchain_timestamp=None, qr_code=None,
+	)
+
+
+def test_entries_go_stale_when_the_ledger_changes(ledger_path, tmp_path):
+	cache = VerificationCache(SQLiteCache(tmp_path / "cache.db"))
+	record = blockchain.submit_to_chain("a" * 64, {})
+	verified = _invoice("a" * 64, record["tx_ref"])
+	missing = _invoice("b" * 64)
+	cache.store(verified, record, blockchain.ledger_version())
+	cache.store(missing, None, blockchain.ledger_version())
+	version = blockchain.ledger_version()
+	assert cache.lookup(verified.id, version)["tx_ref_ok"] and cache.lookup(missing.id, version) is not None
+
+	blockchain.submit_to_chain("b" * 64, {})
+	# Appends cannot undo a verified outcome, but "not on the ledger" may now be wrong
+	version = blockchain.ledger_version()
+	assert cache.lookup(verified.id, version) is not None
+	assert cache.lookup(missing.id, version) is None
+	assert cache.stats()["stale"] == 1
+
+
+def test_shared_backend_is_seen_by_every_instance(tmp_path):
+	first, second = SQLiteCache(tmp_path / "cache.db"), SQLiteCache(tmp_path / "cache.db")
+	first.put("k", {"valid": True})
+	assert second.get("k") == {"valid": True}
+	second.pop("k")
+	assert first.get("k") is None
+
+	short = SQLiteCache(tmp_path / "cache.db", ttl=0.01)
+	short.put("k", 1)
+	time.sleep(0.02)
+	assert "k" not in first
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_invalidation_vetoes_stores_of_invoices_loaded_before_it(ledger_path, tmp_path, shared):
+	cache = VerificationCache(SQLiteCache(tmp_path / "cache.db") if shared else LRUCache())
+	version = blockchain.ledger_version()
+	invoice = _invoice("a" * 64)
+	since = time.time()  # a verify starts loading the invoice...
+	cache.invalidate(invoice.id)  # ...and a cancel commits before it stores the outcome
+	cache.store(invoice, None, version, since)
+	assert cache.lookup(invoice.id, version) is None
+
+	time.sleep(0.01)
+	cache.store(invoice, None, version, time.time())  # loaded after the cancel
+	assert cache.lookup(invoice.id, version) is not None
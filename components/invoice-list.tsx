@@ -52,7 +52,7 @@ export default function InvoiceList() {
       }
 
       const data = await response.json()
-      setInvoices(data)
+      setInvoices(data.items)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An error occurred')
     } finally {